@@ -1,8 +1,11 @@
 import os
-import re
+import asyncio
+import json
+import time
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 import sys
@@ -11,6 +14,15 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from models.qa_model import QAModel
+from models.answer_cache import AnswerCache
+from models.llm_providers import get_llm_provider
+from models.metrics import metrics, stage, request_timings, server_timing_header
+from models.profiler import SamplingProfiler
+from models.model_registry import ModelRegistry
+from models.query_router import QueryRouter
+from models.comparison_index import ComparisonIndex
+from models.reranker import CrossEncoderReranker
+from models.context_assembler import ranked_beyond_distance
 from processors.document_processor import DocumentProcessor
 
 # Load environment variables
@@ -42,17 +54,158 @@ app.add_middleware(
 )
 
 # Global variables
-qa_models = {}
 supported_cdps = ["segment", "mparticle", "lytics", "zeotap"]
 
+# Upper bound on QA pipelines (embedding, vector query, LLM call) running at once per worker
+MAX_CONCURRENT_ANSWERS = int(os.getenv("MAX_CONCURRENT_ANSWERS", "32"))
+answer_semaphore = asyncio.Semaphore(MAX_CONCURRENT_ANSWERS)
+
+# Exact + semantic cache of answers, keyed per CDP ("all" for cross-CDP answers)
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+    similarity_threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+)
+
 # Paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 VECTORSTORE_DIR = os.path.join(BASE_DIR, "vectorstores")
 
+# Vector search backend: "auto" (snapshot if exported, else Chroma), "chroma", "hybrid", "numpy" or "numpy-ivf"
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "auto")
+# Per-query time budget for the BM25 pass of hybrid retrieval
+HYBRID_BUDGET_MS = float(os.getenv("HYBRID_BUDGET_MS", "25"))
+
+# One LLM provider shared by every CDP's QA model (LLM_PROVIDER=fake for load tests)
+llm_provider = get_llm_provider()
+
 # Initialize document processor
 document_processor = DocumentProcessor(DATA_DIR, VECTORSTORE_DIR)
 
+# Keyword router (rules from ROUTER_RULES_PATH), with the embedding intent classifier if ROUTER_CLASSIFIER=1
+query_router = QueryRouter.from_env(embedder=document_processor.embedder)
+
+# Cross-encoder second stage (RERANKER=default or a model name): RERANK_CANDIDATES vector hits are
+# rescored within RERANK_BUDGET_MS and the best RERANK_TOP_N go to the prompt
+reranker = CrossEncoderReranker.from_env()
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "3"))
+
+# Per-topic comparison summaries precomputed by run_scrapers.py; reloaded when rebuilt
+comparison_index = None
+# Below this question-to-topic similarity comparisons fall back to the built-in overview
+COMPARISON_MIN_SIMILARITY = float(os.getenv("COMPARISON_MIN_SIMILARITY", "0.2"))
+
+# CDPs loaded before serving ("all", or a comma-separated list); the rest load on first use
+PRELOAD_CDPS = os.getenv("PRELOAD_CDPS", "")
+# Seconds between checks for new index snapshots (0 disables hot reload by file watch)
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "5"))
+# Evict least recently used CDPs beyond this many MB of index (0 = no cap), or after this many idle seconds
+MODEL_MEMORY_CAP_MB = float(os.getenv("MODEL_MEMORY_CAP_MB", "0"))
+MODEL_IDLE_SECONDS = float(os.getenv("MODEL_IDLE_SECONDS", "0"))
+
+# Coalesce concurrent question embeddings into batched encode calls
+embedding_batcher = document_processor.embedder.enable_batching(
+    max_batch_size=int(os.getenv("EMBED_MAX_BATCH", "32")),
+    max_wait_ms=float(os.getenv("EMBED_BATCH_WINDOW_MS", "5"))
+)
+
+# Clients opt in to a per-request stage breakdown with "X-Timing: 1"; TIMING_HEADER=0 disables it
+TIMING_HEADER_ENABLED = os.getenv("TIMING_HEADER", "1") != "0"
+
+# Sampling profiler, enabled with PROFILE_SAMPLING_HZ (collapsed stacks on /debug/profile)
+profiler = SamplingProfiler.from_env()
+PROFILE_OUTPUT = os.getenv("PROFILE_OUTPUT")
+
+metrics.register_gauge(
+    "answer_cache_entries",
+    lambda: {(("tier", tier),): answer_cache.stats()[f"{tier}_entries"] for tier in ("exact", "semantic")},
+    "Entries held in each answer cache tier"
+)
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Request latency histogram, plus a Server-Timing header when the client asks for one"""
+    timings = {} if TIMING_HEADER_ENABLED and request.headers.get("x-timing") == "1" else None
+    token = request_timings.set(timings)
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        request_timings.reset(token)
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        metrics.observe(
+            "http_request_seconds", elapsed,
+            path=route.path if route is not None else "unmatched", method=request.method, status=status
+        )
+    
+    # Streaming responses only cover the work done before the first byte
+    if timings is not None:
+        timings["total"] = elapsed
+        response.headers["Server-Timing"] = server_timing_header(timings)
+    return response
+
+def load_qa_model(cdp):
+    """Open one CDP's index and build its QA model (None if it has no index)"""
+    print(f"Trying to load vector store for {cdp}...")
+    vectorstore = document_processor.load_retrieval_backend(cdp, RETRIEVAL_BACKEND, budget_ms=HYBRID_BUDGET_MS)
+    if not vectorstore:
+        print(f"No vectorstore found for {cdp}")
+        return None
+    return QAModel(vectorstore, cdp, embedder=document_processor.embedder, llm=llm_provider, router=query_router,
+                   reranker=reranker, rerank_top_n=RERANK_TOP_N)
+
+def invalidate_reloaded(cdp):
+    """Answers cached from a CDP's previous index may be stale"""
+    answer_cache.invalidate(cdp)
+
+def build_model_registry():
+    """Registry of QA models over the indexes of the current document_processor
+    
+    Code that swaps document_processor (the benchmarks) rebuilds it, since the
+    snapshot versions are watched through the processor.
+    """
+    return ModelRegistry(
+        load_qa_model,
+        # Chroma-only deployments ignore snapshots, so there is nothing to watch
+        version_of=document_processor.index_version if RETRIEVAL_BACKEND != "chroma" else None,
+        max_bytes=MODEL_MEMORY_CAP_MB * 2 ** 20 or None,
+        idle_seconds=MODEL_IDLE_SECONDS or None,
+        on_reload=invalidate_reloaded
+    )
+
+# QA models per CDP: loaded on first use, hot-reloaded when a new snapshot is exported
+model_registry = build_model_registry()
+
+metrics.register_gauge("qa_models_loaded", lambda: len(model_registry), "CDPs with a loaded QA model")
+metrics.register_gauge(
+    "qa_model_bytes",
+    lambda: {(("cdp", cdp),): stats["bytes"] for cdp, stats in model_registry.stats()["models"].items()},
+    "Estimated index memory of each loaded QA model"
+)
+
+def cached_exact(scope, question):
+    """Exact-tier answer cache lookup, timed and counted per scope"""
+    with stage("cache_exact", scope):
+        value = answer_cache.get_exact(scope, question)
+    metrics.inc("cache_lookups_total", tier="exact", result="miss" if value is None else "hit", scope=scope)
+    return value
+
+def cached_semantic(scope, question_embedding):
+    """Semantic-tier answer cache lookup, timed and counted per scope"""
+    with stage("cache_semantic", scope):
+        value = answer_cache.get_semantic(scope, question_embedding)
+    metrics.inc("cache_lookups_total", tier="semantic", result="miss" if value is None else "hit", scope=scope)
+    return value
+
+async def embed_question(embedder, question):
+    """Question embedding through the micro-batcher, timed"""
+    with stage("embed"):
+        return await embedder.encode_async(question)
+
 # Cross-CDP Comparison Function
 def handle_cross_cdp_comparison(question):
     """Handle cross-CDP comparison questions"""
@@ -101,11 +254,373 @@ def handle_cross_cdp_comparison(question):
         sources=[]
     )
 
+def current_comparison_index():
+    """The comparison index, reloaded if it was rebuilt on disk (None until one is built)"""
+    global comparison_index
+    comparison_index = ComparisonIndex.load_if_changed(document_processor.comparison_dir(), comparison_index)
+    return comparison_index
+
+async def answer_comparison(question, cdps, max_sources=5):
+    """Compare CDPs from the precomputed topic summaries, without an LLM call
+    
+    Falls back to the built-in overview when no comparison index was built or
+    no topic matches the question.
+    """
+    index = current_comparison_index()
+    if index is None:
+        return handle_cross_cdp_comparison(question)
+    
+    question_embedding = await embed_question(document_processor.embedder, question)
+    with stage("comparison"):
+        topic, entries = index.lookup(question_embedding, cdps, min_similarity=COMPARISON_MIN_SIMILARITY)
+    if topic is None:
+        return handle_cross_cdp_comparison(question)
+    
+    names = [cdp.capitalize() for cdp in cdps]
+    lines = [f"Comparing {', '.join(names)} on {topic['label']}:"]
+    sources = []
+    for cdp, name in zip(cdps, names):
+        entry = entries.get(cdp)
+        if entry is None:
+            lines.append(f"{name}: No documentation on this topic was found.")
+            continue
+        lines.append(f"{name} ({entry['title']}): {entry['summary']}")
+        sources.extend(url for url in entry['sources'] if url not in sources)
+    return AnswerResponse(answer="\n\n".join(lines), sources=sources[:max_sources])
+
+async def answer_with_model(model, question):
+    """Answer from one CDP through the answer cache, within the concurrency limit"""
+    cached = cached_exact(model.cdp_name, question)
+    if cached is not None:
+        return cached
+    
+    async with answer_semaphore:
+        question_embedding = await embed_question(model.embedder, question)
+        cached = cached_semantic(model.cdp_name, question_embedding)
+        if cached is not None:
+            return cached
+        
+        results = await model.retrieve_async(question_embedding, question=question)
+        result = await model.answer_from_results_async(question, results)
+    
+    # A fallback answer stands in for an LLM that failed or is missing; don't keep serving it
+    if result["fallback"] is None:
+        answer_cache.put(model.cdp_name, question, question_embedding, {"answer": result["answer"], "sources": result["sources"]})
+    return result
+
+def rank_hits_across_cdps(results_by_cdp):
+    """Merge per-CDP search results into one list ordered by distance (best first)
+    
+    When every CDP's hits were reranked they are ordered by cross-encoder
+    score instead, which is comparable across CDPs for the same question.
+    When any CDP's hits were fused with BM25 the hits are interleaved by
+    their rank within each CDP (distance breaking ties), since fused order
+    does not follow distance.
+    """
+    hits = []
+    fused = False
+    for cdp, results in results_by_cdp.items():
+        documents = results['documents'][0] if results.get('documents') else []
+        metadatas = results['metadatas'][0] if results.get('metadatas') else [None] * len(documents)
+        distances = results['distances'][0] if results.get('distances') else [float(rank) for rank in range(len(documents))]
+        scores = results['rerank_scores'][0] if results.get('rerank_scores') else [None] * len(documents)
+        fused = fused or ranked_beyond_distance(results)
+        for rank, (document, metadata, distance, score) in enumerate(zip(documents, metadatas, distances, scores)):
+            hits.append({"cdp": cdp, "document": document, "metadata": metadata or {}, "distance": distance,
+                         "score": score, "rank": rank})
+    if hits and all(hit["score"] is not None for hit in hits):
+        hits.sort(key=lambda hit: -hit["score"])
+    elif fused:
+        hits.sort(key=lambda hit: (hit["rank"], hit["distance"]))
+    else:
+        hits.sort(key=lambda hit: hit["distance"])
+    return hits
+
+OFF_TOPIC_TEXT = "I'm a CDP support specialist focused on Customer Data Platforms like Segment, mParticle, Lytics, and Zeotap. Please ask me about CDP-related tasks or comparisons."
+
+NO_ANSWER_TEXT = "I'm sorry, I couldn't find specific information about that in any of the CDP documentation. Could you rephrase your question or ask something more specific about Segment, mParticle, Lytics, or Zeotap?"
+
+async def search_across_cdps(models, question, question_embedding, max_cdps=2):
+    """Query every collection concurrently with one embedding
+    
+    Returns (results_by_cdp, hits, top_cdps) where hits are ranked globally and
+    top_cdps are the CDPs owning the best hits.
+    """
+    searches = await asyncio.gather(
+        *[model.retrieve_async(question_embedding, question=question) for model in models.values()],
+        return_exceptions=True
+    )
+    results_by_cdp = {}
+    for cdp, results in zip(models, searches):
+        if isinstance(results, Exception):
+            print(f"Error getting answer from {cdp}: {results}")
+        else:
+            results_by_cdp[cdp] = results
+    
+    hits = rank_hits_across_cdps(results_by_cdp)
+    top_cdps = []
+    for hit in hits:
+        if hit["cdp"] not in top_cdps:
+            top_cdps.append(hit["cdp"])
+        if len(top_cdps) == max_cdps:
+            break
+    return results_by_cdp, hits, top_cdps
+
+def sources_from_hits(hits, cdps, max_sources=5):
+    """Source URLs of the given CDPs' hits in global relevance order"""
+    sources = []
+    for hit in hits:
+        url = hit["metadata"].get("url")
+        if url and hit["cdp"] in cdps and url not in sources:
+            sources.append(url)
+    return sources[:max_sources]
+
+async def answer_across_cdps(question, max_cdps=2, max_sources=5):
+    """Answer from all CDPs with a single question embedding
+    
+    Every collection is queried concurrently, the hits are ranked globally and
+    the LLM is only called for the CDPs owning the best hits.
+    """
+    no_answer = AnswerResponse(answer=NO_ANSWER_TEXT)
+    cached = cached_exact("all", question)
+    if cached is not None:
+        return AnswerResponse(**cached)
+    
+    async with answer_semaphore:
+        models = await model_registry.get_many(supported_cdps)
+        if not models:
+            return no_answer
+        embedder = next(iter(models.values())).embedder
+        question_embedding = await embed_question(embedder, question)
+        if await classified_off_topic(question_embedding):
+            return AnswerResponse(answer=OFF_TOPIC_TEXT)
+        cached = cached_semantic("all", question_embedding)
+        if cached is not None:
+            return AnswerResponse(**cached)
+        
+        results_by_cdp, hits, top_cdps = await search_across_cdps(models, question, question_embedding, max_cdps)
+        
+        answered = await asyncio.gather(
+            *[models[cdp].answer_from_results_async(question, results_by_cdp[cdp]) for cdp in top_cdps],
+            return_exceptions=True
+        )
+    
+    answers = []
+    # Only cache the combined answer if every CDP's part came from the LLM
+    complete = True
+    for cdp, result in zip(top_cdps, answered):
+        if isinstance(result, Exception):
+            print(f"Error getting answer from {cdp}: {result}")
+            complete = False
+            continue
+        if result["fallback"] is not None:
+            complete = False
+        # Only include answers that aren't generic "couldn't find" responses
+        if "I couldn't find specific information" not in result["answer"]:
+            answers.append(f"From {cdp.capitalize()}:\n{result['answer']}")
+    
+    if not answers:
+        response = no_answer
+    else:
+        response = AnswerResponse(
+            answer="\n\n".join(answers),
+            sources=sources_from_hits(hits, top_cdps, max_sources)  # Limited to keep the response clean
+        )
+    
+    # Depends on every collection that was searched, not just the ones that answered
+    if complete:
+        answer_cache.put(
+            "all", question, question_embedding,
+            {"answer": response.answer, "sources": response.sources},
+            cdps=list(models)
+        )
+    return response
+
+def sse_event(event, data):
+    """Format one Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_error_event(cdp):
+    """Final event of a stream whose answer broke off (sent instead of "done")"""
+    return sse_event("error", {"detail": f"The {cdp} answer was interrupted", "cdp": cdp})
+
+async def stream_complete_answer(answer, sources):
+    """Stream an answer that is already fully known (fixed replies and cache hits)"""
+    yield sse_event("sources", sources)
+    yield sse_event("token", answer)
+    yield sse_event("done", {})
+
+async def stream_with_model(model, question):
+    """Stream a single-CDP answer: sources first, then tokens as they are generated"""
+    cached = cached_exact(model.cdp_name, question)
+    if cached is not None:
+        async for event in stream_complete_answer(cached["answer"], cached["sources"]):
+            yield event
+        return
+    
+    async with answer_semaphore:
+        question_embedding = await embed_question(model.embedder, question)
+        cached = cached_semantic(model.cdp_name, question_embedding)
+        if cached is not None:
+            async for event in stream_complete_answer(cached["answer"], cached["sources"]):
+                yield event
+            return
+        
+        results = await model.retrieve_async(question_embedding, question=question)
+        sources = model.extract_sources(results)
+        yield sse_event("sources", sources)
+        
+        parts = []
+        answer_stream = model.stream_answer_from_results(question, results)
+        try:
+            async for token in answer_stream:
+                parts.append(token)
+                yield sse_event("token", token)
+        except Exception as e:
+            # The answer broke off mid-stream: tell the client and don't cache it
+            print(f"Error streaming answer from {model.cdp_name}: {e}")
+            yield stream_error_event(model.cdp_name)
+            return
+    
+    if answer_stream.fallback is None:
+        answer_cache.put(model.cdp_name, question, question_embedding, {"answer": "".join(parts), "sources": sources})
+    yield sse_event("done", {})
+
+async def stream_across_cdps(question, max_cdps=2, max_sources=5):
+    """Stream an all-CDP answer
+    
+    The best CDP's answer streams token by token while the runner-up's answer
+    is generated concurrently and sent when the first one finishes.
+    """
+    cached = cached_exact("all", question)
+    if cached is not None:
+        async for event in stream_complete_answer(cached["answer"], cached["sources"]):
+            yield event
+        return
+    
+    async with answer_semaphore:
+        models = await model_registry.get_many(supported_cdps)
+        if not models:
+            async for event in stream_complete_answer(NO_ANSWER_TEXT, []):
+                yield event
+            return
+        embedder = next(iter(models.values())).embedder
+        question_embedding = await embed_question(embedder, question)
+        if await classified_off_topic(question_embedding):
+            async for event in stream_complete_answer(OFF_TOPIC_TEXT, []):
+                yield event
+            return
+        cached = cached_semantic("all", question_embedding)
+        if cached is not None:
+            async for event in stream_complete_answer(cached["answer"], cached["sources"]):
+                yield event
+            return
+        
+        results_by_cdp, hits, top_cdps = await search_across_cdps(models, question, question_embedding, max_cdps)
+        # CDPs without any retrieved context would only say they couldn't find anything;
+        # each context is assembled once and reused for the answer
+        built = await asyncio.gather(*[models[cdp].build_context_async(results_by_cdp[cdp]) for cdp in top_cdps])
+        contexts = dict(zip(top_cdps, built))
+        top_cdps = [cdp for cdp in top_cdps if contexts[cdp]]
+        sources = sources_from_hits(hits, top_cdps, max_sources)
+        yield sse_event("sources", sources)
+        
+        complete = True
+        if not top_cdps:
+            answer = NO_ANSWER_TEXT
+            yield sse_event("token", answer)
+        else:
+            first, rest = top_cdps[0], top_cdps[1:]
+            pending = [
+                asyncio.create_task(models[cdp].answer_from_results_async(question, results_by_cdp[cdp], contexts[cdp]))
+                for cdp in rest
+            ]
+            try:
+                parts = [f"From {first.capitalize()}:\n"]
+                yield sse_event("token", parts[0])
+                answer_stream = models[first].stream_answer_from_results(question, results_by_cdp[first], contexts[first])
+                try:
+                    async for token in answer_stream:
+                        parts.append(token)
+                        yield sse_event("token", token)
+                except Exception as e:
+                    print(f"Error streaming answer from {first}: {e}")
+                    yield stream_error_event(first)
+                    return
+                complete = answer_stream.fallback is None
+                
+                for cdp, task in zip(rest, pending):
+                    try:
+                        result = await task
+                    except Exception as e:
+                        print(f"Error getting answer from {cdp}: {e}")
+                        complete = False
+                        continue
+                    if result["fallback"] is not None:
+                        complete = False
+                    piece = f"\n\nFrom {cdp.capitalize()}:\n{result['answer']}"
+                    parts.append(piece)
+                    yield sse_event("token", piece)
+            finally:
+                # The client may have disconnected mid-stream: stop the runner-up LLM calls
+                for task in pending:
+                    if not task.done():
+                        task.cancel()
+            answer = "".join(parts)
+    
+    if complete:
+        answer_cache.put("all", question, question_embedding, {"answer": answer, "sources": sources}, cdps=list(models))
+    yield sse_event("done", {})
+
+async def route_question(request, question):
+    """Decide how to answer a question
+    
+    Returns (response, cdp): a fixed AnswerResponse for off-topic and
+    comparison questions, the CDP name when one is selected or mentioned, or
+    (None, None) to answer across all CDPs.
+    """
+    with stage("route"):
+        route = query_router.route(question)
+    
+    if route.intent == "off_topic":
+        metrics.inc("routes_total", route="off_topic")
+        return AnswerResponse(answer=OFF_TOPIC_TEXT), None
+    
+    # Cross-CDP comparison: a comparison keyword and at least two CDPs named
+    if route.intent == "comparison":
+        metrics.inc("routes_total", route="comparison")
+        return await answer_comparison(question, [cdp for cdp in route.cdps if cdp in supported_cdps]), None
+    
+    # Check if user specified a CDP in the dropdown
+    if request.cdp and request.cdp != "all" and request.cdp in supported_cdps:
+        # User selected a specific CDP
+        metrics.inc("routes_total", route="selected_cdp")
+        return None, request.cdp
+    
+    # Check if question mentions a specific CDP
+    mentioned_cdp = next((cdp for cdp in route.cdps if cdp in supported_cdps), None)
+    
+    if mentioned_cdp:
+        metrics.inc("routes_total", route="mentioned_cdp")
+        return None, mentioned_cdp
+    
+    # If no specific CDP is mentioned or selected, query all CDPs
+    metrics.inc("routes_total", route="all_cdps")
+    return None, None
+
+async def classified_off_topic(question_embedding):
+    """Whether the embedding classifier (if enabled) marks an unrouted question as off-topic"""
+    if query_router.classifier is None:
+        return False
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, query_router.classify, question_embedding) != "off_topic":
+        return False
+    metrics.inc("routes_total", route="off_topic_classifier")
+    return True
+
 @app.on_event("startup")
 async def startup_event():
-    """Load QA models on startup"""
-    global qa_models
-    
+    """Preload the PRELOAD_CDPS models, warm the intent classifier and start watching for re-indexed CDPs"""
     print(f"Looking for vector stores in: {VECTORSTORE_DIR}")
     # Check if directory exists
     if os.path.exists(VECTORSTORE_DIR):
@@ -113,23 +628,93 @@ async def startup_event():
     else:
         print(f"Vector store directory does not exist")
     
-    for cdp in supported_cdps:
-        try:
-            print(f"Trying to load vector store for {cdp}...")
-            vectorstore = document_processor.load_vectorstore(cdp)
-            if vectorstore:
-                qa_models[cdp] = QAModel(vectorstore, cdp)
-                print(f"Loaded QA model for {cdp}")
-            else:
-                print(f"No vectorstore found for {cdp}")
-        except Exception as e:
-            print(f"Error loading QA model for {cdp}: {e}")
+    if profiler is not None:
+        profiler.start()
+    
+    # Everything else loads on first use; snapshots are memory-mapped, so that is cheap
+    preload = supported_cdps if PRELOAD_CDPS == "all" else [cdp for cdp in PRELOAD_CDPS.split(",") if cdp in supported_cdps]
+    await model_registry.get_many(preload)
+    # Embed the intent classifier's examples before the first question needs them
+    await asyncio.get_running_loop().run_in_executor(None, query_router.warm_up)
+    model_registry.start_watching(MODEL_WATCH_INTERVAL)
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the index watcher and the profiler, writing its samples if PROFILE_OUTPUT is set"""
+    await model_registry.stop_watching()
+    if profiler is not None:
+        profiler.stop()
+        if PROFILE_OUTPUT:
+            profiler.dump(PROFILE_OUTPUT)
 
 @app.get("/")
 async def root():
     """Root endpoint"""
     return {"message": "CDP Support Chatbot API"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Answer cache hit/miss metrics"""
+    return answer_cache.stats()
+
+@app.get("/embedding/stats")
+async def embedding_stats():
+    """Question-embedding micro-batching metrics (batch sizes, queue delay)"""
+    if embedding_batcher is None:
+        return {"batching": False}
+    return dict(embedding_batcher.stats(), batching=True)
+
+@app.get("/models/stats")
+async def model_stats():
+    """Loaded QA models, their index versions and estimated memory, and load/eviction counts"""
+    return model_registry.stats()
+
+@app.post("/models/reload")
+async def reload_models(cdp: Optional[str] = None):
+    """Swap in a re-indexed CDP (or every loaded CDP) without a restart"""
+    if cdp is not None and cdp not in supported_cdps:
+        raise HTTPException(status_code=404, detail=f"Unknown CDP: {cdp}")
+    cdps = [cdp] if cdp is not None else list(model_registry.entries)
+    reloaded = [name for name in cdps if await model_registry.reload(name)]
+    return {"reloaded": reloaded, "failed": [name for name in cdps if name not in reloaded]}
+
+@app.get("/comparisons/stats")
+async def comparison_stats():
+    """Topics of the precomputed comparison index"""
+    index = current_comparison_index()
+    if index is None:
+        return {"built": False}
+    return dict(index.stats(), built=True)
+
+@app.get("/rerank/stats")
+async def rerank_stats():
+    """Cross-encoder reranking outcomes, score cache and measured cost per pair"""
+    if reranker is None:
+        return {"enabled": False}
+    return dict(reranker.stats(), enabled=True, top_n=RERANK_TOP_N)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Stage latencies, cache/fallback counters and gauges in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/debug/profile")
+async def debug_profile(reset: bool = False):
+    """Collapsed stacks from the sampling profiler (feed to flamegraph.pl or speedscope)"""
+    if profiler is None:
+        raise HTTPException(status_code=404, detail="Profiler disabled; set PROFILE_SAMPLING_HZ to enable it")
+    collapsed = profiler.collapsed()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(collapsed)
+
+@app.post("/cache/invalidate")
+async def invalidate_cache(cdp: Optional[str] = None):
+    """Drop cached answers for a re-indexed CDP (or all cached answers)"""
+    if cdp is not None and cdp not in supported_cdps:
+        raise HTTPException(status_code=404, detail=f"Unknown CDP: {cdp}")
+    return {"invalidated": answer_cache.invalidate(cdp)}
+
 @app.get("/cdps")
 async def get_cdps():
     """Get list of supported CDPs"""
@@ -144,70 +729,46 @@ async def ask_question(request: QuestionRequest):
     # Preprocessing the question
     question = request.text.strip()
     
-    # Irrelevant question filter
-    irrelevant_keywords = ["movie", "weather", "sports", "food", "restaurant"]
-    if any(keyword in question.lower() for keyword in irrelevant_keywords):
-        return AnswerResponse(
-            answer="I'm a CDP support specialist focused on Customer Data Platforms like Segment, mParticle, Lytics, and Zeotap. Please ask me about CDP-related tasks or comparisons."
-        )
-    
-    # Cross-CDP Comparison Detection
-    comparison_keywords = ["compare", "difference", "vs", "versus", "better"]
-    cdp_names = ["segment", "mparticle", "lytics", "zeotap"]
-    
-    cdp_mentions = [cdp for cdp in cdp_names if cdp in question.lower()]
-    is_comparison = (any(comp in question.lower() for comp in comparison_keywords) and len(cdp_mentions) > 1)
-    
-    if is_comparison:
-        return handle_cross_cdp_comparison(question)
-    
-    # Check if user specified a CDP in the dropdown
-    if request.cdp and request.cdp != "all" and request.cdp in qa_models:
-        # User selected a specific CDP
-        model = qa_models[request.cdp]
-        result = model.answer_question(question)
-        return AnswerResponse(
-            answer=result["answer"],
-            sources=result["sources"]
-        )
-    
-    # Check if question mentions a specific CDP
-    mentioned_cdp = next((cdp for cdp in supported_cdps if cdp in question.lower()), None)
+    response, cdp = await route_question(request, question)
+    if response is not None:
+        return response
     
-    if mentioned_cdp and mentioned_cdp in qa_models:
-        model = qa_models[mentioned_cdp]
-        result = model.answer_question(question)
+    # A CDP without an index is answered across the others
+    model = await model_registry.get(cdp) if cdp is not None else None
+    if model is not None:
+        result = await answer_with_model(model, question)
         return AnswerResponse(
             answer=result["answer"],
             sources=result["sources"]
         )
     
-    # If no specific CDP is mentioned or selected, query all CDPs
-    answers = []
-    all_sources = []
+    # Query all CDPs at once
+    return await answer_across_cdps(question)
+
+@app.post("/ask/stream")
+async def ask_question_stream(request: QuestionRequest):
+    """Same as /ask, streamed as Server-Sent Events
     
-    # We'll query all models but only include relevant responses
-    for cdp, model in qa_models.items():
-        try:
-            result = model.answer_question(question)
-            
-            # Only include answers that aren't generic "couldn't find" responses
-            if "I couldn't find specific information" not in result["answer"]:
-                answers.append(f"From {cdp.capitalize()}:\n{result['answer']}")
-                all_sources.extend(result["sources"])
-        except Exception as e:
-            print(f"Error getting answer from {cdp}: {e}")
+    Emits a "sources" event, then "token" events as the answer is generated,
+    then a final "done" event, or an "error" event if the LLM stream failed
+    after part of the answer was sent.
+    """
+    if not request.text.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
     
-    if not answers:
-        return AnswerResponse(
-            answer="I'm sorry, I couldn't find specific information about that in any of the CDP documentation. Could you rephrase your question or ask something more specific about Segment, mParticle, Lytics, or Zeotap?"
-        )
+    question = request.text.strip()
     
-    # Limit the number of responses to show (to avoid overwhelming the user)
-    if len(answers) > 2:
-        answers = answers[:2]
+    response, cdp = await route_question(request, question)
+    model = await model_registry.get(cdp) if cdp is not None else None
+    if response is not None:
+        events = stream_complete_answer(response.answer, response.sources)
+    elif model is not None:
+        events = stream_with_model(model, question)
+    else:
+        events = stream_across_cdps(question)
     
-    return AnswerResponse(
-        answer="\n\n".join(answers),
-        sources=all_sources[:5]  # Limit to 5 sources to keep the response clean
-    )
\ No newline at end of file
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,113 @@
+"""Embedding throughput on 1 to N cores: torch threads vs worker processes
+
+Embeds every chunk of the bundled backend/data corpus (split as the indexer
+splits it, embedding cache off) once per core count, two ways:
+    threads    one process, torch.set_num_threads(cores)
+    processes  EncodePool with `cores` workers of one thread each
+Worker start-up (model load) is timed separately and excluded from the
+throughput; the pool's output is checked against the single-process
+embeddings to confirm the shards are merged back in order.
+
+    python benchmarks/bench_encode_pool.py [--cores 1,2,4,8] [--repeat 1] [--batch-size 64] [--output results.json]
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.document_processor import DocumentProcessor
+from models.encode_pool import EncodePool
+from benchmarks.bench_utils import write_results
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def corpus_texts(processor):
+    """Chunk texts of every bundled document, in indexing order"""
+    texts = []
+    for cdp_name in sorted(os.listdir(processor.data_dir)):
+        if os.path.isdir(os.path.join(processor.data_dir, cdp_name)):
+            _, to_embed, _, _, _ = processor.plan_cdp_update(cdp_name, None)
+            texts.extend(text for _, text, _ in to_embed)
+    return texts
+
+def default_core_counts():
+    cores = os.cpu_count() or 1
+    counts = [1]
+    while counts[-1] * 2 <= cores:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != cores:
+        counts.append(cores)
+    return counts
+
+def best_time(fn, repeat):
+    """Fastest of repeat runs, in seconds, and the last result"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_threads(model, texts, cores, batch_size, repeat):
+    import torch
+    torch.set_num_threads(cores)
+    return best_time(lambda: np.asarray(model.encode(texts, batch_size=batch_size, show_progress_bar=False)), repeat)
+
+def bench_processes(model_name, texts, cores, batch_size, repeat):
+    pool = EncodePool(model_name, processes=cores, threads_per_worker=1)
+    try:
+        # Warm-up call with one shard per worker: starts every worker and loads its model
+        start = time.perf_counter()
+        pool.encode(texts[:pool.processes * pool.min_shard], batch_size=batch_size)
+        startup = time.perf_counter() - start
+        elapsed, embeddings = best_time(lambda: pool.encode(texts, batch_size=batch_size), repeat)
+    finally:
+        pool.close()
+    return startup, elapsed, embeddings
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cores", default=None, help="comma-separated core counts (default 1, 2, 4, ... up to all cores)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    
+    processor = DocumentProcessor(os.path.join(BASE_DIR, "data"), os.path.join(BASE_DIR, "vectorstores"))
+    texts = corpus_texts(processor)
+    model = processor.embedder.model
+    core_counts = [int(count) for count in args.cores.split(",")] if args.cores else default_core_counts()
+    
+    reference = None
+    report = {"texts": len(texts), "cpu_count": os.cpu_count(), "rows": []}
+    for cores in core_counts:
+        thread_time, embeddings = bench_threads(model, texts, cores, args.batch_size, args.repeat)
+        if reference is None:
+            reference = embeddings
+        startup, process_time, pooled = bench_processes(processor.embedder.model_name, texts, cores, args.batch_size, args.repeat)
+        report["rows"].append({
+            "cores": cores,
+            "threads_texts_per_sec": len(texts) / thread_time,
+            "processes_texts_per_sec": len(texts) / process_time,
+            "pool_startup_s": startup,
+            "max_abs_diff": float(np.max(np.abs(pooled - reference))) if len(texts) else 0.0,
+        })
+    
+    print(f"{report['texts']} chunks, {report['cpu_count']} CPUs")
+    print(f"  {'cores':>5}  {'threads':>14}  {'processes':>14}  {'speedup':>8}  {'startup':>8}  max |diff|")
+    base = report["rows"][0]
+    for row in report["rows"]:
+        print(f"  {row['cores']:>5}  {row['threads_texts_per_sec']:>10.1f}/sec  {row['processes_texts_per_sec']:>10.1f}/sec  "
+              f"{row['processes_texts_per_sec'] / base['processes_texts_per_sec']:>7.2f}x  {row['pool_startup_s']:>7.2f}s  "
+              f"{row['max_abs_diff']:.2e}")
+    
+    if args.output:
+        write_results(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Offline retrieval-quality and latency benchmark over the bundled data/ corpus
+
+Indexes a copy of data/ into a temporary vector store (measuring ingestion
+throughput), then runs the golden set in benchmarks/golden_set.json against
+each retrieval backend and through POST /ask with Groq disabled. Reports
+recall@k and MRR over the expected source URLs, embed / query / end-to-end
+latency percentiles, and writes everything as JSON so runs can be compared.
+
+    python benchmarks/bench_quality.py [--k 5] [--backends chroma,numpy,hybrid] [--repeat 3] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Never call Groq from a benchmark; an empty key also stops load_dotenv from setting one
+os.environ["GROQ_API_KEY"] = ""
+
+from processors.document_processor import DocumentProcessor
+from benchmarks.bench_utils import percentiles, timed, write_results
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_SET = os.path.join(BASE_DIR, "benchmarks", "golden_set.json")
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+def load_golden_set(path):
+    """Golden questions: [{"cdp", "question", "expected_urls"}]"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def ranked_urls(results):
+    """Distinct source URLs of the hits, best first"""
+    urls = []
+    for metadata in (results['metadatas'][0] if results.get('metadatas') else []):
+        url = (metadata or {}).get('url')
+        if url and url not in urls:
+            urls.append(url)
+    return urls
+
+def recall_at_k(expected, urls):
+    """Fraction of the expected URLs among the retrieved ones"""
+    return len(set(expected) & set(urls)) / len(expected) if expected else 1.0
+
+def reciprocal_rank(expected, urls):
+    """1 / rank of the first relevant URL, 0 if none was retrieved"""
+    for rank, url in enumerate(urls, start=1):
+        if url in expected:
+            return 1.0 / rank
+    return 0.0
+
+def bench_ingestion(data_dir, vectorstore_dir):
+    """Index every CDP from scratch and export snapshots, timing both"""
+    # The embedding cache stays off (no configure_embedder): hits would hide the encode time
+    processor = DocumentProcessor(data_dir, vectorstore_dir)
+    _, index_time = timed(processor.process_all_cdps)
+    
+    snapshot_start = time.perf_counter()
+    for cdp_name in processor.total_stats:
+        processor.export_snapshot(cdp_name)
+    snapshot_time = time.perf_counter() - snapshot_start
+    
+    documents = sum(stats.get('documents', 0) for stats in processor.last_stats.values())
+    chunks = sum(totals['chunks'] for totals in processor.total_stats.values())
+    return processor, {
+        "documents": documents,
+        "chunks": chunks,
+        "index_seconds": index_time,
+        "snapshot_seconds": snapshot_time,
+        "documents_per_sec": documents / index_time if index_time else None,
+        "chunks_per_sec": chunks / index_time if index_time else None,
+        "embed_seconds": sum(totals['embed_time'] for totals in processor.total_stats.values()),
+        "write_seconds": sum(totals['write_time'] for totals in processor.total_stats.values()),
+    }
+
+def bench_embedding(embedder, questions, repeat):
+    """Single-question encode latency"""
+    latencies = []
+    embeddings = {}
+    for _ in range(repeat):
+        for question in questions:
+            embeddings[question], elapsed = timed(embedder.encode_one, question)
+            latencies.append(elapsed)
+    return embeddings, dict(percentiles(latencies), queries=len(latencies))
+
+def bench_backend(backend, golden, embeddings, k, repeat):
+    """Recall@k / MRR (overall and per CDP) and query latency for one backend"""
+    latencies = []
+    per_cdp = {}
+    for _ in range(repeat):
+        for item in golden:
+            question = item["question"]
+            results, elapsed = timed(backend[item["cdp"]].query, [embeddings[question]], n_results=k, query_texts=[question])
+            latencies.append(elapsed)
+            urls = ranked_urls(results)
+            scores = per_cdp.setdefault(item["cdp"], {"recall": [], "rr": []})
+            scores["recall"].append(recall_at_k(item["expected_urls"], urls))
+            scores["rr"].append(reciprocal_rank(item["expected_urls"], urls))
+    
+    recalls = [value for scores in per_cdp.values() for value in scores["recall"]]
+    rrs = [value for scores in per_cdp.values() for value in scores["rr"]]
+    return {
+        f"recall@{k}": sum(recalls) / len(recalls) if recalls else None,
+        "mrr": sum(rrs) / len(rrs) if rrs else None,
+        "per_cdp": {
+            cdp: {f"recall@{k}": sum(scores["recall"]) / len(scores["recall"]), "mrr": sum(scores["rr"]) / len(scores["rr"])}
+            for cdp, scores in sorted(per_cdp.items())
+        },
+        "query_latency": dict(percentiles(latencies), queries=len(latencies)),
+    }
+
+def bench_ask(processor, golden, repeat):
+    """End-to-end POST /ask latency with the answer cache cleared before every request"""
+    from fastapi.testclient import TestClient
+    import api.main as api_main
+    
+    api_main.document_processor = processor
+    # The registry built at import watches the default vector stores' snapshots
+    api_main.model_registry = api_main.build_model_registry()
+    latencies = []
+    errors = 0
+    with TestClient(api_main.app) as client:
+        for _ in range(repeat):
+            for item in golden:
+                api_main.answer_cache.invalidate()
+                response, elapsed = timed(client.post, "/ask", json={"text": item["question"], "cdp": item["cdp"]})
+                latencies.append(elapsed)
+                errors += response.status_code != 200
+    return dict(percentiles(latencies), requests=len(latencies), errors=errors, retrieval_backend=api_main.RETRIEVAL_BACKEND)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--backends", default="chroma,numpy,hybrid")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--golden-set", default=GOLDEN_SET)
+    parser.add_argument("--skip-api", action="store_true", help="skip the end-to-end /ask measurement")
+    parser.add_argument("--output", default=None, help="defaults to benchmarks/results/quality_<timestamp>.json")
+    args = parser.parse_args()
+    
+    golden = load_golden_set(args.golden_set)
+    workdir = tempfile.mkdtemp(prefix="cdp-bench-")
+    try:
+        data_dir = os.path.join(workdir, "data")
+        shutil.copytree(os.path.join(BASE_DIR, "data"), data_dir)
+        processor, ingestion = bench_ingestion(data_dir, os.path.join(workdir, "vectorstores"))
+        
+        golden = [item for item in golden if item["cdp"] in processor.total_stats]
+        cdps = sorted({item["cdp"] for item in golden})
+        embeddings, embed_latency = bench_embedding(processor.embedder, [item["question"] for item in golden], args.repeat)
+        
+        report = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "k": args.k,
+            "questions": len(golden),
+            "embedding_model": processor.embedder.model_name,
+            "chunking": processor.chunking_settings(),
+            "ingestion": ingestion,
+            "embed_latency": embed_latency,
+            "backends": {},
+        }
+        for name in args.backends.split(","):
+            backend = {cdp: processor.load_retrieval_backend(cdp, name) for cdp in cdps}
+            report["backends"][name] = bench_backend(backend, golden, embeddings, args.k, args.repeat)
+        if not args.skip_api:
+            report["ask_latency"] = bench_ask(processor, golden, args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    print(f"\nIngestion: {ingestion['documents']} documents, {ingestion['chunks']} chunks "
+          f"in {ingestion['index_seconds']:.2f}s ({ingestion['chunks_per_sec']:.1f} chunks/sec)")
+    print(f"Embed:     p50 {embed_latency['p50']:.2f}ms  p95 {embed_latency['p95']:.2f}ms  p99 {embed_latency['p99']:.2f}ms")
+    for name, row in report["backends"].items():
+        latency = row["query_latency"]
+        print(f"  {name:<10} recall@{args.k} {row[f'recall@{args.k}']:.3f}  MRR {row['mrr']:.3f}  "
+              f"p50 {latency['p50']:.3f}ms  p95 {latency['p95']:.3f}ms  p99 {latency['p99']:.3f}ms")
+    if "ask_latency" in report:
+        ask = report["ask_latency"]
+        print(f"/ask:      p50 {ask['p50']:.2f}ms  p95 {ask['p95']:.2f}ms  p99 {ask['p99']:.2f}ms  errors {ask['errors']}")
+    
+    write_results(report, args.output or os.path.join(RESULTS_DIR, f"quality_{time.strftime('%Y%m%d-%H%M%S')}.json"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Memory saved against recall lost by int8 / float16 embedding storage
+
+For every CDP the float32 exact index is compared with int8 and float16
+scans, with and without the float32 re-rank of the shortlist. Queries are
+the titles of the bundled documents plus the golden-set questions; recall@k
+is measured against exact float32 search. Memory is the size of the matrix
+each variant scans per query.
+
+    python benchmarks/bench_quantization.py [--k 5] [--rerank-depth 32] [--repeat 3] [--output results.json]
+"""
+import os
+import sys
+import json
+import argparse
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.document_processor import DocumentProcessor
+from models.retrieval_backends import NumpyBackend
+from benchmarks.bench_utils import write_results
+from benchmarks.bench_retrieval import bench_backend
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_SET = os.path.join(BASE_DIR, "benchmarks", "golden_set.json")
+
+VARIANTS = [
+    ("float32", None, False),
+    ("int8", "int8", False),
+    ("int8+rerank", "int8", True),
+    ("float16", "float16", False),
+    ("float16+rerank", "float16", True),
+]
+
+def load_index(processor, cdp_name):
+    """Dense float32 index from the current snapshot, or from Chroma if none was exported"""
+    index = processor.load_retrieval_backend(cdp_name, "numpy")
+    if index is not None and not isinstance(index, NumpyBackend):
+        index = NumpyBackend.from_collection(index.collection)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-depth", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--golden-set", default=GOLDEN_SET)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    
+    processor = DocumentProcessor(os.path.join(BASE_DIR, "data"), os.path.join(BASE_DIR, "vectorstores"))
+    with open(args.golden_set, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    report = {}
+    
+    for cdp_name in ["segment", "mparticle", "lytics", "zeotap"]:
+        exact = load_index(processor, cdp_name)
+        if exact is None or exact.count() == 0:
+            continue
+        # Baseline scans the float32 matrix even if the snapshot was exported quantized
+        exact.quantized = None
+        
+        titles = sorted({metadata.get("title", "") for metadata in exact.metadatas if metadata})
+        questions = titles + [item["question"] for item in golden if item["cdp"] == cdp_name]
+        query_embeddings = processor.embedder.encode_batch(questions)
+        truth = [exact.query([embedding], n_results=args.k)["ids"][0] for embedding in query_embeddings]
+        
+        report[cdp_name] = {"vectors": exact.count(), "queries": len(questions)}
+        for name, kind, rerank in VARIANTS:
+            backend = NumpyBackend(exact.ids, exact.embeddings, exact.documents, exact.metadatas,
+                                   rerank_depth=args.rerank_depth if rerank else 0).enable_quantization(kind)
+            row = bench_backend(backend, query_embeddings, truth, args.k, args.repeat)
+            row["memory_bytes"] = backend.memory_bytes()
+            report[cdp_name][name] = row
+    
+    for cdp_name, rows in report.items():
+        print(f"\n{cdp_name} ({rows['vectors']} vectors, {rows['queries']} queries)")
+        baseline = rows["float32"]["memory_bytes"]
+        for name, _, _ in VARIANTS:
+            row = rows[name]
+            print(f"  {name:<16}{row['memory_bytes'] / 1024:9.1f}KB ({baseline / row['memory_bytes']:.1f}x smaller)  "
+                  f"recall@{args.k} {row['recall']:.3f}  p50 {row['p50']:.3f}ms  p99 {row['p99']:.3f}ms")
+    
+    if args.output:
+        write_results(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Compare Chroma against the in-process NumPy index (exact and IVF)
+
+Queries are the titles of the bundled documents, embedded with the shared
+model. Recall@k is measured against exact NumPy search (true cosine top-k).
+
+    python benchmarks/bench_retrieval.py [--k 5] [--repeat 3] [--output results.json]
+"""
+import os
+import sys
+import argparse
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from processors.document_processor import DocumentProcessor
+from models.retrieval_backends import ChromaBackend, NumpyBackend
+from benchmarks.bench_utils import percentiles, timed, write_results
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def recall_at_k(expected, actual):
+    """Fraction of the expected ids found in the returned ids"""
+    return len(set(expected) & set(actual)) / len(expected) if expected else 1.0
+
+def bench_backend(backend, query_embeddings, truth, k, repeat):
+    latencies = []
+    recalls = []
+    for _ in range(repeat):
+        for query_embedding, expected in zip(query_embeddings, truth):
+            results, elapsed = timed(backend.query, [query_embedding], n_results=k)
+            latencies.append(elapsed)
+            recalls.append(recall_at_k(expected, results["ids"][0]))
+    return dict(percentiles(latencies), recall=sum(recalls) / len(recalls) if recalls else None, queries=len(latencies))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--n-probe", type=int, default=8)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    
+    processor = DocumentProcessor(os.path.join(BASE_DIR, "data"), os.path.join(BASE_DIR, "vectorstores"))
+    report = {}
+    
+    for cdp_name in ["segment", "mparticle", "lytics", "zeotap"]:
+        collection = processor.load_vectorstore(cdp_name)
+        if collection is None or collection.count() == 0:
+            continue
+        
+        exact = NumpyBackend.from_collection(collection)
+        ivf = NumpyBackend(exact.ids, exact.embeddings, exact.documents, exact.metadatas, mode="ivf", n_probe=args.n_probe)
+        titles = sorted({metadata.get("title", "") for metadata in exact.metadatas if metadata})
+        query_embeddings = processor.embedder.encode_batch(titles)
+        truth = [exact.query([embedding], n_results=args.k)["ids"][0] for embedding in query_embeddings]
+        
+        report[cdp_name] = {"vectors": exact.count(), "queries": len(titles)}
+        for name, backend in [("chroma", ChromaBackend(collection)), ("numpy", exact), ("numpy-ivf", ivf)]:
+            report[cdp_name][name] = bench_backend(backend, query_embeddings, truth, args.k, args.repeat)
+    
+    for cdp_name, rows in report.items():
+        print(f"\n{cdp_name} ({rows['vectors']} vectors, {rows['queries']} queries)")
+        for name in ("chroma", "numpy", "numpy-ivf"):
+            row = rows[name]
+            print(f"  {name:<10} recall@{args.k} {row['recall']:.3f}  p50 {row['p50']:.3f}ms  p99 {row['p99']:.3f}ms")
+    
+    if args.output:
+        write_results(report, args.output)
+
+if __name__ == "__main__":
+    main()
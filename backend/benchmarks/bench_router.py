@@ -0,0 +1,136 @@
+"""Microbenchmark of question routing: compiled router vs the old substring scans
+
+Routes the golden-set and load-test questions (plus a few off-topic and
+ambiguous ones) with both approaches, reports the time per question and lists
+the questions they route differently, e.g. "audience segment" questions that
+the substring scan sent to Segment. With the built-in ~40 keywords both are a
+few microseconds; the scaling section adds synthetic keywords to show how each
+grows with the rule set (substring scans are linear in the keyword count).
+
+    python benchmarks/bench_router.py [--repeat 2000] [--scale 100,1000] [--classifier] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.query_router import QueryRouter, IntentClassifier, load_rules
+from benchmarks.bench_utils import write_results
+from benchmarks.load_test import ALL_CDP_QUESTIONS, COMPARISON_QUESTIONS
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_SET = os.path.join(BASE_DIR, "benchmarks", "golden_set.json")
+
+EXTRA_QUESTIONS = [
+    "How do I create an audience segment based on page views?",
+    "Can I segment users by lifetime value?",
+    "However I configure the source, no events arrive",
+    "What movie should I watch tonight?",
+    "How do I track restaurant orders as events in Segment?",
+    "Is Twilio Segment better than mParticle for mobile apps?",
+]
+
+def legacy_route(question):
+    """The keyword routing /ask did before the compiled router"""
+    if any(keyword in question.lower() for keyword in ["movie", "weather", "sports", "food", "restaurant"]):
+        return "off_topic", []
+    cdp_mentions = [cdp for cdp in ["segment", "mparticle", "lytics", "zeotap"] if cdp in question.lower()]
+    if any(comp in question.lower() for comp in ["compare", "difference", "vs", "versus", "better"]) and len(cdp_mentions) > 1:
+        return "comparison", cdp_mentions
+    how_to = any(keyword in question.lower() for keyword in ["how", "steps", "guide", "process", "way to", "setup", "configure", "implement"])
+    return ("how_to" if how_to else "general"), cdp_mentions[:1]
+
+def compiled_route(router, question):
+    route = router.route(question)
+    return route.intent, route.cdps[:1] if route.intent != "comparison" else route.cdps
+
+def synthetic_keywords(count):
+    return [f"keyword{index:05d}" for index in range(count)]
+
+def bench_scaling(questions, counts, repeat):
+    """Microseconds per question with `count` extra keywords, for both approaches"""
+    rows = {}
+    for count in counts:
+        keywords = synthetic_keywords(count)
+        rules = load_rules()
+        rules["intents"] = dict(rules["intents"], synthetic=keywords)
+        router = QueryRouter(rules)
+        
+        def legacy_with_keywords(question):
+            legacy_route(question)
+            return any(keyword in question.lower() for keyword in keywords)
+        
+        rows[count] = {
+            "legacy_us": time_per_question(legacy_with_keywords, questions, repeat),
+            "compiled_us": time_per_question(router.route, questions, repeat),
+        }
+    return rows
+
+def time_per_question(fn, questions, repeat):
+    """Mean microseconds per routed question"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for question in questions:
+            fn(question)
+    return 1e6 * (time.perf_counter() - start) / (repeat * len(questions))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--scale", default="100,1000", help="extra keyword counts for the scaling section")
+    parser.add_argument("--classifier", action="store_true", help="also time the embedding intent classifier")
+    parser.add_argument("--golden-set", default=GOLDEN_SET)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    
+    with open(args.golden_set, 'r', encoding='utf-8') as f:
+        questions = [item["question"] for item in json.load(f)]
+    questions += ALL_CDP_QUESTIONS + COMPARISON_QUESTIONS + EXTRA_QUESTIONS
+    
+    start = time.perf_counter()
+    router = QueryRouter(load_rules())
+    compile_ms = 1000 * (time.perf_counter() - start)
+    
+    report = {
+        "questions": len(questions),
+        "compile_ms": compile_ms,
+        "legacy_us": time_per_question(legacy_route, questions, args.repeat),
+        "compiled_us": time_per_question(router.route, questions, args.repeat),
+        "differences": [
+            {"question": question, "legacy": legacy_route(question), "compiled": compiled_route(router, question)}
+            for question in questions
+            if legacy_route(question) != compiled_route(router, question)
+        ],
+    }
+    
+    counts = [int(count) for count in args.scale.split(",") if count]
+    report["scaling"] = bench_scaling(questions, counts, max(1, args.repeat // 10))
+    
+    if args.classifier:
+        from models.embedding_service import get_embedding_service
+        embedder = get_embedding_service()
+        classifier = IntentClassifier(embedder, load_rules()["examples"])
+        embeddings = embedder.encode_batch(questions)
+        classifier.classify(embeddings[0])
+        report["classifier_us"] = time_per_question(classifier.classify, embeddings, max(1, args.repeat // 10))
+    
+    print(f"{report['questions']} questions, router compiled in {compile_ms:.2f}ms")
+    print(f"  legacy substring scans  {report['legacy_us']:.2f}us/question")
+    print(f"  compiled router         {report['compiled_us']:.2f}us/question")
+    if "classifier_us" in report:
+        print(f"  embedding classifier    {report['classifier_us']:.2f}us/question (embedding not included)")
+    for count, row in report["scaling"].items():
+        print(f"  +{count} keywords: legacy {row['legacy_us']:.2f}us, compiled {row['compiled_us']:.2f}us")
+    print(f"\n{len(report['differences'])} questions routed differently:")
+    for row in report["differences"]:
+        print(f"  {row['question']!r}\n    legacy {row['legacy']}  compiled {row['compiled']}")
+    
+    if args.output:
+        write_results(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import os
+import json
+import time
+import numpy as np
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Latency percentiles in milliseconds for a list of durations in seconds"""
+    if not samples:
+        return {f"p{point}": None for point in points}
+    values = np.asarray(samples, dtype=np.float64) * 1000
+    return {f"p{point}": float(np.percentile(values, point)) for point in points}
+
+def timed(fn, *args, **kwargs):
+    """Call fn and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def write_results(results, path):
+    """Write benchmark results as JSON, creating the directory if needed"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {path}")
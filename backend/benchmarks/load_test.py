@@ -0,0 +1,195 @@
+"""Open-loop load generator for POST /ask (or /ask/stream)
+
+Sends requests at a fixed target rate regardless of how fast responses come
+back, mixing single-CDP, all-CDP and comparison questions, and reports
+throughput, latency percentiles (per question kind too) and error rates.
+
+By default the app runs in-process with LLM_PROVIDER=fake, so nothing calls
+Groq; tune the stand-in with FAKE_LLM_LATENCY_MS / FAKE_LLM_TOKENS_PER_SEC.
+Pass --url to drive a running server instead (e.g. uvicorn with N workers).
+
+    python benchmarks/load_test.py [--qps 20] [--duration 30] [--mix single=0.6,all=0.3,compare=0.1]
+                                   [--stream] [--url http://localhost:8000] [--output results.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+
+# Add parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from benchmarks.bench_utils import percentiles, write_results
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_SET = os.path.join(BASE_DIR, "benchmarks", "golden_set.json")
+
+ALL_CDP_QUESTIONS = [
+    "How do I create an audience segment?",
+    "How do I track custom events?",
+    "How do I send data to a destination?",
+    "How does identity resolution merge user profiles?",
+    "How do I install the JavaScript SDK on my website?",
+    "How can I export audit logs?",
+]
+
+COMPARISON_QUESTIONS = [
+    "Compare audience creation in Segment and Lytics",
+    "What is the difference between Segment and mParticle for data integration?",
+    "Lytics vs Zeotap for identity resolution",
+    "Which is better for audience creation, mParticle or Zeotap?",
+]
+
+def question_pools(golden_set_path):
+    """(kind -> list of request bodies) for the question mix"""
+    with open(golden_set_path, 'r', encoding='utf-8') as f:
+        golden = json.load(f)
+    return {
+        "single": [{"text": item["question"], "cdp": item["cdp"]} for item in golden],
+        "all": [{"text": question, "cdp": "all"} for question in ALL_CDP_QUESTIONS],
+        "compare": [{"text": question} for question in COMPARISON_QUESTIONS],
+    }
+
+def parse_mix(mix):
+    """"single=0.6,all=0.3,compare=0.1" -> {"single": 0.6, ...}"""
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        weights[kind.strip()] = float(weight)
+    return weights
+
+async def send(client, path, body, stream):
+    """One request; returns (status, latency, time to first token or None)"""
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post(path, json=body)
+        return response.status_code, time.perf_counter() - start, None
+    
+    first_token = None
+    async with client.stream("POST", path, json=body) as response:
+        async for line in response.aiter_lines():
+            if first_token is None and line.startswith("event: token"):
+                first_token = time.perf_counter() - start
+        return response.status_code, time.perf_counter() - start, first_token
+
+async def run_load(client, pools, weights, qps, duration, stream, seed=0):
+    """Fire requests on a fixed schedule and collect one record per request"""
+    rng = random.Random(seed)
+    kinds = [kind for kind in weights if pools.get(kind)]
+    path = "/ask/stream" if stream else "/ask"
+    records = []
+    
+    async def fire(kind, body, lag):
+        try:
+            status, latency, first_token = await send(client, path, body, stream)
+        except Exception as e:
+            status, latency, first_token = type(e).__name__, None, None
+        records.append({"kind": kind, "status": status, "latency": latency, "first_token": first_token, "lag": lag})
+    
+    loop = asyncio.get_running_loop()
+    tasks = []
+    start = loop.time()
+    for index in range(int(qps * duration)):
+        scheduled = start + index / qps
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = rng.choices(kinds, weights=[weights[kind] for kind in kinds])[0]
+        tasks.append(asyncio.ensure_future(fire(kind, rng.choice(pools[kind]), max(0.0, loop.time() - scheduled))))
+    send_time = loop.time() - start
+    await asyncio.gather(*tasks)
+    return records, send_time, loop.time() - start
+
+def summarize(records, send_time, wall_time, qps):
+    """Throughput, latency percentiles and error rates, overall and per kind"""
+    def latency_stats(rows):
+        ok = [row for row in rows if row["status"] == 200]
+        stats = dict(percentiles([row["latency"] for row in ok]), requests=len(rows), errors=len(rows) - len(ok))
+        stats["error_rate"] = stats["errors"] / len(rows) if rows else 0.0
+        first_tokens = [row["first_token"] for row in ok if row["first_token"] is not None]
+        if first_tokens:
+            stats["first_token"] = percentiles(first_tokens)
+        return stats
+    
+    completed = sum(1 for row in records if row["status"] == 200)
+    return {
+        "target_qps": qps,
+        "offered_qps": len(records) / send_time if send_time else None,
+        "throughput_qps": completed / wall_time if wall_time else None,
+        "wall_seconds": wall_time,
+        "status_codes": {str(status): count for status, count in Counter(row["status"] for row in records).items()},
+        "max_schedule_lag_ms": 1000 * max((row["lag"] for row in records), default=0.0),
+        "overall": latency_stats(records),
+        "by_kind": {
+            kind: latency_stats([row for row in records if row["kind"] == kind])
+            for kind in sorted({row["kind"] for row in records})
+        },
+    }
+
+async def run(args):
+    pools = question_pools(args.golden_set)
+    weights = parse_mix(args.mix)
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+            return await run_load(client, pools, weights, args.qps, args.duration, args.stream, args.seed)
+    
+    # In-process: the ASGI transport skips lifespan events, so load the models here
+    import api.main as api_main
+    await api_main.startup_event()
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout, limits=limits) as client:
+        return await run_load(client, pools, weights, args.qps, args.duration, args.stream, args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qps", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds of request arrivals")
+    parser.add_argument("--mix", default="single=0.6,all=0.3,compare=0.1")
+    parser.add_argument("--stream", action="store_true", help="use /ask/stream and record time to first token")
+    parser.add_argument("--url", default=None, help="drive a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--golden-set", default=GOLDEN_SET)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    
+    if not args.url:
+        os.environ.setdefault("LLM_PROVIDER", "fake")
+    
+    records, send_time, wall_time = asyncio.run(run(args))
+    report = summarize(records, send_time, wall_time, args.qps)
+    report["config"] = {
+        "mix": parse_mix(args.mix),
+        "duration": args.duration,
+        "stream": args.stream,
+        "target": args.url or "in-process",
+        "llm_provider": None if args.url else os.getenv("LLM_PROVIDER"),
+    }
+    
+    overall = report["overall"]
+    print(f"\nTarget {args.qps:.1f} qps, offered {report['offered_qps']:.1f} qps, "
+          f"throughput {report['throughput_qps']:.1f} qps over {wall_time:.1f}s")
+    print(f"Errors {overall['errors']}/{overall['requests']} ({100 * overall['error_rate']:.1f}%), "
+          f"status codes {report['status_codes']}, max schedule lag {report['max_schedule_lag_ms']:.1f}ms")
+    for kind, stats in [("overall", overall)] + list(report["by_kind"].items()):
+        if stats["p50"] is None:
+            print(f"  {kind:<10}no successful requests")
+            continue
+        line = f"  {kind:<10}p50 {stats['p50']:.1f}ms  p95 {stats['p95']:.1f}ms  p99 {stats['p99']:.1f}ms"
+        if "first_token" in stats:
+            line += f"  first token p50 {stats['first_token']['p50']:.1f}ms"
+        print(line)
+    
+    if args.output:
+        write_results(report, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Re-export existing indexes as quantized snapshots
+
+Each CDP's current snapshot (or its Chroma collection when it has none) is
+written as a new snapshot version with an int8 or float16 copy of the
+embeddings; a running API picks it up through its index watcher. Pass
+--quantization none to go back to float32-only snapshots.
+
+    python convert_vectorstores.py [--quantization int8] [--cdps segment,lytics] [--keep 2]
+"""
+import os
+import argparse
+from models.index_snapshot import IndexSnapshot
+from models.quantization import QUANTIZATIONS
+from models.retrieval_backends import NumpyBackend
+from processors.document_processor import DocumentProcessor
+
+def directory_size(path):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(path) for name in names
+    )
+
+def convert_cdp(processor, cdp_name, quantization, keep):
+    """Write a new snapshot version of one CDP; returns its path or None"""
+    snapshot = IndexSnapshot.open(processor.snapshot_dir(cdp_name))
+    if snapshot is None:
+        # Nothing exported yet: build the snapshot from the Chroma collection
+        return processor.export_snapshot(cdp_name, keep=keep, quantization=quantization)
+    
+    index = NumpyBackend.from_snapshot(snapshot, hybrid=True)
+    before = index.memory_bytes()
+    path = index.export_snapshot(processor.snapshot_dir(cdp_name), quantization=quantization, keep=keep,
+                                 extra={key: snapshot.manifest.get(key) for key in ('cdp', 'embedding_model')})
+    converted = NumpyBackend.from_snapshot(IndexSnapshot.open(processor.snapshot_dir(cdp_name)), hybrid=True)
+    print(f"Converted {cdp_name} ({index.count()} vectors) to {quantization or 'float32'}: "
+          f"scanned index {before / 2 ** 20:.2f}MB -> {converted.memory_bytes() / 2 ** 20:.2f}MB, "
+          f"{directory_size(path) / 2 ** 20:.2f}MB on disk")
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quantization", default="int8", choices=QUANTIZATIONS + ("none",))
+    parser.add_argument("--cdps", default="segment,mparticle,lytics,zeotap")
+    parser.add_argument("--keep", type=int, default=2, help="snapshot versions to keep per CDP")
+    args = parser.parse_args()
+    
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    processor = DocumentProcessor(os.path.join(base_dir, "data"), os.path.join(base_dir, "vectorstores"))
+    quantization = None if args.quantization == "none" else args.quantization
+    
+    for cdp_name in args.cdps.split(","):
+        try:
+            if convert_cdp(processor, cdp_name.strip(), quantization, args.keep) is None:
+                print(f"No index found for {cdp_name}")
+        except Exception as e:
+            print(f"Error converting {cdp_name}: {e}")
+
+if __name__ == "__main__":
+    main()
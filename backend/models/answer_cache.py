@@ -0,0 +1,149 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class AnswerCache:
+    """Two-tier cache in front of the QA pipeline
+
+    Tier 1 is an exact-match LRU keyed on the normalized question text, checked
+    before any work is done. Tier 2 is a semantic cache keyed on the question
+    embedding: a lookup returns the cached answer of the most similar earlier
+    question if its cosine similarity clears the threshold. Entries are scoped
+    (per CDP, or "all" for cross-CDP answers), expire after a TTL, are evicted
+    least-recently-used beyond max_entries, and record which CDPs they depend
+    on so a re-indexed CDP can be invalidated.
+    """
+    def __init__(self, max_entries=1024, ttl=3600, similarity_threshold=0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._exact = OrderedDict()
+        self._semantic = OrderedDict()
+        self._matrices = {}
+        self._lock = threading.Lock()
+        self.metrics = {
+            'exact_hits': 0, 'exact_misses': 0,
+            'semantic_hits': 0, 'semantic_misses': 0,
+            'evictions': 0, 'expirations': 0, 'invalidations': 0,
+        }
+    
+    @staticmethod
+    def normalize(question):
+        """Lowercase, collapse whitespace and drop trailing punctuation"""
+        return re.sub(r'\s+', ' ', question.lower()).strip().rstrip('?!. ')
+    
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry['created'] > self.ttl
+    
+    def _evict(self, store):
+        while len(store) > self.max_entries:
+            key, _ = store.popitem(last=False)
+            self._matrices.pop(key[0], None)
+            self.metrics['evictions'] += 1
+    
+    def get_exact(self, scope, question):
+        """Cached value for exactly this (normalized) question, or None"""
+        key = (scope, self.normalize(question))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._exact[key]
+                self.metrics['expirations'] += 1
+                entry = None
+            if entry is None:
+                self.metrics['exact_misses'] += 1
+                return None
+            self._exact.move_to_end(key)
+            self.metrics['exact_hits'] += 1
+            return entry['value']
+    
+    def _scope_matrix(self, scope):
+        """Stacked normalized embeddings of a scope's semantic entries (rebuilt after changes)"""
+        cached = self._matrices.get(scope)
+        if cached is None:
+            keys = [key for key in self._semantic if key[0] == scope]
+            if keys:
+                matrix = np.stack([self._semantic[key]['embedding'] for key in keys])
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            cached = (keys, matrix)
+            self._matrices[scope] = cached
+        return cached
+    
+    def get_semantic(self, scope, embedding):
+        """Cached value of the most similar earlier question above the threshold, or None"""
+        query = self._unit(embedding)
+        now = time.monotonic()
+        with self._lock:
+            keys, matrix = self._scope_matrix(scope)
+            if not keys:
+                self.metrics['semantic_misses'] += 1
+                return None
+            
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            key = keys[best]
+            entry = self._semantic.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._semantic[key]
+                self._matrices.pop(scope, None)
+                self.metrics['expirations'] += 1
+                entry = None
+            if entry is None or similarities[best] < self.similarity_threshold:
+                self.metrics['semantic_misses'] += 1
+                return None
+            
+            self._semantic.move_to_end(key)
+            self.metrics['semantic_hits'] += 1
+            return entry['value']
+    
+    def put(self, scope, question, embedding, value, cdps=None):
+        """Store a value in both tiers; cdps lists the collections it was built from"""
+        normalized = self.normalize(question)
+        entry = {
+            'value': value,
+            'created': time.monotonic(),
+            'cdps': set(cdps or [scope]),
+        }
+        with self._lock:
+            self._exact[(scope, normalized)] = entry
+            self._exact.move_to_end((scope, normalized))
+            self._evict(self._exact)
+            if embedding is not None:
+                self._semantic[(scope, normalized)] = dict(entry, embedding=self._unit(embedding))
+                self._semantic.move_to_end((scope, normalized))
+                self._matrices.pop(scope, None)
+                self._evict(self._semantic)
+    
+    def invalidate(self, cdp=None):
+        """Drop every entry that depends on a CDP (or everything if cdp is None)"""
+        with self._lock:
+            removed = 0
+            for store in (self._exact, self._semantic):
+                stale = [key for key, entry in store.items() if cdp is None or cdp in entry['cdps']]
+                for key in stale:
+                    del store[key]
+                removed += len(stale)
+            self._matrices.clear()
+            self.metrics['invalidations'] += removed
+            return removed
+    
+    def stats(self):
+        """Hit/miss counters, hit rates and current sizes"""
+        with self._lock:
+            stats = dict(self.metrics)
+            stats['exact_entries'] = len(self._exact)
+            stats['semantic_entries'] = len(self._semantic)
+        for tier in ('exact', 'semantic'):
+            lookups = stats[f'{tier}_hits'] + stats[f'{tier}_misses']
+            stats[f'{tier}_hit_rate'] = stats[f'{tier}_hits'] / lookups if lookups else 0.0
+        return stats
+    
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import time
+import numpy as np
+from collections import Counter
+from models.lexical_index import tokenize
+from models.retrieval_backends import normalize_rows, normalize_vector, spherical_kmeans
+
+COMPARISON_FILE = "comparisons.json"
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+def summarize_chunk(text, max_chars=320):
+    """Leading sentences of a chunk's prose, without markdown headings and list markers"""
+    lines = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#") or line.startswith("```"):
+            continue
+        lines.append(re.sub(r"^(?:[-*]|\d+[.)])\s+", "", line))
+    sentences = SENTENCE_BOUNDARY.split(" ".join(lines).lstrip(".,;: "))
+    # Chunks can start mid-sentence (the splitter's overlap); skip the fragment,
+    # or at least the cut-off word
+    if sentences[0][:1].islower():
+        if len(sentences) > 1:
+            sentences = sentences[1:]
+        else:
+            sentences[0] = sentences[0].partition(" ")[2]
+    summary = ""
+    for sentence in sentences:
+        if summary and len(summary) + len(sentence) + 1 > max_chars:
+            break
+        summary = f"{summary} {sentence}".strip()
+    return summary[:max_chars]
+
+def topic_labels(texts_by_topic, exclude=(), n_terms=3, min_chunks=2):
+    """Most distinctive terms of each topic
+    
+    A term scores the number of the topic's chunks containing it times its
+    inverse topic frequency, so terms found in every topic score 0 and terms
+    of a single chunk are ignored.
+    """
+    counts = []
+    for texts in texts_by_topic:
+        chunk_counts = Counter(
+            term for text in texts for term in set(tokenize(text))
+            if term.isalpha() and len(term) > 2 and term not in exclude
+        )
+        counts.append(Counter({term: count for term, count in chunk_counts.items() if count >= min(min_chunks, len(texts))}))
+    doc_freq = Counter(term for topic_counts in counts for term in topic_counts)
+    labels = []
+    for topic_counts in counts:
+        scored = sorted(
+            topic_counts,
+            key=lambda term: -topic_counts[term] * np.log(len(counts) / doc_freq[term])
+        )
+        labels.append(scored[:n_terms])
+    return labels
+
+class ComparisonIndex:
+    """Precomputed per-topic, per-CDP summaries for comparison questions
+
+    Built offline: the chunks of every CDP are clustered together by
+    embedding (spherical k-means), so each topic groups what the CDPs say
+    about the same thing. For every (topic, CDP) pair the index keeps the
+    centroid of that CDP's chunks in the topic and a short extractive summary
+    of the chunk closest to it, with its source URLs.
+
+    At query time the question embedding is scored against the centroids of
+    the CDPs being compared and the best-covered topic is returned: a few
+    small matrix products, no LLM call.
+
+    Layout under the directory:
+        comparisons.json                     topics, summaries and sources
+        centroids.<version>.npy             float32 (topics, cdps, dim)
+    """
+    def __init__(self, cdps, topics, centroids, version=None, mtime=None):
+        self.cdps = cdps
+        self.topics = topics
+        self.centroids = centroids
+        self.version = version
+        self.mtime = mtime
+        self.cdp_columns = {cdp: column for column, cdp in enumerate(cdps)}
+        self.present = np.array(
+            [[cdp in topic["entries"] for cdp in cdps] for topic in topics], dtype=bool
+        ).reshape(len(topics), len(cdps))
+    
+    @classmethod
+    def build(cls, chunks_by_cdp, n_topics=None, seed=0):
+        """Cluster {cdp: (embeddings, documents, metadatas)} into a comparison index"""
+        cdps = [cdp for cdp, (embeddings, _, _) in chunks_by_cdp.items() if len(embeddings)]
+        if not cdps:
+            return None
+        matrices = [normalize_rows(chunks_by_cdp[cdp][0]) for cdp in cdps]
+        matrix = np.concatenate(matrices)
+        owners = np.concatenate([np.full(len(rows), column) for column, rows in enumerate(matrices)])
+        documents = [document for cdp in cdps for document in chunks_by_cdp[cdp][1]]
+        metadatas = [metadata or {} for cdp in cdps for metadata in chunks_by_cdp[cdp][2]]
+        
+        n_topics = n_topics or int(np.clip(np.sqrt(len(matrix) / 2), 4, 64))
+        topic_centroids, assignment = spherical_kmeans(matrix, n_topics, seed=seed)
+        
+        labels = topic_labels(
+            [[documents[row] for row in np.flatnonzero(assignment == topic)] for topic in range(len(topic_centroids))],
+            exclude=set(cdps)
+        )
+        centroids = np.zeros((len(topic_centroids), len(cdps), matrix.shape[1]), dtype=np.float32)
+        topics = []
+        kept = []
+        for topic in range(len(topic_centroids)):
+            entries = {}
+            for column, cdp in enumerate(cdps):
+                rows = np.flatnonzero((assignment == topic) & (owners == column))
+                if not len(rows):
+                    continue
+                centroid = normalize_vector(matrix[rows].mean(axis=0))
+                centroids[topic, column] = centroid
+                ranked = rows[np.argsort(-(matrix[rows] @ centroid))]
+                # Among the most central chunks, prefer one that starts at a sentence or heading
+                best = next((row for row in ranked[:5] if documents[row].lstrip()[:1].isupper()
+                             or documents[row].lstrip().startswith("#")), ranked[0])
+                sources = []
+                for row in ranked:
+                    url = metadatas[row].get('url')
+                    if url and url not in sources:
+                        sources.append(url)
+                    if len(sources) == 2:
+                        break
+                entries[cdp] = {
+                    "title": metadatas[best].get('title', ''),
+                    "summary": summarize_chunk(documents[best]),
+                    "sources": sources,
+                    "chunks": int(len(rows)),
+                }
+            # k-means can leave a cluster empty
+            if entries:
+                topics.append({"label": ", ".join(labels[topic]), "terms": labels[topic], "entries": entries})
+                kept.append(topic)
+        return cls(cdps, topics, centroids[kept])
+    
+    def save(self, directory):
+        """Write a new version and swap the JSON that points at it atomically"""
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        version = time.time_ns()
+        centroids_file = f"centroids.{version}.npy"
+        np.save(os.path.join(directory, centroids_file), self.centroids)
+        
+        payload = {"version": version, "cdps": self.cdps, "centroids": centroids_file, "topics": self.topics}
+        tmp_path = os.path.join(directory, COMPARISON_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, os.path.join(directory, COMPARISON_FILE))
+        
+        for name in os.listdir(directory):
+            if name.startswith("centroids.") and name != centroids_file:
+                os.remove(os.path.join(directory, name))
+        self.version = version
+        return os.path.join(directory, COMPARISON_FILE)
+    
+    @classmethod
+    def load(cls, directory):
+        """The saved index, or None if none was built"""
+        path = os.path.join(directory, COMPARISON_FILE)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, 'r', encoding='utf-8') as f:
+                payload = json.load(f)
+            centroids = np.load(os.path.join(directory, payload["centroids"]))
+        except (OSError, ValueError, KeyError) as e:
+            if os.path.exists(path):
+                print(f"Error loading comparison index from {directory}: {e}")
+            return None
+        return cls(payload["cdps"], payload["topics"], centroids, payload["version"], mtime)
+    
+    @classmethod
+    def load_if_changed(cls, directory, current=None):
+        """current unless the index on disk was rebuilt since it was loaded"""
+        try:
+            mtime = os.stat(os.path.join(directory, COMPARISON_FILE)).st_mtime_ns
+        except OSError:
+            return current
+        if current is not None and current.mtime == mtime:
+            return current
+        return cls.load(directory) or current
+    
+    def lookup(self, question_embedding, cdps=None, min_similarity=0.2):
+        """(topic, {cdp: entry}) best matching the question for the given CDPs
+
+        Topics are scored by the mean similarity of the question to each
+        compared CDP's centroid in the topic (a CDP with nothing on the topic
+        counts as -1). CDPs missing from the chosen topic get their own best
+        topic's entry. Returns (None, {}) when nothing clears min_similarity.
+        """
+        columns = [self.cdp_columns[cdp] for cdp in (cdps or self.cdps) if cdp in self.cdp_columns]
+        if not columns or not self.topics:
+            return None, {}
+        query = normalize_vector(question_embedding)
+        similarity = self.centroids[:, columns] @ query
+        similarity = np.where(self.present[:, columns], similarity, -1.0)
+        scores = similarity.mean(axis=1)
+        best = int(np.argmax(scores))
+        if scores[best] < min_similarity:
+            return None, {}
+        
+        topic = self.topics[best]
+        entries = {}
+        for position, column in enumerate(columns):
+            cdp = self.cdps[column]
+            if cdp in topic["entries"]:
+                entries[cdp] = topic["entries"][cdp]
+            else:
+                fallback = int(np.argmax(similarity[:, position]))
+                if similarity[fallback, position] >= min_similarity:
+                    entries[cdp] = self.topics[fallback]["entries"][cdp]
+        return topic, entries
+    
+    def stats(self):
+        return {
+            "version": self.version,
+            "topics": len(self.topics),
+            "cdps": self.cdps,
+            "labels": [topic["label"] for topic in self.topics],
+        }
@@ -0,0 +1,192 @@
+import os
+import re
+import numpy as np
+
+def estimate_tokens(text):
+    """Cheap token count estimate (~4 characters per token for English BPE vocabularies)"""
+    return (len(text) + 3) // 4
+
+def ranked_beyond_distance(results):
+    """Whether the first query's hits are in an order vector distance does not give
+    
+    True for reranked results and for hybrid results fused with BM25, whose
+    lexical-only hits can have poor cosine distances; their result rank is
+    the relevance order to keep.
+    """
+    fused = results.get('fused')
+    return bool(results.get('rerank_scores')) or bool(fused and fused[0])
+
+def merge_overlapping(left, right, min_overlap=8, max_overlap=64):
+    """Join two consecutive chunks, dropping the text the splitter repeated between them
+
+    max_overlap should be at least the splitter's chunk_overlap (50 by default).
+    """
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+class ContextPiece:
+    """One passage of the assembled context: a chunk or a run of adjacent chunks"""
+    def __init__(self, text, metadata, distance, rank, embedding):
+        self.text = text
+        self.metadata = metadata
+        self.distance = distance
+        self.rank = rank
+        self.embedding = embedding
+        self.first_chunk = metadata.get('chunk_id')
+        self.last_chunk = self.first_chunk
+        self.chunks = 1
+
+class AssembledContext:
+    def __init__(self, text, pieces, tokens, stats):
+        self.text = text
+        self.pieces = pieces
+        self.tokens = tokens
+        self.stats = stats
+
+class ContextAssembler:
+    """Turns retrieval results into a compact prompt context
+
+    1. Chunks of the same document with consecutive chunk_ids are collapsed
+       into one passage, removing the splitter's overlap.
+    2. Passages whose embedding is nearly identical to a more relevant one
+       (mirrored pages, repeated boilerplate) are dropped.
+    3. Passages are ordered by relevance: best distance first for plain
+       vector results, result rank for fused or reranked ones.
+    4. They are packed into token_budget using a character-based estimate;
+       the first passage that does not fit is cut at a sentence boundary if
+       at least min_piece_tokens remain (filling the budget), otherwise it is
+       skipped in favour of shorter, less relevant passages.
+    """
+    def __init__(self, token_budget=1200, similarity_threshold=0.95, min_piece_tokens=48, separator="\n\n"):
+        self.token_budget = token_budget
+        self.similarity_threshold = similarity_threshold
+        self.min_piece_tokens = min_piece_tokens
+        self.separator = separator
+    
+    @classmethod
+    def from_env(cls):
+        return cls(
+            token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200")),
+            similarity_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.95"))
+        )
+    
+    def pieces_from_results(self, results):
+        """Chunks of the first query in a Chroma-format result, as pieces in rank order"""
+        documents = results['documents'][0] if results.get('documents') else []
+        metadatas = results['metadatas'][0] if results.get('metadatas') else []
+        distances = results['distances'][0] if results.get('distances') else []
+        embeddings = results['embeddings'][0] if results.get('embeddings') is not None and len(results['embeddings']) else []
+        
+        pieces = []
+        for rank, document in enumerate(documents):
+            if not document:
+                continue
+            metadata = (metadatas[rank] if rank < len(metadatas) else None) or {}
+            distance = distances[rank] if rank < len(distances) else float(rank)
+            embedding = np.asarray(embeddings[rank], dtype=np.float32) if rank < len(embeddings) else None
+            pieces.append(ContextPiece(document, metadata, distance, rank, embedding))
+        return pieces
+    
+    def collapse_adjacent(self, pieces):
+        """Merge chunks of the same document whose chunk_ids are consecutive"""
+        by_document = {}
+        for piece in pieces:
+            document_key = piece.metadata.get('url') or piece.metadata.get('title')
+            if document_key is None or piece.first_chunk is None:
+                by_document[('rank', piece.rank)] = [piece]
+            else:
+                by_document.setdefault(document_key, []).append(piece)
+        
+        collapsed = []
+        for group in by_document.values():
+            group.sort(key=lambda piece: piece.first_chunk if piece.first_chunk is not None else -1)
+            current = group[0]
+            for piece in group[1:]:
+                if current.last_chunk is not None and piece.first_chunk == current.last_chunk + 1:
+                    current.text = merge_overlapping(current.text, piece.text)
+                    current.last_chunk = piece.first_chunk
+                    current.chunks += 1
+                    # The passage is as relevant as its best chunk
+                    if piece.distance < current.distance:
+                        current.distance, current.embedding = piece.distance, piece.embedding
+                    current.rank = min(current.rank, piece.rank)
+                else:
+                    collapsed.append(current)
+                    current = piece
+            collapsed.append(current)
+        return collapsed
+    
+    def drop_near_duplicates(self, pieces):
+        """Keep the most relevant of every group of near-identical passages (pieces must be sorted)"""
+        kept = []
+        kept_vectors = []
+        seen_texts = set()
+        for piece in pieces:
+            normalized = re.sub(r'\s+', ' ', piece.text).strip().lower()
+            if normalized in seen_texts:
+                continue
+            if piece.embedding is not None and kept_vectors:
+                vector = piece.embedding / (np.linalg.norm(piece.embedding) or 1.0)
+                if float(np.max(np.stack(kept_vectors) @ vector)) >= self.similarity_threshold:
+                    continue
+            seen_texts.add(normalized)
+            if piece.embedding is not None:
+                kept_vectors.append(piece.embedding / (np.linalg.norm(piece.embedding) or 1.0))
+            kept.append(piece)
+        return kept
+    
+    def truncate(self, text, max_tokens):
+        """Longest prefix within max_tokens, cut at a sentence (or failing that, word) boundary"""
+        limit = max_tokens * 4
+        if len(text) <= limit:
+            return text
+        prefix = text[:limit]
+        cut = max(prefix.rfind(". "), prefix.rfind(".\n"), prefix.rfind("\n"))
+        if cut < limit // 2:
+            cut = prefix.rfind(" ")
+        return prefix[:cut + 1].rstrip() if cut > 0 else prefix
+    
+    def assemble(self, results):
+        """Build the context for one query's results"""
+        pieces = self.pieces_from_results(results)
+        # What joining every chunk verbatim would have cost
+        input_tokens = estimate_tokens(self.separator.join(piece.text for piece in pieces))
+        collapsed = self.collapse_adjacent(pieces)
+        if ranked_beyond_distance(results):
+            collapsed.sort(key=lambda piece: piece.rank)
+        else:
+            collapsed.sort(key=lambda piece: (piece.distance, piece.rank))
+        distinct = self.drop_near_duplicates(collapsed)
+        
+        packed = []
+        used = 0
+        truncated = 0
+        separator_tokens = estimate_tokens(self.separator)
+        for piece in distinct:
+            cost = estimate_tokens(piece.text) + (separator_tokens if packed else 0)
+            remaining = self.token_budget - used
+            if cost <= remaining:
+                packed.append(piece)
+                used += cost
+                continue
+            if remaining - separator_tokens >= self.min_piece_tokens:
+                piece.text = self.truncate(piece.text, remaining - separator_tokens)
+                packed.append(piece)
+                truncated += 1
+                break
+            # Too little room left to be worth cutting; a shorter passage may still fit
+        
+        text = self.separator.join(piece.text for piece in packed)
+        stats = {
+            'chunks': len(pieces),
+            'passages': len(collapsed),
+            'near_duplicates': len(collapsed) - len(distinct),
+            'packed': len(packed),
+            'truncated': truncated,
+            'dropped': len(distinct) - len(packed),
+            'input_tokens': input_tokens,
+            'context_tokens': estimate_tokens(text),
+        }
+        return AssembledContext(text, packed, stats['context_tokens'], stats)
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+class EmbeddingBatcher:
+    """Coalesces concurrent single-question encodes into one batched model call
+
+    Callers await encode(text). Requests are collected until max_batch_size is
+    reached or max_wait_ms has passed since the first one arrived, then encoded
+    together on the default executor and each caller's future is resolved.
+    """
+    # Upper bounds of the batch-size histogram buckets
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+    
+    def __init__(self, embedder, max_batch_size=32, max_wait_ms=5.0):
+        self.embedder = embedder
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._pending = []
+        self._timer = None
+        # Strong references to in-flight batches; the event loop only keeps weak ones
+        self._tasks = set()
+        self.metrics = {
+            'requests': 0,
+            'batches': 0,
+            'batched_requests': 0,
+            'errors': 0,
+            'max_batch_size': 0,
+            'queue_delay_total': 0.0,
+            'queue_delay_max': 0.0,
+            'encode_time_total': 0.0,
+            'batch_size_histogram': {bucket: 0 for bucket in self.BATCH_SIZE_BUCKETS + ('+Inf',)},
+        }
+    
+    async def encode(self, text):
+        """Embed one string, sharing a model call with concurrent callers"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        self.metrics['requests'] += 1
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+    
+    async def _run(self, batch):
+        started = time.perf_counter()
+        texts = [text for text, _, _ in batch]
+        self._record_batch(batch, started)
+        
+        loop = asyncio.get_running_loop()
+        try:
+            embeddings = await loop.run_in_executor(None, self.embedder.encode_batch, texts)
+        except Exception as e:
+            self.metrics['errors'] += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        self.metrics['encode_time_total'] += time.perf_counter() - started
+        for (_, future, _), embedding in zip(batch, embeddings):
+            # A caller may have been cancelled (e.g. client disconnected)
+            if not future.done():
+                future.set_result(embedding)
+    
+    def _record_batch(self, batch, started):
+        size = len(batch)
+        self.metrics['batches'] += 1
+        self.metrics['batched_requests'] += size
+        self.metrics['max_batch_size'] = max(self.metrics['max_batch_size'], size)
+        bucket = next((bound for bound in self.BATCH_SIZE_BUCKETS if size <= bound), '+Inf')
+        self.metrics['batch_size_histogram'][bucket] += 1
+        for _, _, enqueued in batch:
+            delay = started - enqueued
+            self.metrics['queue_delay_total'] += delay
+            self.metrics['queue_delay_max'] = max(self.metrics['queue_delay_max'], delay)
+    
+    def stats(self):
+        """Batch size and queue delay metrics for tuning max_batch_size / max_wait_ms"""
+        metrics = self.metrics
+        batches = metrics['batches']
+        batched_requests = metrics['batched_requests']
+        return {
+            'requests': metrics['requests'],
+            'batches': batches,
+            'errors': metrics['errors'],
+            'avg_batch_size': batched_requests / batches if batches else 0.0,
+            'max_batch_size': metrics['max_batch_size'],
+            'batch_size_histogram': {str(bucket): count for bucket, count in metrics['batch_size_histogram'].items()},
+            'avg_queue_delay_ms': 1000 * metrics['queue_delay_total'] / batched_requests if batched_requests else 0.0,
+            'max_queue_delay_ms': 1000 * metrics['queue_delay_max'],
+            'avg_encode_ms': 1000 * metrics['encode_time_total'] / batches if batches else 0.0,
+            'max_wait_ms': 1000 * self.max_wait,
+            'max_batch_size_limit': self.max_batch_size,
+        }
@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import unicodedata
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, share a cache from one process only
+    fcntl = None
+
+KEY_BYTES = 20
+META_FILE = "meta.json"
+
+def normalize_text(text):
+    """Text as it is hashed: Unicode NFC with whitespace runs collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def text_key(text):
+    """20-byte SHA-1 digest of the normalized text"""
+    return hashlib.sha1(normalize_text(text).encode('utf-8')).digest()
+
+def model_slug(model_name):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_name)
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed by (model name, normalized text hash)
+
+    Each model gets its own directory, so switching models never returns a
+    stale vector. Layout under directory/<model>/:
+        meta.json                model name, dimension and current generation
+        vectors.<generation>.f32 float32 rows, memory-mapped for lookups
+        keys.<generation>.bin    SHA-1 digest of each row's normalized text
+
+    Both files are append-only between compactions, vectors written before
+    keys, so a complete key always has its row. Appends hold an exclusive
+    file lock and readers need none, which lets the indexer and the API share
+    a cache: each process picks up rows appended elsewhere from the key
+    file's size (at most every refresh_seconds on lookups).
+
+    When the vectors outgrow max_bytes the cache is compacted into a new
+    generation of low_water * max_bytes, keeping the rows this process used
+    most recently and then the newest ones.
+    """
+    def __init__(self, directory, model_name, max_bytes=512 * 2 ** 20, low_water=0.8, refresh_seconds=1.0):
+        self.directory = os.path.join(directory, model_slug(model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.refresh_seconds = refresh_seconds
+        self.dim = None
+        self.generation = None
+        self._rows = {}
+        self._used = {}
+        self._tick = 0
+        self._keys_size = 0
+        self._vectors = None
+        self._refreshed = 0.0
+        self._lock = threading.RLock()
+        self.metrics = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0, 'compactions': 0}
+        with self._lock:
+            self._refresh()
+    
+    def _path(self, kind, generation=None):
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"{kind}.{generation}.{'f32' if kind == 'vectors' else 'bin'}")
+    
+    @contextmanager
+    def _file_lock(self):
+        with open(os.path.join(self.directory, "lock"), 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+    
+    def _read_meta(self):
+        try:
+            with open(os.path.join(self.directory, META_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_meta(self, generation, dim):
+        tmp_path = os.path.join(self.directory, META_FILE + ".tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"model": self.model_name, "dim": dim, "dtype": "float32", "generation": generation}, f)
+        os.replace(tmp_path, os.path.join(self.directory, META_FILE))
+    
+    def _reset(self, generation, dim):
+        self.generation = generation
+        self.dim = dim
+        self._rows = {}
+        self._used = {}
+        self._keys_size = 0
+        self._vectors = None
+    
+    def _refresh(self):
+        """Pick up rows appended, or a compaction done, by any process since the last look"""
+        self._refreshed = time.monotonic()
+        meta = self._read_meta()
+        if meta is None:
+            return
+        if meta["generation"] != self.generation:
+            self._reset(meta["generation"], meta["dim"])
+        try:
+            with open(self._path("keys"), 'rb') as f:
+                f.seek(self._keys_size)
+                data = f.read()
+        except OSError:
+            # Compacted between reading the meta and opening its files; the next look sees it
+            return
+        data = data[:len(data) - len(data) % KEY_BYTES]
+        first = self._keys_size // KEY_BYTES
+        for offset in range(0, len(data), KEY_BYTES):
+            self._rows.setdefault(data[offset:offset + KEY_BYTES], first + offset // KEY_BYTES)
+        self._keys_size += len(data)
+    
+    def __len__(self):
+        return self._keys_size // KEY_BYTES
+    
+    def _matrix(self):
+        rows = len(self)
+        if rows and (self._vectors is None or self._vectors.shape[0] < rows):
+            self._vectors = np.memmap(self._path("vectors"), dtype=np.float32, mode='r', shape=(rows, self.dim))
+        return self._vectors
+    
+    def get_many(self, texts):
+        """Cached embedding (float32 array) of each text, None where missing"""
+        keys = [text_key(text) for text in texts]
+        with self._lock:
+            if time.monotonic() - self._refreshed >= self.refresh_seconds:
+                self._refresh()
+            rows = [self._rows.get(key) for key in keys]
+            found = [row for row in rows if row is not None]
+            vectors = iter(np.array(self._matrix()[found]) if found else ())
+            for row in found:
+                self._tick += 1
+                self._used[row] = self._tick
+            self.metrics['hits'] += len(found)
+            self.metrics['misses'] += len(rows) - len(found)
+        return [next(vectors) if row is not None else None for row in rows]
+    
+    def put_many(self, texts, embeddings):
+        """Append the embeddings of texts not cached yet"""
+        embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        if not len(texts):
+            return
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                generation = time.time_ns()
+                self._reset(generation, embeddings.shape[1])
+                open(self._path("vectors"), 'wb').close()
+                open(self._path("keys"), 'wb').close()
+                self._write_meta(generation, self.dim)
+            elif embeddings.shape[1] != self.dim:
+                print(f"Not caching {embeddings.shape[1]}-dim embeddings in the {self.dim}-dim cache of {self.model_name}")
+                return
+            
+            new = {}
+            for position, text in enumerate(texts):
+                key = text_key(text)
+                if key not in self._rows and key not in new:
+                    new[key] = position
+            if not new:
+                return
+            
+            base = len(self)
+            # Drop whatever a writer that crashed mid-append left past the last complete key
+            with open(self._path("vectors"), 'r+b') as f:
+                f.truncate(base * self.dim * 4)
+                f.seek(0, os.SEEK_END)
+                f.write(embeddings[list(new.values())].tobytes())
+            with open(self._path("keys"), 'r+b') as f:
+                f.truncate(self._keys_size)
+                f.seek(0, os.SEEK_END)
+                f.write(b"".join(new))
+            for offset, key in enumerate(new):
+                self._rows[key] = base + offset
+            self._keys_size += len(new) * KEY_BYTES
+            self.metrics['writes'] += len(new)
+            
+            if len(self) * self.dim * 4 > self.max_bytes:
+                self._compact()
+    
+    def _compact(self, block_rows=8192):
+        """Rewrite the cache as a new generation holding the rows worth keeping"""
+        keep = max(0, int(self.low_water * self.max_bytes) // (self.dim * 4))
+        key_of = {row: key for key, row in self._rows.items()}
+        kept = sorted(key_of, key=lambda row: (self._used.get(row, 0), row), reverse=True)[:keep]
+        kept.sort()
+        
+        matrix = self._matrix()
+        old_generation = self.generation
+        generation = time.time_ns()
+        with open(self._path("vectors", generation), 'wb') as f:
+            for start in range(0, len(kept), block_rows):
+                f.write(np.ascontiguousarray(matrix[kept[start:start + block_rows]]).tobytes())
+        with open(self._path("keys", generation), 'wb') as f:
+            f.write(b"".join(key_of[row] for row in kept))
+        self._write_meta(generation, self.dim)
+        
+        used = self._used
+        self.metrics['evictions'] += len(key_of) - len(kept)
+        self.metrics['compactions'] += 1
+        self._reset(generation, self.dim)
+        for new_row, row in enumerate(kept):
+            self._rows[key_of[row]] = new_row
+            if row in used:
+                self._used[new_row] = used[row]
+        self._keys_size = len(kept) * KEY_BYTES
+        
+        for kind in ("vectors", "keys"):
+            try:
+                os.remove(self._path(kind, old_generation))
+            except OSError:
+                # Still mapped by a reader on a platform that forbids removing it
+                pass
+    
+    def stats(self):
+        """Hit rate, size and eviction counts"""
+        with self._lock:
+            stats = dict(self.metrics, entries=len(self), bytes=len(self) * (self.dim or 0) * 4 + self._keys_size)
+        lookups = stats['hits'] + stats['misses']
+        return dict(
+            stats,
+            model=self.model_name,
+            max_bytes=self.max_bytes,
+            hit_rate=stats['hits'] / lookups if lookups else 0.0
+        )
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import threading
+import numpy as np
+from sentence_transformers import SentenceTransformer
+from models.embedding_batcher import EmbeddingBatcher
+from models.embedding_cache import EmbeddingCache, model_slug
+from models.encode_pool import EncodePool
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+class EmbeddingService:
+    """Process-wide embedding model shared by the API and the document processor"""
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, model_name=DEFAULT_MODEL_NAME):
+        self.model_name = model_name
+        print(f"Loading embedding model {model_name}...")
+        self.model = SentenceTransformer(model_name)
+        self.batcher = None
+        self.cache = None
+        self.pool = None
+        self.pool_min_texts = 64
+
+    @classmethod
+    def get_instance(cls, model_name=DEFAULT_MODEL_NAME):
+        """Return the shared service for a model, loading it on first use"""
+        instance = cls._instances.get(model_name)
+        if instance is None:
+            with cls._instances_lock:
+                instance = cls._instances.get(model_name)
+                if instance is None:
+                    instance = cls(model_name)
+                    cls._instances[model_name] = instance
+        return instance
+
+    def encode(self, texts, batch_size=32, use_cache=False):
+        """Encode a string or a list of strings (same contract as SentenceTransformer.encode)
+
+        With use_cache and a cache enabled, only the texts it misses reach the
+        model and their embeddings are added to it. Document indexing opts in;
+        questions are rarely seen twice, so query encodes skip the cache and
+        its file lock.
+        """
+        if not use_cache or self.cache is None:
+            return self.encode_uncached(texts, batch_size)
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        embeddings = self.cache.get_many(texts)
+        missing = [position for position, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self.encode_uncached([texts[position] for position in missing], batch_size)
+            computed = np.asarray(computed, dtype=np.float32).reshape(len(missing), -1)
+            try:
+                self.cache.put_many([texts[position] for position in missing], computed)
+            except OSError as e:
+                print(f"Error writing to the embedding cache: {e}")
+            for position, embedding in zip(missing, computed):
+                embeddings[position] = embedding
+        if single:
+            return embeddings[0]
+        return np.stack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32)
+
+    def encode_uncached(self, texts, batch_size=32):
+        """Model call, on the process pool for batches large enough to be worth shipping there"""
+        if self.pool is not None and not isinstance(texts, str) and len(texts) >= self.pool_min_texts:
+            return self.pool.encode(texts, batch_size=batch_size)
+        return self.model.encode(texts, batch_size=batch_size, show_progress_bar=False)
+
+    def encode_one(self, text):
+        """Encode a single string and return its embedding as a list of floats"""
+        return self.encode(text).tolist()
+
+    def encode_batch(self, texts, batch_size=32):
+        """Encode a list of strings and return a list of embeddings"""
+        if not texts:
+            return []
+        return self.encode(list(texts), batch_size=batch_size).tolist()
+
+    def enable_cache(self, directory, max_bytes=512 * 2 ** 20):
+        """Keep embeddings for encode(..., use_cache=True) in a disk cache under directory (max_bytes <= 0 disables it)"""
+        if max_bytes <= 0:
+            self.cache = None
+        elif self.cache is None or self.cache.directory != os.path.join(directory, model_slug(self.model_name)):
+            self.cache = EmbeddingCache(directory, self.model_name, max_bytes=max_bytes)
+        else:
+            self.cache.max_bytes = max_bytes
+        return self.cache
+
+    def enable_pool(self, processes, threads_per_worker=None, min_texts=64):
+        """Embed batches of at least min_texts on a pool of worker processes (processes <= 1 disables it)
+
+        min_texts is low enough for the indexing pipeline's batches (16 pages)
+        to be sharded across the workers; single questions never reach the pool.
+        """
+        if self.pool is not None and (processes <= 1 or self.pool.processes != processes
+                                      or (threads_per_worker and self.pool.threads_per_worker != threads_per_worker)):
+            self.pool.close()
+            self.pool = None
+        if processes > 1 and self.pool is None:
+            self.pool = EncodePool(self.model_name, processes=processes, threads_per_worker=threads_per_worker)
+        self.pool_min_texts = min_texts
+        return self.pool
+
+    def enable_batching(self, max_batch_size=32, max_wait_ms=5.0):
+        """Micro-batch concurrent encode_async calls (max_wait_ms <= 0 disables it)
+
+        Batches are encoded by the in-process model: this saves per-call
+        overhead, it does not run encodes in parallel.
+        """
+        if max_wait_ms <= 0 or max_batch_size <= 1:
+            self.batcher = None
+        else:
+            self.batcher = EmbeddingBatcher(self, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return self.batcher
+    
+    async def encode_async(self, text):
+        """Encode a single string without blocking the event loop"""
+        if self.batcher is not None:
+            return await self.batcher.encode(text)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.encode_one, text)
+
+    async def encode_batch_async(self, texts, batch_size=32):
+        """Encode a list of strings without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.encode_batch, texts, batch_size)
+
+def get_embedding_service(model_name=DEFAULT_MODEL_NAME):
+    """Shortcut for EmbeddingService.get_instance"""
+    return EmbeddingService.get_instance(model_name)
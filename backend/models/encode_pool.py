@@ -0,0 +1,88 @@
+import os
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Model of each worker process, loaded once by the initializer
+_worker_model = None
+
+def _init_worker(model_name, threads):
+    """Pin the worker's thread pools before torch is imported, then load the model"""
+    global _worker_model
+    for variable in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[variable] = str(threads)
+    # Tokenizer threads would compete with the other workers for the same cores
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    try:
+        import torch
+        torch.set_num_threads(threads)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError):
+        pass
+    from sentence_transformers import SentenceTransformer
+    _worker_model = SentenceTransformer(model_name, device="cpu")
+
+def _encode_shard(texts, batch_size):
+    return np.asarray(
+        _worker_model.encode(texts, batch_size=batch_size, show_progress_bar=False), dtype=np.float32
+    ).reshape(len(texts), -1)
+
+class EncodePool:
+    """Process pool that embeds large batches of text on several cores
+
+    One thread per process scales better than one process with many torch
+    threads for a small model like MiniLM: each forward pass over a batch is
+    too small to keep many intra-op threads busy. Workers are started with
+    "spawn" (safe after the parent loaded torch), pin OMP/MKL and torch to
+    threads_per_worker threads, and load the model once. Texts are cut into
+    contiguous shards, several per worker so a slow shard does not leave the
+    others idle, and the results are concatenated back in input order.
+
+    Like sentence-transformers' start_multi_process_pool, but with control over
+    the thread count per worker and a pool that lives across calls.
+    """
+    def __init__(self, model_name, processes=None, threads_per_worker=None, shards_per_worker=4, min_shard=32):
+        cores = os.cpu_count() or 1
+        self.model_name = model_name
+        self.processes = max(1, processes or cores)
+        self.threads_per_worker = max(1, threads_per_worker or cores // self.processes)
+        self.shards_per_worker = shards_per_worker
+        self.min_shard = min_shard
+        self._executor = None
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """Start the workers (also done by the first encode); returns self"""
+        with self._lock:
+            if self._executor is None:
+                print(f"Starting {self.processes} encode workers ({self.threads_per_worker} torch threads each)...")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, self.threads_per_worker)
+                )
+        return self
+    
+    def shard_size(self, count):
+        """Texts per shard for a call embedding count texts"""
+        return max(self.min_shard, math.ceil(count / (self.processes * self.shards_per_worker)))
+    
+    def encode(self, texts, batch_size=32):
+        """Float32 matrix of embeddings, one row per text in input order"""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        executor = self.start()._executor
+        size = self.shard_size(len(texts))
+        shards = [texts[start:start + size] for start in range(0, len(texts), size)]
+        # map yields results in submission order whatever order the workers finish in
+        return np.concatenate(list(executor.map(_encode_shard, shards, [batch_size] * len(shards))))
+    
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
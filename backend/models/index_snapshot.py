@@ -0,0 +1,234 @@
+import os
+import json
+import time
+import shutil
+import numpy as np
+from models.lexical_index import BM25Index
+from models.quantization import QuantizedMatrix
+
+FORMAT_VERSION = 1
+CURRENT_FILE = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+class TextColumn:
+    """Strings stored back to back in one UTF-8 blob with an int64 offsets array
+
+    Both files are memory-mapped, so opening costs nothing and a string is
+    only decoded when it is indexed.
+    """
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+    
+    @staticmethod
+    def write(directory, name, values):
+        encoded = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        with open(os.path.join(directory, f"{name}.bin"), 'wb') as f:
+            for value in encoded:
+                f.write(value)
+        np.save(os.path.join(directory, f"{name}.offsets.npy"), offsets)
+    
+    @classmethod
+    def open(cls, directory, name):
+        offsets = np.load(os.path.join(directory, f"{name}.offsets.npy"), mmap_mode='r')
+        blob_path = os.path.join(directory, f"{name}.bin")
+        blob = np.memmap(blob_path, dtype=np.uint8, mode='r') if os.path.getsize(blob_path) else b""
+        return cls(blob, offsets)
+    
+    def __len__(self):
+        return len(self.offsets) - 1
+    
+    def __getitem__(self, index):
+        start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+        return bytes(self.blob[start:end]).decode('utf-8')
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+class MetadataColumns:
+    """Chunk metadata stored column by column
+
+    Every key is dictionary-encoded: the distinct values live in the manifest
+    and each row holds an int32 code (-1 when the row has no value), which is
+    compact for repetitive fields like url, title and source.
+    """
+    def __init__(self, columns, length):
+        self.columns = columns
+        self.length = length
+    
+    @staticmethod
+    def write(directory, metadatas):
+        keys = sorted({key for metadata in metadatas if metadata for key in metadata})
+        schema = {}
+        for key in keys:
+            values = []
+            positions = {}
+            codes = np.full(len(metadatas), -1, dtype=np.int32)
+            for row, metadata in enumerate(metadatas):
+                if metadata and key in metadata:
+                    value = metadata[key]
+                    marker = json.dumps(value, sort_keys=True)
+                    if marker not in positions:
+                        positions[marker] = len(values)
+                        values.append(value)
+                    codes[row] = positions[marker]
+            np.save(os.path.join(directory, f"meta.{key}.npy"), codes)
+            schema[key] = values
+        return schema
+    
+    @classmethod
+    def open(cls, directory, schema, length):
+        columns = {
+            key: (values, np.load(os.path.join(directory, f"meta.{key}.npy"), mmap_mode='r'))
+            for key, values in schema.items()
+        }
+        return cls(columns, length)
+    
+    def __len__(self):
+        return self.length
+    
+    def __getitem__(self, index):
+        row = {}
+        for key, (values, codes) in self.columns.items():
+            code = int(codes[index])
+            if code >= 0:
+                row[key] = values[code]
+        return row
+    
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+    
+    def column(self, key):
+        """Decoded values of one metadata key for every row (None where missing)"""
+        values, codes = self.columns[key]
+        return [values[code] if code >= 0 else None for code in codes]
+
+class IndexSnapshot:
+    """Versioned, memory-mapped export of one CDP's index
+
+    Layout:
+        <root>/CURRENT               name of the active version directory
+        <root>/v<version>/manifest.json
+        <root>/v<version>/embeddings.npy            float32 (n, dim), unit rows
+        <root>/v<version>/ids.bin, ids.offsets.npy
+        <root>/v<version>/documents.bin, documents.offsets.npy
+        <root>/v<version>/meta.<key>.npy            dictionary codes per key
+        <root>/v<version>/bm25.*                    optional BM25 postings
+        <root>/v<version>/embeddings.<int8|float16>.npy, embeddings.scale.npy
+                                                    optional quantized copy for scanning
+    """
+    def __init__(self, path, manifest, ids, embeddings, documents, metadatas, lexical=None, quantized=None):
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.ids = ids
+        self.embeddings = embeddings
+        self.documents = documents
+        self.metadatas = metadatas
+        self.lexical = lexical
+        self.quantized = quantized
+    
+    @staticmethod
+    def write(root, ids, embeddings, documents, metadatas, lexical=None, quantization=None, keep=2, extra=None):
+        """Write a new version under root, point CURRENT at it and prune old versions
+        
+        quantization ("int8" or "float16") adds a compact copy of the matrix
+        that queries scan instead of the float32 one; the float32 rows are kept
+        for re-ranking the candidates.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        version = time.time_ns()
+        path = os.path.join(root, f"v{version}")
+        os.makedirs(path)
+        
+        np.save(os.path.join(path, EMBEDDINGS_FILE), embeddings)
+        TextColumn.write(path, "ids", ids)
+        TextColumn.write(path, "documents", documents)
+        schema = MetadataColumns.write(path, metadatas)
+        if lexical is not None:
+            lexical.save(path)
+        if quantization is not None:
+            QuantizedMatrix.build(embeddings, quantization).save(path)
+        
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "version": version,
+            "count": len(ids),
+            "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+            "dtype": "float32",
+            "metadata": schema,
+            "lexical": lexical is not None,
+            "quantization": quantization,
+        }
+        manifest.update(extra or {})
+        with open(os.path.join(path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        
+        # Swap the active version atomically
+        tmp_current = os.path.join(root, CURRENT_FILE + ".tmp")
+        with open(tmp_current, 'w', encoding='utf-8') as f:
+            f.write(f"v{version}")
+        os.replace(tmp_current, os.path.join(root, CURRENT_FILE))
+        
+        IndexSnapshot.prune(root, keep)
+        return path
+    
+    @staticmethod
+    def prune(root, keep):
+        """Delete all but the newest `keep` versions (open mmaps of old ones stay valid on POSIX)"""
+        versions = sorted(
+            (name for name in os.listdir(root) if name.startswith("v") and name[1:].isdigit()),
+            key=lambda name: int(name[1:])
+        )
+        for name in versions[:-keep] if keep else []:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+    
+    @staticmethod
+    def current_path(root):
+        """Directory of the active version, or None if there is no snapshot"""
+        try:
+            with open(os.path.join(root, CURRENT_FILE), 'r', encoding='utf-8') as f:
+                name = f.read().strip()
+        except OSError:
+            return None
+        path = os.path.join(root, name)
+        return path if os.path.exists(os.path.join(path, MANIFEST_FILE)) else None
+    
+    @staticmethod
+    def current_version(root):
+        """Version number CURRENT points at, without opening the snapshot (None if there is none)"""
+        path = IndexSnapshot.current_path(root)
+        return int(os.path.basename(path)[1:]) if path is not None else None
+    
+    @classmethod
+    def open(cls, root):
+        """Memory-map the active version; only the manifest is actually read"""
+        path = cls.current_path(root)
+        if path is None:
+            return None
+        with open(os.path.join(path, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != FORMAT_VERSION:
+            print(f"Unsupported snapshot format in {path}")
+            return None
+        
+        count = manifest["count"]
+        if count:
+            embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode='r')
+        else:
+            embeddings = np.empty((0, manifest["dim"]), dtype=np.float32)
+        return cls(
+            path,
+            manifest,
+            TextColumn.open(path, "ids"),
+            embeddings,
+            TextColumn.open(path, "documents"),
+            MetadataColumns.open(path, manifest["metadata"], count),
+            BM25Index.load(path) if manifest.get("lexical") else None,
+            QuantizedMatrix.load(path, manifest["quantization"]) if count and manifest.get("quantization") else None,
+        )
@@ -0,0 +1,141 @@
+import os
+import re
+import json
+import time
+import numpy as np
+
+LEXICAL_FILE = "bm25.json"
+
+# Identifiers such as analytics.track, api_key, user-id or 401 are kept whole
+# and also split into their parts so either form matches
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[._\-:/][a-z0-9]+)*")
+TOKEN_SEPARATORS = re.compile(r"[._\-:/]")
+
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from how i in is it of on or the
+this to what when where which who why will with you your
+""".split())
+
+def tokenize(text):
+    """Lowercased BM25 terms of a text, compound identifiers plus their parts"""
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if token not in STOPWORDS:
+            terms.append(token)
+        if TOKEN_SEPARATORS.search(token):
+            terms.extend(part for part in TOKEN_SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return terms
+
+class BM25Index:
+    """Okapi BM25 over an array-backed inverted index
+
+    Postings are stored CSR-style: offsets[t]:offsets[t + 1] slices doc_ids
+    (int32 row numbers, aligned with the embedding matrix) and term_freqs
+    (uint16) for term t. Per-row length normalization and per-term IDF are
+    precomputed, so scoring a term is a few vectorized operations over its
+    postings.
+    """
+    def __init__(self, terms, offsets, doc_ids, term_freqs, doc_lengths, k1=1.2, b=0.75):
+        self.terms = terms
+        self.term_ids = {term: term_id for term_id, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        
+        n_docs = len(doc_lengths)
+        doc_freqs = np.diff(offsets).astype(np.float32)
+        self.idf = np.log1p((n_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        avg_length = float(doc_lengths.mean()) if n_docs else 0.0
+        if avg_length:
+            self.length_norm = (k1 * (1 - b + b * doc_lengths / avg_length)).astype(np.float32)
+        else:
+            self.length_norm = np.full(n_docs, k1, dtype=np.float32)
+    
+    @classmethod
+    def build(cls, documents, **kwargs):
+        """Tokenize every document and lay out the postings arrays"""
+        postings = {}
+        doc_lengths = np.zeros(len(documents), dtype=np.int32)
+        for row, document in enumerate(documents):
+            terms = tokenize(document or "")
+            doc_lengths[row] = len(terms)
+            counts = {}
+            for term in terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, count in counts.items():
+                postings.setdefault(term, []).append((row, count))
+        
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[term]) for term in terms], out=offsets[1:])
+        doc_ids = np.empty(offsets[-1], dtype=np.int32)
+        term_freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for term_id, term in enumerate(terms):
+            rows, counts = zip(*postings[term])
+            start, end = offsets[term_id], offsets[term_id + 1]
+            doc_ids[start:end] = rows
+            term_freqs[start:end] = np.minimum(counts, np.iinfo(np.uint16).max)
+        return cls(terms, offsets, doc_ids, term_freqs, doc_lengths, **kwargs)
+    
+    def save(self, directory):
+        """Write the postings arrays and vocabulary next to a snapshot's embeddings"""
+        np.save(os.path.join(directory, "bm25.offsets.npy"), self.offsets)
+        np.save(os.path.join(directory, "bm25.doc_ids.npy"), self.doc_ids)
+        np.save(os.path.join(directory, "bm25.term_freqs.npy"), self.term_freqs)
+        np.save(os.path.join(directory, "bm25.doc_lengths.npy"), self.doc_lengths)
+        with open(os.path.join(directory, LEXICAL_FILE), 'w', encoding='utf-8') as f:
+            json.dump({"k1": self.k1, "b": self.b, "terms": self.terms}, f)
+    
+    @classmethod
+    def load(cls, directory):
+        """Open a saved index (postings memory-mapped), or None if there is none"""
+        path = os.path.join(directory, LEXICAL_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        
+        def array(name):
+            return np.load(os.path.join(directory, f"bm25.{name}.npy"), mmap_mode='r')
+        
+        return cls(
+            config["terms"], array("offsets"), array("doc_ids"), array("term_freqs"),
+            np.load(os.path.join(directory, "bm25.doc_lengths.npy")),
+            k1=config["k1"], b=config["b"]
+        )
+    
+    def __len__(self):
+        return len(self.doc_lengths)
+    
+    def nbytes(self):
+        """Size of the postings and per-term/per-row arrays"""
+        arrays = (self.offsets, self.doc_ids, self.term_freqs, self.doc_lengths, self.idf, self.length_norm)
+        return sum(array.nbytes for array in arrays)
+    
+    def search(self, query, n_results=20, deadline=None):
+        """Row indices and BM25 scores of the best lexical matches
+
+        Query terms are scored rarest first, since those carry the most weight;
+        once `deadline` (a time.perf_counter() value) passes, the remaining,
+        more common terms are skipped. Returns (rows, scores, complete).
+        """
+        term_ids = {self.term_ids[term] for term in tokenize(query) if term in self.term_ids}
+        term_ids = sorted(term_ids, key=lambda term_id: self.offsets[term_id + 1] - self.offsets[term_id])
+        
+        scores = np.zeros(len(self), dtype=np.float32)
+        complete = True
+        for term_id in term_ids:
+            if deadline is not None and time.perf_counter() > deadline:
+                complete = False
+                break
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.doc_ids[start:end]
+            freqs = self.term_freqs[start:end].astype(np.float32)
+            scores[rows] += self.idf[term_id] * freqs * (self.k1 + 1) / (freqs + self.length_norm[rows])
+        
+        matched = np.flatnonzero(scores)
+        best = matched[np.argsort(-scores[matched], kind='stable')[:n_results]]
+        return best, scores[best], complete
@@ -0,0 +1,129 @@
+import os
+import time
+import random
+import asyncio
+import groq
+from dotenv import load_dotenv
+
+class LLMProvider:
+    """Chat-completion backend used by QAModel
+
+    complete() and complete_async() return the whole answer; stream() is an
+    async generator of text deltas. Options left unset fall back to the
+    provider's defaults.
+    """
+    name = "base"
+    
+    def complete(self, messages, **options):
+        raise NotImplementedError("Subclasses must implement the complete method")
+    
+    async def complete_async(self, messages, **options):
+        raise NotImplementedError("Subclasses must implement the complete_async method")
+    
+    async def stream(self, messages, **options):
+        raise NotImplementedError("Subclasses must implement the stream method")
+        yield
+
+class GroqProvider(LLMProvider):
+    """Groq chat completions through the sync and async clients"""
+    name = "groq"
+    
+    def __init__(self, api_key, model="llama3-8b-8192", temperature=0.1, max_tokens=800):
+        self.client = groq.Client(api_key=api_key)
+        self.async_client = groq.AsyncClient(api_key=api_key)
+        self.defaults = dict(model=model, temperature=temperature, max_tokens=max_tokens)
+    
+    def completion_args(self, messages, options):
+        return dict(self.defaults, messages=messages, **options)
+    
+    def complete(self, messages, **options):
+        completion = self.client.chat.completions.create(**self.completion_args(messages, options))
+        return completion.choices[0].message.content
+    
+    async def complete_async(self, messages, **options):
+        completion = await self.async_client.chat.completions.create(**self.completion_args(messages, options))
+        return completion.choices[0].message.content
+    
+    async def stream(self, messages, **options):
+        stream = await self.async_client.chat.completions.create(
+            **self.completion_args(messages, options),
+            stream=True
+        )
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+class FakeProvider(LLMProvider):
+    """Local stand-in for load tests: no network, predictable timing
+
+    Each answer waits latency_ms (time to first token) and then emits words at
+    tokens_per_sec, echoing the start of the prompt's context so responses look
+    plausible. error_rate makes that fraction of calls raise, to exercise the
+    fallback paths.
+    """
+    name = "fake"
+    
+    def __init__(self, latency_ms=300.0, tokens_per_sec=50.0, max_tokens=120, error_rate=0.0, seed=None):
+        self.latency = latency_ms / 1000.0
+        self.token_interval = 1.0 / tokens_per_sec if tokens_per_sec else 0.0
+        self.max_tokens = max_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+    
+    def tokens(self, messages, max_tokens=None):
+        """Words of the canned answer for a prompt"""
+        prompt = messages[-1]["content"] if messages else ""
+        context = prompt.split("Context:", 1)[-1].split("Question:", 1)[0]
+        words = context.split() or ["I", "don't", "have", "that", "specific", "information."]
+        words = words[:min(max_tokens or self.max_tokens, self.max_tokens)]
+        return [word + " " for word in words[:-1]] + words[-1:]
+    
+    def check_error(self):
+        if self.error_rate and self.random.random() < self.error_rate:
+            raise RuntimeError("Simulated LLM failure")
+    
+    def complete(self, messages, **options):
+        tokens = self.tokens(messages, options.get("max_tokens"))
+        time.sleep(self.latency + self.token_interval * len(tokens))
+        self.check_error()
+        return "".join(tokens)
+    
+    async def complete_async(self, messages, **options):
+        tokens = self.tokens(messages, options.get("max_tokens"))
+        await asyncio.sleep(self.latency + self.token_interval * len(tokens))
+        self.check_error()
+        return "".join(tokens)
+    
+    async def stream(self, messages, **options):
+        await asyncio.sleep(self.latency)
+        self.check_error()
+        for token in self.tokens(messages, options.get("max_tokens")):
+            await asyncio.sleep(self.token_interval)
+            yield token
+
+def get_llm_provider(name=None):
+    """Provider selected by LLM_PROVIDER ("groq" by default, "fake" or "none")
+
+    Returns None when no LLM should be used, e.g. Groq without an API key, in
+    which case QAModel answers from the retrieved context directly.
+    """
+    load_dotenv()
+    name = (name or os.getenv("LLM_PROVIDER", "groq")).lower()
+    
+    if name == "fake":
+        return FakeProvider(
+            latency_ms=float(os.getenv("FAKE_LLM_LATENCY_MS", "300")),
+            tokens_per_sec=float(os.getenv("FAKE_LLM_TOKENS_PER_SEC", "50")),
+            max_tokens=int(os.getenv("FAKE_LLM_MAX_TOKENS", "120")),
+            error_rate=float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        )
+    if name == "groq":
+        api_key = os.getenv("GROQ_API_KEY")
+        if api_key:
+            return GroqProvider(api_key)
+        print("Warning: GROQ_API_KEY not found in environment variables")
+        return None
+    if name != "none":
+        print(f"Unknown LLM_PROVIDER {name!r}, answering without an LLM")
+    return None
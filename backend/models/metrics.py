@@ -0,0 +1,152 @@
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Latency histogram bucket upper bounds in seconds (sub-ms index lookups up to slow LLM calls)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stage durations of the request being handled, when it asked for a timing breakdown
+request_timings = ContextVar("request_timings", default=None)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels) + "}"
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus model"""
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+class MetricsRegistry:
+    """Process-wide counters, histograms and gauges rendered as Prometheus text
+
+    Series are identified by a metric name plus keyword labels, e.g.
+    metrics.inc("fallbacks_total", cdp="segment", reason="llm_error"). Gauges
+    are callbacks evaluated at scrape time, so existing stats() dicts can be
+    exported without duplicating their bookkeeping.
+    """
+    def __init__(self, namespace="cdp_chatbot"):
+        self.namespace = namespace
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._help = {}
+        self._lock = threading.Lock()
+    
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+    
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+    
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+    
+    def register_gauge(self, name, callback, help_text=None):
+        """callback() returns a number, or {labels dict as tuple of pairs: number}"""
+        self._gauges[name] = callback
+        if help_text:
+            self.describe(name, help_text)
+    
+    def render(self):
+        """All series in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, (list(histogram.counts), histogram.count, histogram.sum, histogram.buckets))
+                for key, histogram in self._histograms.items()
+            )
+        
+        seen = set()
+        
+        def header(name, kind):
+            if (name, kind) not in seen:
+                seen.add((name, kind))
+                if name in self._help:
+                    lines.append(f"# HELP {self.namespace}_{name} {self._help[name]}")
+                lines.append(f"# TYPE {self.namespace}_{name} {kind}")
+        
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{self.namespace}_{name}{format_labels(labels)} {value}")
+        
+        for (name, labels), (counts, count, total, buckets) in histograms:
+            header(name, "histogram")
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.namespace}_{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.namespace}_{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.namespace}_{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{self.namespace}_{name}_count{format_labels(labels)} {count}")
+        
+        for name, callback in sorted(self._gauges.items()):
+            try:
+                value = callback()
+            except Exception as e:
+                print(f"Error collecting gauge {name}: {e}")
+                continue
+            header(name, "gauge")
+            series = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, sample in series:
+                lines.append(f"{self.namespace}_{name}{format_labels(labels)} {float(sample)}")
+        
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("stage_seconds", "Time spent in each stage of answering a question")
+metrics.describe("cache_lookups_total", "Answer cache lookups by tier and result")
+metrics.describe("fallbacks_total", "Answers that fell back from the LLM, by reason")
+metrics.describe("simple_answers_total", "Answers built by generate_simple_answer instead of an LLM")
+metrics.describe("routes_total", "Questions by routing decision")
+metrics.describe("context_tokens_total", "Estimated prompt-context tokens after assembly")
+metrics.describe("context_tokens_saved_total", "Estimated retrieved-chunk tokens removed by dedup, merging and budgeting")
+metrics.describe("model_loads_total", "QA model loads by CDP and reason (first_use or reload)")
+metrics.describe("model_load_seconds", "Time to open a CDP's index and build its QA model")
+metrics.describe("model_load_failures_total", "QA model loads that found no index or raised")
+metrics.describe("model_evictions_total", "QA models evicted by reason (memory or idle)")
+metrics.describe("rerank_total", "Reranked retrievals by outcome (reranked or budget_exceeded)")
+metrics.describe("rerank_pairs_scored_total", "(question, chunk) pairs scored by the cross-encoder")
+metrics.describe("http_request_seconds", "HTTP request latency by endpoint and status")
+
+@contextmanager
+def stage(name, cdp=None):
+    """Time a block into stage_seconds{stage, cdp} and the request's timing breakdown"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("stage_seconds", elapsed, stage=name, cdp=cdp or "all")
+        timings = request_timings.get()
+        if timings is not None:
+            key = f"{name}.{cdp}" if cdp else name
+            timings[key] = timings.get(key, 0.0) + elapsed
+
+def server_timing_header(timings):
+    """Format stage durations as a Server-Timing header value (milliseconds)"""
+    return ", ".join(f"{name};dur={1000 * elapsed:.2f}" for name, elapsed in timings.items())
@@ -0,0 +1,204 @@
+import time
+import asyncio
+from models.metrics import metrics
+
+class ModelEntry:
+    """A loaded QA model with the index version it serves and its bookkeeping"""
+    def __init__(self, model, version, size):
+        self.model = model
+        self.version = version
+        self.size = size
+        self.loaded_at = time.monotonic()
+        self.last_used = self.loaded_at
+
+class ModelRegistry:
+    """Per-CDP QA models, loaded on first use and swapped in place on re-index
+
+    - get(cdp) loads a CDP the first time it is asked for. Concurrent first
+      requests await the same load instead of each opening the index.
+    - reload(cdp) builds the new model off the event loop and replaces the
+      entry with a single assignment. Requests already holding the old model
+      finish on it (pruned snapshot files stay readable through their open
+      mmaps on POSIX); new requests get the new one.
+    - watch() polls version_of(cdp) for every loaded CDP and reloads the ones
+      whose index changed, e.g. after run_scrapers.py exported a snapshot.
+    - When the estimated size of the loaded models exceeds max_bytes, the
+      least recently used CDPs are evicted; with idle_seconds set, the watcher
+      also evicts CDPs nobody has asked for in that long. An evicted CDP is
+      simply loaded again on its next request.
+
+    loader(cdp) returns a QAModel or None; a CDP that failed to load is not
+    retried for retry_seconds so requests don't hammer a missing index.
+    """
+    def __init__(self, loader, version_of=None, max_bytes=None, idle_seconds=None, retry_seconds=30.0, on_reload=None):
+        self.loader = loader
+        self.version_of = version_of
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.retry_seconds = retry_seconds
+        self.on_reload = on_reload
+        self.entries = {}
+        self._loading = {}
+        self._failed = {}
+        self._watcher = None
+        self.metrics = {'loads': 0, 'reloads': 0, 'coalesced': 0, 'load_failures': 0, 'evictions': 0}
+    
+    def __contains__(self, cdp):
+        return cdp in self.entries
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    async def get(self, cdp):
+        """The CDP's QA model, loading it if needed; None if it has no index"""
+        entry = self.entries.get(cdp)
+        if entry is None:
+            failed = self._failed.get(cdp)
+            if failed is not None and time.monotonic() - failed < self.retry_seconds:
+                return None
+            entry = await self._load(cdp, "first_use")
+            if entry is None:
+                return None
+        entry.last_used = time.monotonic()
+        return entry.model
+    
+    async def get_many(self, cdps):
+        """{cdp: model} for the given CDPs that could be loaded, in order"""
+        models = await asyncio.gather(*[self.get(cdp) for cdp in cdps])
+        return {cdp: model for cdp, model in zip(cdps, models) if model is not None}
+    
+    async def reload(self, cdp):
+        """Load the CDP's current index and swap it in; the old model keeps serving until then"""
+        # Let a load that may have opened the previous version finish first
+        while cdp in self._loading:
+            await asyncio.shield(self._loading[cdp])
+        entry = await self._load(cdp, "reload")
+        return entry is not None
+    
+    def _load(self, cdp, reason):
+        """Awaitable for the CDP's load, shared by everyone who asks while it runs"""
+        pending = self._loading.get(cdp)
+        if pending is not None:
+            self.metrics['coalesced'] += 1
+        else:
+            pending = asyncio.ensure_future(self._load_and_install(cdp, reason))
+            self._loading[cdp] = pending
+            pending.add_done_callback(lambda _: self._loading.pop(cdp, None))
+        # One caller being cancelled must not cancel the load for the others
+        return asyncio.shield(pending)
+    
+    async def _load_and_install(self, cdp, reason):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            model = await loop.run_in_executor(None, self.loader, cdp)
+        except Exception as e:
+            print(f"Error loading QA model for {cdp}: {e}")
+            model = None
+        
+        if model is None:
+            # A failed reload leaves the current model in place
+            self._failed[cdp] = time.monotonic()
+            self.metrics['load_failures'] += 1
+            metrics.inc("model_load_failures_total", cdp=cdp)
+            return None
+        
+        self._failed.pop(cdp, None)
+        entry = ModelEntry(model, getattr(model.backend, 'version', None), model.backend.memory_bytes())
+        previous = self.entries.get(cdp)
+        self.entries[cdp] = entry
+        if previous is not None:
+            entry.last_used = previous.last_used
+        
+        elapsed = time.perf_counter() - start
+        self.metrics['reloads' if reason == "reload" else 'loads'] += 1
+        metrics.inc("model_loads_total", cdp=cdp, reason=reason)
+        metrics.observe("model_load_seconds", elapsed, cdp=cdp)
+        print(f"Loaded QA model for {cdp} ({model.backend.name}, version {entry.version}, {elapsed:.2f}s)")
+        
+        if previous is not None and self.on_reload is not None:
+            self.on_reload(cdp)
+        self.enforce_memory_cap(keep=cdp)
+        return entry
+    
+    def evict(self, cdp, reason):
+        entry = self.entries.pop(cdp, None)
+        if entry is not None:
+            self.metrics['evictions'] += 1
+            metrics.inc("model_evictions_total", cdp=cdp, reason=reason)
+            print(f"Evicted QA model for {cdp} ({reason}, {entry.size / 2 ** 20:.1f}MB)")
+        return entry is not None
+    
+    def memory_bytes(self):
+        return sum(entry.size for entry in self.entries.values())
+    
+    def enforce_memory_cap(self, keep=None):
+        """Evict least recently used CDPs (never `keep`) until the loaded models fit max_bytes"""
+        if not self.max_bytes:
+            return
+        while self.memory_bytes() > self.max_bytes:
+            candidates = [cdp for cdp in self.entries if cdp != keep]
+            if not candidates:
+                break
+            self.evict(min(candidates, key=lambda cdp: self.entries[cdp].last_used), "memory")
+    
+    def evict_idle(self):
+        if not self.idle_seconds:
+            return
+        now = time.monotonic()
+        for cdp, entry in list(self.entries.items()):
+            if now - entry.last_used > self.idle_seconds:
+                self.evict(cdp, "idle")
+    
+    async def check_for_updates(self):
+        """Reload every loaded CDP whose index version changed; returns the reloaded CDPs"""
+        reloaded = []
+        if self.version_of is None:
+            return reloaded
+        for cdp, entry in list(self.entries.items()):
+            version = self.version_of(cdp)
+            if version is not None and version != entry.version:
+                print(f"Index of {cdp} changed ({entry.version} -> {version}), reloading")
+                if await self.reload(cdp):
+                    reloaded.append(cdp)
+        return reloaded
+    
+    async def watch(self, interval):
+        """Poll for new index versions and idle models every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.evict_idle()
+                await self.check_for_updates()
+            except Exception as e:
+                print(f"Error checking for index updates: {e}")
+    
+    def start_watching(self, interval):
+        if self._watcher is None and interval:
+            self._watcher = asyncio.ensure_future(self.watch(interval))
+    
+    async def stop_watching(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            try:
+                await self._watcher
+            except asyncio.CancelledError:
+                pass
+            self._watcher = None
+    
+    def stats(self):
+        now = time.monotonic()
+        return dict(
+            self.metrics,
+            memory_bytes=self.memory_bytes(),
+            max_bytes=self.max_bytes,
+            models={
+                cdp: {
+                    "version": entry.version,
+                    "bytes": entry.size,
+                    "backend": entry.model.backend.name,
+                    "idle_seconds": now - entry.last_used,
+                }
+                for cdp, entry in self.entries.items()
+            },
+        )
@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+class SamplingProfiler:
+    """Low-overhead wall-clock sampler for the running process
+
+    A daemon thread wakes every `interval` seconds, snapshots the stack of
+    every other thread with sys._current_frames() and counts it. Results are
+    collapsed stacks ("outer;inner;leaf count" per line), the input format of
+    flamegraph.pl and speedscope. Nothing is instrumented, so it can stay on
+    under load.
+    """
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self.sample_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    @classmethod
+    def from_env(cls):
+        """Profiler configured by PROFILE_SAMPLING_HZ, or None if profiling is off"""
+        hz = float(os.getenv("PROFILE_SAMPLING_HZ", "0"))
+        return cls(interval=1.0 / hz) if hz > 0 else None
+    
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+    
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id != own_id:
+                    stacks.append(self._collapse(frame))
+            with self._lock:
+                self.sample_count += 1
+                self.samples.update(stacks)
+    
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+    
+    def collapsed(self):
+        """Collapsed stacks, most frequent first"""
+        with self._lock:
+            return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+    
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.sample_count = 0
+    
+    def dump(self, path):
+        """Write the collapsed stacks to a file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        print(f"Wrote {self.sample_count} profile samples to {path}")
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "running": self._thread is not None,
+                "interval_ms": 1000 * self.interval,
+                "samples": self.sample_count,
+                "distinct_stacks": len(self.samples),
+            }
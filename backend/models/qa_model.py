@@ -1,73 +1,225 @@
-from sentence_transformers import SentenceTransformer
-import numpy as np
-import re
-import groq
-import os
-from dotenv import load_dotenv
+import asyncio
+import contextvars
+from models.embedding_service import get_embedding_service
+from models.llm_providers import get_llm_provider
+from models.retrieval_backends import RetrievalBackend, ChromaBackend
+from models.metrics import metrics, stage
+from models.context_assembler import ContextAssembler
+from models.query_router import get_query_router
+
+class AnswerStream:
+    """The tokens of one answer as they are generated, for async for
+
+    fallback is None while the LLM is answering; otherwise it names why the
+    built-in answer is streamed instead ("no_llm", "llm_stream_error"). Only
+    answers whose stream ends with fallback None are worth caching.
+    """
+    def __init__(self, generate):
+        self.fallback = None
+        self._generate = generate
+    
+    def __aiter__(self):
+        return self._generate(self).__aiter__()
 
 class QAModel:
-    def __init__(self, collection, cdp_name):
+    def __init__(self, collection, cdp_name, embedder=None, llm=None, assembler=None, router=None, reranker=None,
+                 rerank_top_n=None):
+        # Accept either a Chroma collection or any RetrievalBackend
+        self.backend = collection if isinstance(collection, RetrievalBackend) else ChromaBackend(collection)
         self.collection = collection
         self.cdp_name = cdp_name
         
-        # Use the same embedding model
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # Share the process-wide embedding model instead of loading a copy per CDP
+        self.embedder = embedder if embedder is not None else get_embedding_service()
         
-        # Load Groq API key from environment variables
-        load_dotenv()
-        self.groq_api_key = os.getenv("GROQ_API_KEY")
-        if self.groq_api_key:
-            self.groq_client = groq.Client(api_key=self.groq_api_key)
-        else:
-            print("Warning: GROQ_API_KEY not found in environment variables")
-            self.groq_client = None
+        # LLM used to write answers (Groq unless LLM_PROVIDER says otherwise);
+        # None means answers are built from the retrieved context directly
+        self.llm = llm if llm is not None else get_llm_provider()
+        
+        # Dedupes, orders and packs retrieved chunks into the prompt's token budget
+        self.assembler = assembler if assembler is not None else ContextAssembler.from_env()
+        
+        # Keyword rules deciding how fallback answers are phrased
+        self.router = router if router is not None else get_query_router()
+        
+        # Optional cross-encoder second stage: over-fetch, rescore, keep the best
+        # rerank_top_n (fewer than n_results, since the reranked top is more precise)
+        self.reranker = reranker
+        self.rerank_top_n = rerank_top_n
+    
+    def retrieve(self, question_embedding, n_results=5, question=None):
+        """Run the search for an already-embedded question
+        
+        Passing the question text lets hybrid backends also match it lexically
+        and, with a reranker, rescore reranker.candidates hits down to
+        rerank_top_n (or n_results).
+        """
+        rerank = self.reranker is not None and question
+        with stage("retrieve", self.cdp_name):
+            results = self.backend.query(
+                [question_embedding],
+                n_results=max(n_results, self.reranker.candidates) if rerank else n_results,
+                query_texts=[question] if question else None
+            )
+        if rerank:
+            results = self.reranker.rerank(question, results, self.rerank_top_n or n_results, cdp=self.cdp_name)
+        return results
+    
+    def build_context(self, results):
+        """Combine the retrieved documents into a single context string
+        
+        Overlapping chunks are merged, near-duplicates dropped and the rest
+        packed by relevance into the assembler's token budget.
+        """
+        with stage("context", self.cdp_name):
+            assembled = self.assembler.assemble(results)
+        if assembled.stats['chunks']:
+            metrics.inc("context_tokens_total", assembled.tokens, cdp=self.cdp_name)
+            metrics.inc("context_tokens_saved_total", assembled.stats['input_tokens'] - assembled.tokens, cdp=self.cdp_name)
+        return assembled.text
+    
+    def record_fallback(self, reason):
+        """Count an answer that could not come from the LLM"""
+        metrics.inc("fallbacks_total", cdp=self.cdp_name, reason=reason)
+    
+    def extract_sources(self, results):
+        """Unique source URLs of the retrieved chunks"""
+        return list(set([
+            metadata.get('url', '')
+            for metadata in (results['metadatas'][0] if results['metadatas'] else [])
+            if metadata and 'url' in metadata
+        ]))
     
     def answer_question(self, question):
-        """Answer a question using the vector store and Groq"""
+        """Answer a question using the vector store and the LLM provider"""
         # Clean and process the question
         clean_question = question.strip()
         
         # Generate embedding for the question
-        question_embedding = self.embedder.encode(clean_question).tolist()
+        question_embedding = self.embedder.encode_one(clean_question)
         
         # Perform similarity search
-        results = self.collection.query(
-            query_embeddings=[question_embedding],
-            n_results=5
-        )
-        
-        # Get documents
-        context_docs = results['documents'][0] if results['documents'] else []
-        
-        # Combine context documents
-        if context_docs:
-            context = "\n\n".join(context_docs)
-        else:
-            context = ""
+        results = self.retrieve(question_embedding, question=clean_question)
+        context = self.build_context(results)
         
         # Generate answer
-        if self.groq_client:
-            answer = self.generate_groq_answer(clean_question, context)
+        if self.llm:
+            answer, fallback = self.generate_groq_answer(clean_question, context)
         else:
+            fallback = "no_llm"
+            self.record_fallback(fallback)
             answer = self.generate_simple_answer(clean_question, context)
         
-        # Extract sources
-        sources = list(set([
-            metadata.get('url', '') 
-            for metadata in (results['metadatas'][0] if results['metadatas'] else [])
-            if metadata and 'url' in metadata
-        ]))
+        return {
+            "answer": answer,
+            "sources": self.extract_sources(results),
+            "fallback": fallback
+        }
+    
+    async def answer_question_async(self, question):
+        """Answer a question without blocking the event loop
+        
+        Embedding and the vector query run on the default executor and the LLM
+        call uses the provider's async API.
+        """
+        clean_question = question.strip()
+        
+        question_embedding = await self.embedder.encode_async(clean_question)
+        results = await self.retrieve_async(question_embedding, question=clean_question)
+        return await self.answer_from_results_async(clean_question, results)
+    
+    async def retrieve_async(self, question_embedding, n_results=5, question=None):
+        """Run the search on the default executor"""
+        loop = asyncio.get_running_loop()
+        # Carry the request's context over so its stage timings include the search
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, context.run, self.retrieve, question_embedding, n_results, question)
+    
+    async def build_context_async(self, results):
+        """Assemble the context on the default executor (merging, dedup and packing are CPU work)"""
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(None, context.run, self.build_context, results)
+    
+    async def answer_from_results_async(self, question, results, context=None):
+        """Generate an answer from search results that were already retrieved
+        
+        Pass the context if it was already built from these results. The
+        result's "fallback" is None when the LLM wrote the answer, otherwise
+        why the built-in answer was used ("no_llm", "llm_error").
+        """
+        if context is None:
+            context = await self.build_context_async(results)
+        
+        if self.llm:
+            answer, fallback = await self.generate_groq_answer_async(question, context)
+        else:
+            fallback = "no_llm"
+            self.record_fallback(fallback)
+            answer = self.generate_simple_answer(question, context)
         
         return {
             "answer": answer,
-            "sources": sources
+            "sources": self.extract_sources(results),
+            "fallback": fallback
         }
     
-    def generate_groq_answer(self, question, context):
-        """Generate an answer using Groq's LLM"""
-        if not context:
-            return f"I couldn't find specific information about {question} in the {self.cdp_name} documentation."
+    def stream_answer_from_results(self, question, results, context=None):
+        """AnswerStream of the answer's pieces as they are generated, for already-retrieved results"""
+        async def generate(stream):
+            answer_context = context if context is not None else await self.build_context_async(results)
+            if self.llm and answer_context:
+                async for token in self.stream_groq_answer(question, answer_context, stream):
+                    yield token
+            else:
+                if not self.llm:
+                    stream.fallback = "no_llm"
+                    self.record_fallback(stream.fallback)
+                async for token in self.stream_simple_answer(question, answer_context):
+                    yield token
+        return AnswerStream(generate)
+    
+    async def stream_groq_answer(self, question, context, stream=None):
+        """Yield tokens from a streaming LLM completion, marking stream if it falls back
+        
+        A failure before the first token falls back to the simple answer; once
+        tokens were sent the error is re-raised, since the answer is cut short.
+        """
+        streamed_any = False
+        try:
+            with stage("prompt", self.cdp_name):
+                messages = self.build_groq_messages(question, context)
+            # Includes time spent handing tokens to the client
+            with stage("llm_stream", self.cdp_name):
+                async for delta in self.llm.stream(messages, **self.completion_options()):
+                    streamed_any = True
+                    yield delta
         
+        except Exception as e:
+            print(f"Error streaming response from {self.llm.name}: {e}")
+            self.record_fallback("llm_stream_error")
+            if stream is not None:
+                stream.fallback = "llm_stream_error"
+            if streamed_any:
+                raise
+            # Fall back to simple answer, nothing has been sent yet
+            async for token in self.stream_simple_answer(question, context):
+                yield token
+    
+    async def stream_simple_answer(self, question, context):
+        """Yield the fallback answer line by line so it streams like an LLM response"""
+        answer = self.generate_simple_answer(question, context)
+        for line in answer.splitlines(keepends=True):
+            yield line
+            await asyncio.sleep(0)
+    
+    def no_context_answer(self, question):
+        """Reply used when retrieval found nothing to answer from"""
+        self.record_fallback("no_context")
+        return f"I couldn't find specific information about {question} in the {self.cdp_name} documentation."
+    
+    def build_groq_messages(self, question, context):
+        """Chat messages sent to Groq for a question and its retrieved context"""
         # Create a prompt for Groq
         prompt = f"""You are a helpful CDP (Customer Data Platform) support specialist for {self.cdp_name}.
 Answer the following question based on the provided context from the {self.cdp_name} documentation.
@@ -83,40 +235,67 @@ Question:
 
 Answer:"""
         
+        return [
+            {"role": "system", "content": f"You are a helpful CDP support specialist for {self.cdp_name}."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def completion_options(self):
+        """Options shared by the sync, async and streaming completion calls"""
+        return dict(
+            temperature=0.1,  # Low temperature for more focused answers
+            max_tokens=800
+        )
+    
+    def generate_groq_answer(self, question, context):
+        """(answer, fallback) using the configured LLM provider (Groq by default)
+        
+        fallback is "llm_error" when the call failed and the simple answer was
+        used instead, None otherwise.
+        """
+        if not context:
+            return self.no_context_answer(question), None
+        
         try:
-            # Get completion from Groq
-            completion = self.groq_client.chat.completions.create(
-                model="llama3-8b-8192",  # You can use "mixtral-8x7b-32768" for more complex queries
-                messages=[
-                    {"role": "system", "content": f"You are a helpful CDP support specialist for {self.cdp_name}."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,  # Low temperature for more focused answers
-                max_tokens=800
-            )
-            
-            # Extract the response
-            answer = completion.choices[0].message.content
-            return answer
+            with stage("prompt", self.cdp_name):
+                messages = self.build_groq_messages(question, context)
+            with stage("llm", self.cdp_name):
+                return self.llm.complete(messages, **self.completion_options()), None
         
         except Exception as e:
-            print(f"Error generating response with Groq: {e}")
+            print(f"Error generating response with {self.llm.name}: {e}")
+            self.record_fallback("llm_error")
             # Fall back to simple answer
-            return self.generate_simple_answer(question, context)
+            return self.generate_simple_answer(question, context), "llm_error"
+    
+    async def generate_groq_answer_async(self, question, context):
+        """(answer, fallback) without blocking, using the provider's async API"""
+        if not context:
+            return self.no_context_answer(question), None
+        
+        try:
+            with stage("prompt", self.cdp_name):
+                messages = self.build_groq_messages(question, context)
+            with stage("llm", self.cdp_name):
+                return await self.llm.complete_async(messages, **self.completion_options()), None
+        
+        except Exception as e:
+            print(f"Error generating response with {self.llm.name}: {e}")
+            self.record_fallback("llm_error")
+            # Fall back to simple answer
+            return self.generate_simple_answer(question, context), "llm_error"
     
     def generate_simple_answer(self, question, context):
-        """Generate a simple answer (fallback if Groq is unavailable)"""
+        """Generate a simple answer (fallback if no LLM is available)"""
+        metrics.inc("simple_answers_total", cdp=self.cdp_name)
         if not context:
-            return f"I couldn't find specific information about {question} in the {self.cdp_name} documentation."
+            return self.no_context_answer(question)
         
         # Identify if this is a "how-to" question
-        how_to_keywords = ["how", "steps", "guide", "process", "way to", "setup", "configure", "implement"]
-        is_how_to = any(keyword in question.lower() for keyword in how_to_keywords)
-        
-        if is_how_to:
+        if self.router.route(question).is_how_to:
             # Format as a step-by-step guide
             intro = f"Here's how to {question.lower().replace('how do i ', '').replace('how to ', '').replace('?', '')} in {self.cdp_name}:"
             return f"{intro}\n\n{context}"
         else:
             # Format as a general information response
-            return f"Based on the {self.cdp_name} documentation, here's information about {question.replace('?', '')}:\n\n{context}"
\ No newline at end of file
+            return f"Based on the {self.cdp_name} documentation, here's information about {question.replace('?', '')}:\n\n{context}"
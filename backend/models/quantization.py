@@ -0,0 +1,66 @@
+import os
+import numpy as np
+
+QUANTIZATIONS = ("int8", "float16")
+
+class QuantizedMatrix:
+    """Compact copy of an embedding matrix for the first, approximate scoring pass
+
+    int8 stores every component as round(x / scale[d]) with one symmetric
+    scale per dimension (max |x| / 127), so a dot product with the query is
+    codes @ (scale * query) and the scale never has to be applied to the rows.
+    float16 simply halves the precision. Rows are upcast to float32 in blocks,
+    which keeps the temporary memory of a full scan bounded.
+    """
+    def __init__(self, kind, codes, scale=None, block_rows=8192):
+        if kind not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {kind!r}, expected one of {QUANTIZATIONS}")
+        self.kind = kind
+        self.codes = codes
+        self.scale = scale
+        self.block_rows = block_rows
+    
+    @classmethod
+    def build(cls, embeddings, kind, **kwargs):
+        """Quantize a float32 (n, dim) matrix"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if kind != "int8":
+            return cls(kind, embeddings.astype(np.float16), **kwargs)
+        scale = np.abs(embeddings).max(axis=0) / 127.0 if len(embeddings) else np.ones(embeddings.shape[1], dtype=np.float32)
+        scale = np.where(scale > 0, scale, 1.0).astype(np.float32)
+        codes = np.clip(np.rint(embeddings / scale), -127, 127).astype(np.int8)
+        return cls(kind, codes, scale, **kwargs)
+    
+    def save(self, directory):
+        np.save(os.path.join(directory, f"embeddings.{self.kind}.npy"), self.codes)
+        if self.scale is not None:
+            np.save(os.path.join(directory, "embeddings.scale.npy"), self.scale)
+    
+    @classmethod
+    def load(cls, directory, kind):
+        """Memory-map a saved quantized matrix"""
+        codes = np.load(os.path.join(directory, f"embeddings.{kind}.npy"), mmap_mode='r')
+        scale = np.load(os.path.join(directory, "embeddings.scale.npy")) if kind == "int8" else None
+        return cls(kind, codes, scale)
+    
+    def __len__(self):
+        return len(self.codes)
+    
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+    
+    def dot(self, query, rows=None):
+        """Approximate scores of the (selected) rows against a unit float32 query
+
+        For int8 the scores are the true dot products up to rounding error.
+        """
+        query = np.asarray(query, dtype=np.float32)
+        if self.scale is not None:
+            query = query * self.scale
+        codes = self.codes if rows is None else self.codes[rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), self.block_rows):
+            block = np.asarray(codes[start:start + self.block_rows], dtype=np.float32)
+            scores[start:start + len(block)] = block @ query
+        return scores
@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import threading
+import numpy as np
+
+# Keyword rules; a JSON file with the same shape (ROUTER_RULES_PATH) replaces the sections it defines
+DEFAULT_RULES = {
+    "cdps": {
+        # "generic" phrases use the word in its ordinary sense ("create an audience segment") and
+        # do not name the CDP, unless it is spelled as "proper" inside them ("add a Segment source")
+        "segment": {
+            "aliases": ["segment", "twilio segment", "segment.com", "segment.io"],
+            "generic": ["audience segment", "customer segment", "user segment", "a segment", "new segment",
+                        "segment users", "segment customers", "segment your"],
+            "proper": "Segment",
+        },
+        "mparticle": {"aliases": ["mparticle", "m particle"]},
+        "lytics": {"aliases": ["lytics"]},
+        "zeotap": {"aliases": ["zeotap"]},
+    },
+    "intents": {
+        "off_topic": ["movie", "movies", "weather", "sports", "food", "restaurant", "restaurants"],
+        "comparison": ["compare", "comparison", "difference", "differences", "vs", "versus", "better"],
+        "how_to": ["how", "steps", "guide", "process", "way to", "setup", "set up", "configure", "implement"],
+    },
+    # Example questions for the optional embedding classifier (ROUTER_CLASSIFIER=1)
+    "examples": {
+        "off_topic": [
+            "What movie should I watch tonight?",
+            "Will it rain tomorrow?",
+            "Who won the game last night?",
+            "Recommend a good pizza place near me",
+            "Tell me a joke",
+            "What is the capital of France?",
+        ],
+    },
+}
+
+def trie_pattern(phrases):
+    """Regex source matching any of the (lowercase) phrases, factored by common prefix
+
+    Python's re tries alternatives one by one, so a flat "a|b|c" alternation
+    costs a comparison per phrase at every position; nesting it as a trie
+    makes each position cost one walk down the shared prefixes, as with
+    Aho-Corasick. Spaces inside phrases match any run of whitespace.
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    
+    def build(node):
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A phrase may end here: the longer continuations are optional (and tried first)
+        return f"(?:{body})?" if "" in node else body
+    
+    return build(trie)
+
+def load_rules(path=None):
+    """Default rules, with the sections of a JSON rules file (if any) replacing them"""
+    rules = dict(DEFAULT_RULES)
+    path = path or os.getenv("ROUTER_RULES_PATH")
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            rules.update(json.load(f))
+    return rules
+
+class Route:
+    """Routing decision for one question
+
+    intent is "off_topic", "comparison", "how_to" or "general"; cdps are the
+    CDPs the question names, in order of first mention; terms maps each
+    intent to the keywords that matched.
+    """
+    def __init__(self, intent, cdps, terms, source="rules"):
+        self.intent = intent
+        self.cdps = cdps
+        self.terms = terms
+        self.source = source
+    
+    @property
+    def is_how_to(self):
+        return bool(self.terms.get("how_to"))
+    
+    def __repr__(self):
+        return f"Route(intent={self.intent!r}, cdps={self.cdps!r}, source={self.source!r})"
+
+class IntentClassifier:
+    """Nearest-example intent classifier over question embeddings
+
+    Example questions are embedded once, on first use, with the same model as
+    the queries, so classifying a question costs one small matrix-vector
+    product on the embedding the request computes anyway.
+    """
+    def __init__(self, embedder, examples, threshold=0.6):
+        self.embedder = embedder
+        self.examples = examples
+        self.threshold = threshold
+        self._intents = None
+        self._matrix = None
+        self._lock = threading.Lock()
+    
+    def _prepare(self):
+        with self._lock:
+            if self._matrix is None:
+                intents = [intent for intent, texts in self.examples.items() for _ in texts]
+                texts = [text for texts in self.examples.values() for text in texts]
+                matrix = np.asarray(self.embedder.encode_batch(texts), dtype=np.float32).reshape(len(texts), -1)
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                norms[norms == 0] = 1.0
+                self._intents = intents
+                self._matrix = matrix / norms
+        return self._intents, self._matrix
+    
+    def classify(self, question_embedding):
+        """(intent, similarity) of the closest example, intent None below the threshold"""
+        intents, matrix = self._prepare()
+        if not intents:
+            return None, 0.0
+        query = np.asarray(question_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        return (intents[best] if score >= self.threshold else None), score
+
+class QueryRouter:
+    """Single-pass keyword router for incoming questions
+
+    Every CDP alias and intent keyword is compiled into one trie-shaped regex
+    with word boundaries, run once over the lowercased question instead of
+    one substring scan per keyword list. The longest phrase wins ("twilio
+    segment" over "segment", "audience segment" over both) and "how" no
+    longer matches "however". Case-sensitive aliases and the proper spelling
+    inside generic phrases are found by the same pass and then checked
+    against the original text.
+    """
+    def __init__(self, rules=None, classifier=None):
+        self.rules = rules if rules is not None else DEFAULT_RULES
+        self.classifier = classifier
+        self._lookup = {}
+        for cdp, spec in self.rules.get("cdps", {}).items():
+            for alias in spec.get("aliases", []):
+                self._add(alias, ("cdp", cdp, None))
+            for alias in spec.get("case_sensitive", []):
+                self._add(alias, ("cdp", cdp, alias))
+            for phrase in spec.get("generic", []):
+                self._add(phrase, ("generic", cdp, spec.get("proper")))
+        for intent, keywords in self.rules.get("intents", {}).items():
+            for keyword in keywords:
+                self._add(keyword, ("intent", intent, None))
+        self.pattern = re.compile(rf"\b(?:{trie_pattern(self._lookup)})\b") if self._lookup else None
+    
+    def _add(self, phrase, target):
+        self._lookup.setdefault(" ".join(phrase.lower().split()), []).append(target)
+    
+    @classmethod
+    def from_env(cls, embedder=None):
+        """Router with rules from ROUTER_RULES_PATH and, if ROUTER_CLASSIFIER=1, the embedding classifier"""
+        rules = load_rules()
+        classifier = None
+        if embedder is not None and os.getenv("ROUTER_CLASSIFIER", "0") == "1" and rules.get("examples"):
+            classifier = IntentClassifier(
+                embedder, rules["examples"],
+                threshold=float(os.getenv("ROUTER_CLASSIFIER_THRESHOLD", "0.6"))
+            )
+        return cls(rules, classifier)
+    
+    def route(self, question):
+        """Intent and mentioned CDPs of a question"""
+        cdps = []
+        terms = {}
+        lowered = question.lower()
+        # Spans line up with the original unless lowercasing changed a character's length
+        aligned = len(lowered) == len(question)
+        matches = self.pattern.finditer(lowered) if self.pattern is not None else ()
+        for match in matches:
+            phrase = match.group(0)
+            targets = self._lookup.get(phrase)
+            if targets is None:
+                # Matched with other whitespace than the rule's single spaces
+                phrase = " ".join(phrase.split())
+                targets = self._lookup[phrase]
+            for kind, label, exact in targets:
+                original = question[match.start():match.end()] if aligned else ""
+                if kind == "generic":
+                    # An ordinary use of the word, unless the CDP's own spelling appears in it
+                    if not (exact and re.search(rf"\b{re.escape(exact)}\b", original)):
+                        continue
+                    kind = "cdp"
+                elif exact is not None and " ".join(original.split()) != exact:
+                    continue
+                if kind == "cdp":
+                    if label not in cdps:
+                        cdps.append(label)
+                else:
+                    terms.setdefault(label, []).append(phrase)
+        
+        # Questions about a CDP are on topic even if they mention food or sports
+        if terms.get("off_topic") and not cdps:
+            intent = "off_topic"
+        elif terms.get("comparison") and len(cdps) > 1:
+            intent = "comparison"
+        elif terms.get("how_to"):
+            intent = "how_to"
+        else:
+            intent = "general"
+        return Route(intent, cdps, terms)
+    
+    def warm_up(self):
+        """Embed the classifier's examples now instead of on the first question"""
+        if self.classifier is not None:
+            self.classifier._prepare()
+    
+    def classify(self, question_embedding):
+        """Intent predicted by the embedding classifier, or None (also when it is disabled)"""
+        if self.classifier is None:
+            return None
+        intent, _ = self.classifier.classify(question_embedding)
+        return intent
+
+_default_router = None
+
+def get_query_router():
+    """Process-wide keyword router (rules from ROUTER_RULES_PATH, no classifier)"""
+    global _default_router
+    if _default_router is None:
+        _default_router = QueryRouter(load_rules())
+    return _default_router
@@ -0,0 +1,158 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from models.answer_cache import AnswerCache
+from models.metrics import metrics, stage
+
+DEFAULT_RERANK_MODEL = 'cross-encoder/ms-marco-MiniLM-L-6-v2'
+
+RESULT_KEYS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+def select_results(results, rows, scores=None):
+    """Chroma-format result of the first query restricted to rows, in that order"""
+    selected = {}
+    for key in RESULT_KEYS:
+        values = results.get(key)
+        if values is None or not len(values):
+            selected[key] = values
+            continue
+        first = values[0]
+        selected[key] = [first[list(rows)] if hasattr(first, "shape") else [first[row] for row in rows]]
+    if results.get("fused") is not None:
+        selected["fused"] = results["fused"][:1]
+    if scores is not None:
+        selected["rerank_scores"] = [list(scores)]
+    return selected
+
+class CrossEncoderReranker:
+    """Second retrieval stage: rescore vector hits with a cross-encoder
+
+    The vector search over-fetches `candidates` hits; the cross-encoder reads
+    each (question, chunk) pair and the best n_results by its score are kept.
+    Pairs are scored in batches of batch_size, and scores are cached per
+    (question hash, chunk id) - chunk ids are content hashes, so a cached
+    score stays valid across re-indexing.
+
+    budget_ms is a hard limit per call: before each batch the time it will
+    take is estimated from the measured cost per pair, and if it would not
+    finish in time the remaining batches are skipped and the hits keep their
+    vector order (scores computed so far are still cached for the next ask).
+    """
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, candidates=30, batch_size=16, budget_ms=200,
+                 cache_size=8192, model=None):
+        self.model_name = model_name
+        self.candidates = candidates
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000.0 if budget_ms else None
+        self.cache_size = cache_size
+        if model is None:
+            from sentence_transformers import CrossEncoder
+            print(f"Loading reranking model {model_name}...")
+            model = CrossEncoder(model_name)
+        self.model = model
+        # Running estimate of seconds per scored pair, for the budget check
+        self.pair_seconds = 0.0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.metrics = {'reranked': 0, 'budget_exceeded': 0, 'pairs_scored': 0, 'cache_hits': 0, 'cache_misses': 0}
+    
+    @classmethod
+    def from_env(cls):
+        """Reranker configured by RERANKER (model name; unset or "none" disables it), or None"""
+        model_name = os.getenv("RERANKER", "")
+        if not model_name or model_name == "none":
+            return None
+        if model_name == "default":
+            model_name = DEFAULT_RERANK_MODEL
+        return cls(
+            model_name,
+            candidates=int(os.getenv("RERANK_CANDIDATES", "30")),
+            batch_size=int(os.getenv("RERANK_BATCH_SIZE", "16")),
+            budget_ms=float(os.getenv("RERANK_BUDGET_MS", "200")),
+            cache_size=int(os.getenv("RERANK_CACHE_SIZE", "8192"))
+        )
+    
+    @staticmethod
+    def question_key(question):
+        return hashlib.sha1(AnswerCache.normalize(question).encode('utf-8')).hexdigest()
+    
+    def _cached_scores(self, question_key, ids):
+        scores = [None] * len(ids)
+        with self._lock:
+            for position, chunk_id in enumerate(ids):
+                key = (question_key, chunk_id)
+                score = self._cache.get(key)
+                if score is not None:
+                    self._cache.move_to_end(key)
+                    scores[position] = score
+            hits = sum(score is not None for score in scores)
+            self.metrics['cache_hits'] += hits
+            self.metrics['cache_misses'] += len(ids) - hits
+        return scores
+    
+    def _store(self, question_key, ids, scores):
+        with self._lock:
+            self.metrics['pairs_scored'] += len(ids)
+            for chunk_id, score in zip(ids, scores):
+                self._cache[(question_key, chunk_id)] = score
+                self._cache.move_to_end((question_key, chunk_id))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def score(self, question, documents, ids, deadline=None):
+        """Cross-encoder score per document (None for those the deadline cut off)"""
+        question_key = self.question_key(question)
+        scores = self._cached_scores(question_key, ids)
+        pending = [position for position, score in enumerate(scores) if score is None]
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            if deadline is not None and time.perf_counter() + self.pair_seconds * len(batch) > deadline:
+                break
+            batch_start = time.perf_counter()
+            predicted = self.model.predict([(question, documents[position]) for position in batch],
+                                           batch_size=len(batch), show_progress_bar=False)
+            elapsed = time.perf_counter() - batch_start
+            per_pair = elapsed / len(batch)
+            self.pair_seconds = per_pair if not self.pair_seconds else 0.8 * self.pair_seconds + 0.2 * per_pair
+            batch_scores = [float(value) for value in predicted]
+            for position, value in zip(batch, batch_scores):
+                scores[position] = value
+            self._store(question_key, [ids[position] for position in batch], batch_scores)
+            metrics.inc("rerank_pairs_scored_total", len(batch))
+        return scores
+    
+    def rerank(self, question, results, n_results=5, cdp=None):
+        """The best n_results of a Chroma-format result by cross-encoder score
+
+        Falls back to the first n_results in vector order when the budget runs
+        out; a reranked result also carries "rerank_scores".
+        """
+        ids = results['ids'][0] if results.get('ids') else []
+        documents = results['documents'][0] if results.get('documents') else []
+        if not question or len(documents) <= 1:
+            return select_results(results, range(min(n_results, len(documents))))
+        
+        with stage("rerank", cdp):
+            deadline = time.perf_counter() + self.budget if self.budget else None
+            scores = self.score(question, [document or "" for document in documents], ids, deadline)
+        
+        if any(score is None for score in scores):
+            with self._lock:
+                self.metrics['budget_exceeded'] += 1
+            metrics.inc("rerank_total", cdp=cdp or "all", outcome="budget_exceeded")
+            return select_results(results, range(min(n_results, len(documents))))
+        
+        with self._lock:
+            self.metrics['reranked'] += 1
+        metrics.inc("rerank_total", cdp=cdp or "all", outcome="reranked")
+        rows = sorted(range(len(scores)), key=lambda row: -scores[row])[:n_results]
+        return select_results(results, rows, [scores[row] for row in rows])
+    
+    def stats(self):
+        with self._lock:
+            counts = dict(self.metrics, cached_scores=len(self._cache))
+        return dict(counts, model=self.model_name, candidates=self.candidates,
+                    budget_ms=1000 * self.budget if self.budget else None,
+                    ms_per_pair=1000 * self.pair_seconds)
@@ -0,0 +1,276 @@
+import time
+import threading
+import numpy as np
+from models.index_snapshot import IndexSnapshot
+from models.lexical_index import BM25Index
+from models.quantization import QuantizedMatrix
+
+def normalize_rows(matrix):
+    """L2-normalize each row of a float32 matrix (zero rows are left as-is)"""
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def normalize_vector(vector):
+    """Unit-length float32 copy of a single embedding"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores, best first, without a full sort"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def spherical_kmeans(matrix, n_clusters, iterations=10, seed=0):
+    """Cluster unit rows by cosine similarity; returns (unit centroids, row assignment)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    n_clusters = min(n_clusters, len(matrix))
+    rng = np.random.default_rng(seed)
+    centroids = matrix[rng.choice(len(matrix), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(matrix @ centroids.T, axis=1)
+        for cluster in range(n_clusters):
+            members = matrix[assignment == cluster]
+            if len(members):
+                centroids[cluster] = members.mean(axis=0)
+        centroids = normalize_rows(centroids)
+    return centroids, np.argmax(matrix @ centroids.T, axis=1)
+
+class RetrievalBackend:
+    """Vector search used by QAModel
+
+    query() returns results in Chroma's format ({'ids', 'documents',
+    'metadatas', 'distances', 'embeddings'}, one inner list per query
+    embedding; the hit embeddings let the context assembler dedupe) so every
+    backend is interchangeable. Distances are squared L2 between unit vectors,
+    matching Chroma's default space, so hits can be compared across backends.
+    query_texts carries the raw questions for backends that also match terms;
+    purely dense backends ignore it. Backends that rank by more than distance
+    add 'fused' (one flag per query): those hits are in relevance order and
+    their distances are only informative.
+    """
+    name = "base"
+    
+    def query(self, query_embeddings, n_results=5, query_texts=None):
+        raise NotImplementedError("Subclasses must implement the query method")
+    
+    def count(self):
+        raise NotImplementedError("Subclasses must implement the count method")
+    
+    def memory_bytes(self):
+        """Estimated size of the index held by this process (0 when it lives elsewhere, like Chroma's)"""
+        return 0
+
+class ChromaBackend(RetrievalBackend):
+    """Default backend: delegates to a Chroma collection"""
+    name = "chroma"
+    
+    def __init__(self, collection):
+        self.collection = collection
+    
+    def query(self, query_embeddings, n_results=5, query_texts=None):
+        return self.collection.query(
+            query_embeddings=query_embeddings,
+            n_results=n_results,
+            include=["documents", "metadatas", "distances", "embeddings"]
+        )
+    
+    def count(self):
+        return self.collection.count()
+
+class NumpyBackend(RetrievalBackend):
+    """In-process index over a contiguous float32 matrix of unit vectors
+
+    Exact mode scores every row with one matrix-vector product and picks the
+    top k with argpartition. IVF mode clusters the rows with spherical k-means
+    and only scores the lists of the n_probe closest centroids. Documents and
+    metadata are kept in arrays aligned with the matrix rows; any indexable
+    sequence works, including the lazily decoded columns of an IndexSnapshot.
+    
+    With a BM25Index over the same rows, queries that come with their text are
+    answered by reciprocal-rank fusion of the dense and lexical rankings, which
+    catches exact API names, SDK methods and error strings that the embedding
+    misses. budget_ms bounds the lexical pass per query; when it runs out the
+    remaining terms are skipped and the dense ranking carries the result.
+    
+    With a QuantizedMatrix (int8 or float16) the scan runs over that compact
+    copy and only the best rerank_depth rows are re-scored with the float32
+    matrix, so a memory-mapped float32 file is only paged in for those rows.
+    rerank_depth=0 returns the approximate ranking as is.
+    """
+    name = "numpy"
+    
+    def __init__(self, ids, embeddings, documents, metadatas, mode="exact", n_lists=None, n_probe=8,
+                 lexical=None, rrf_k=60, candidates=20, budget_ms=None, quantized=None, rerank_depth=32):
+        self.ids = ids if hasattr(ids, '__getitem__') else list(ids)
+        self.documents = documents if hasattr(documents, '__getitem__') else list(documents)
+        self.metadatas = metadatas if hasattr(metadatas, '__getitem__') else list(metadatas)
+        self.version = None
+        self.lexical = None
+        self.rrf_k = rrf_k
+        self.candidates = candidates
+        self.budget = budget_ms / 1000.0 if budget_ms else None
+        self.metrics = {'hybrid_queries': 0, 'budget_exceeded': 0}
+        # Queries run concurrently on the executor threads
+        self._lock = threading.Lock()
+        self.quantized = quantized
+        self.rerank_depth = rerank_depth
+        if lexical is not None:
+            self.enable_hybrid(lexical)
+        # Keep memory-mapped matrices as they are; they were normalized when saved
+        if isinstance(embeddings, np.memmap):
+            self.embeddings = embeddings
+        elif not len(self.ids):
+            # Empty collection: keep a (0, dim) matrix, there is nothing to reshape or normalize
+            embeddings = np.asarray(embeddings, dtype=np.float32)
+            self.embeddings = np.empty((0, embeddings.shape[-1] if embeddings.ndim == 2 else 0), dtype=np.float32)
+        else:
+            self.embeddings = normalize_rows(np.asarray(embeddings, dtype=np.float32).reshape(len(self.ids), -1))
+        self.mode = mode
+        self.n_probe = n_probe
+        self.centroids = None
+        self.lists = None
+        if mode == "ivf" and self.count():
+            self.build_ivf(n_lists or max(1, int(np.sqrt(len(self.ids)))))
+    
+    @classmethod
+    def from_collection(cls, collection, **kwargs):
+        """Copy every vector, document and metadata out of a Chroma collection"""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data["embeddings"]
+        if embeddings is None or len(embeddings) == 0:
+            embeddings = np.empty((0, 0), dtype=np.float32)
+        return cls(data["ids"], np.asarray(embeddings, dtype=np.float32), data["documents"], data["metadatas"], **kwargs)
+    
+    @classmethod
+    def from_snapshot(cls, snapshot, hybrid=False, **kwargs):
+        """Serve an IndexSnapshot directly from its memory-mapped files"""
+        backend = cls(snapshot.ids, snapshot.embeddings, snapshot.documents, snapshot.metadatas,
+                      lexical=snapshot.lexical if hybrid else None, quantized=snapshot.quantized, **kwargs)
+        backend.version = snapshot.version
+        return backend
+    
+    def export_snapshot(self, root, **kwargs):
+        """Write this index as a new snapshot version under root (quantized like this one unless overridden)"""
+        kwargs.setdefault('quantization', self.quantized.kind if self.quantized is not None else None)
+        return IndexSnapshot.write(root, self.ids, self.embeddings, self.documents, self.metadatas,
+                                   lexical=self.lexical, **kwargs)
+    
+    def enable_hybrid(self, lexical=None):
+        """Fuse BM25 results into queries, building the lexical index over these rows if none is given"""
+        self.lexical = lexical if lexical is not None else BM25Index.build(self.documents)
+        self.name = "hybrid"
+        return self
+    
+    def enable_quantization(self, kind):
+        """Scan an int8 or float16 copy of the matrix, re-ranking the shortlist in float32"""
+        self.quantized = QuantizedMatrix.build(self.embeddings, kind) if kind else None
+        return self
+    
+    def build_ivf(self, n_lists, iterations=10, seed=0):
+        """Cluster the rows with spherical k-means into n_lists inverted lists"""
+        centroids, assignment = spherical_kmeans(self.embeddings, n_lists, iterations, seed)
+        self.centroids = centroids
+        self.lists = [np.flatnonzero(assignment == list_id) for list_id in range(len(centroids))]
+    
+    def search(self, query_embedding, n_results=5):
+        """Row indices and cosine scores of the best matches for one query"""
+        query = normalize_vector(query_embedding)
+        candidates = None
+        
+        if self.mode == "ivf" and self.centroids is not None:
+            probe = top_k_indices(self.centroids @ query, self.n_probe)
+            candidates = np.concatenate([self.lists[list_id] for list_id in probe])
+        
+        if self.quantized is not None:
+            approximate = self.quantized.dot(query, candidates)
+            if not self.rerank_depth:
+                best = top_k_indices(approximate, n_results)
+                return (best if candidates is None else candidates[best]), approximate[best]
+            # Exact scores for a shortlist from the cheap pass
+            shortlist = top_k_indices(approximate, max(self.rerank_depth, n_results))
+            candidates = shortlist if candidates is None else candidates[shortlist]
+        
+        if candidates is None:
+            scores = self.embeddings @ query
+            best = top_k_indices(scores, n_results)
+            return best, scores[best]
+        
+        scores = np.asarray(self.embeddings[candidates]) @ query
+        best = top_k_indices(scores, n_results)
+        return candidates[best], scores[best]
+    
+    def hybrid_search(self, query_embedding, query_text, n_results=5):
+        """Row indices and cosine scores of the reciprocal-rank fusion of dense and BM25 hits"""
+        started = time.perf_counter()
+        depth = max(self.candidates, n_results)
+        dense_rows, _ = self.search(query_embedding, depth)
+        deadline = started + self.budget if self.budget else None
+        lexical_rows, _, complete = self.lexical.search(query_text, depth, deadline)
+        
+        with self._lock:
+            self.metrics['hybrid_queries'] += 1
+            if not complete:
+                self.metrics['budget_exceeded'] += 1
+        
+        fused = {}
+        for ranking in (dense_rows, lexical_rows):
+            for rank, row in enumerate(ranking):
+                fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        rows = sorted(fused, key=lambda row: -fused[row])[:n_results]
+        # Report real cosine similarity so distances stay comparable across CDPs
+        scores = np.asarray(self.embeddings[rows]) @ normalize_vector(query_embedding) if rows else []
+        return rows, scores
+    
+    def query(self, query_embeddings, n_results=5, query_texts=None):
+        results = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": [], "fused": []}
+        for position, query_embedding in enumerate(query_embeddings):
+            query_text = query_texts[position] if query_texts else None
+            fused = False
+            if not self.count():
+                rows, scores = [], []
+            elif self.lexical is not None and query_text:
+                rows, scores = self.hybrid_search(query_embedding, query_text, n_results)
+                fused = True
+            else:
+                rows, scores = self.search(query_embedding, n_results)
+            results["fused"].append(fused)
+            results["ids"].append([self.ids[row] for row in rows])
+            results["documents"].append([self.documents[row] for row in rows])
+            results["metadatas"].append([self.metadatas[row] for row in rows])
+            # Squared L2 between unit vectors, as Chroma reports it
+            results["distances"].append([float(2.0 - 2.0 * score) for score in scores])
+            results["embeddings"].append(np.asarray(self.embeddings[list(rows)]))
+        return results
+    
+    def count(self):
+        return len(self.ids)
+    
+    def memory_bytes(self):
+        """Scanned embedding matrix, IVF lists and BM25 postings
+        
+        With quantization only the compact copy is counted: float32 rows are
+        read for the re-rank shortlist alone.
+        """
+        total = self.quantized.nbytes if self.quantized is not None else self.embeddings.nbytes
+        if self.centroids is not None:
+            total += self.centroids.nbytes + sum(rows.nbytes for rows in self.lists)
+        if self.lexical is not None:
+            total += self.lexical.nbytes()
+        return total
+    
+    def stats(self):
+        """Hybrid query counts and how often the lexical budget ran out"""
+        with self._lock:
+            counts = dict(self.metrics)
+        return dict(counts, mode=self.mode, hybrid=self.lexical is not None,
+                    quantization=self.quantized.kind if self.quantized is not None else None,
+                    budget_ms=1000 * self.budget if self.budget else None)
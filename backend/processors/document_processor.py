@@ -1,22 +1,39 @@
 import os
 import json
 import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import chromadb
-from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from models.embedding_service import get_embedding_service
+from processors.index_manifest import IndexManifest, content_hash
+from models.retrieval_backends import ChromaBackend, NumpyBackend
+from models.index_snapshot import IndexSnapshot
+from models.comparison_index import ComparisonIndex
 
 class DocumentProcessor:
-    def __init__(self, data_dir, vectorstore_dir):
+    def __init__(self, data_dir, vectorstore_dir, embedder=None, batch_size=512, embed_batch_size=64):
         self.data_dir = data_dir
         self.vectorstore_dir = vectorstore_dir
         
+        # Chunks per bulk Chroma write, and per forward pass of the embedding model
+        self.batch_size = batch_size
+        self.embed_batch_size = embed_batch_size
+        self.last_stats = {}
+        self.total_stats = {}
+        self._manifests = {}
+        self._cdp_locks = {}
+        self._locks_guard = threading.Lock()
+        
         # Create vectorstore directory if it doesn't exist
         if not os.path.exists(vectorstore_dir):
             os.makedirs(vectorstore_dir)
         
-        # Use a free embedding model
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # Use a free embedding model, shared with every QAModel in the process
+        self.embedder = embedder if embedder is not None else get_embedding_service()
         
         # Initialize ChromaDB client
         self.chroma_client = chromadb.PersistentClient(path=self.vectorstore_dir)
@@ -26,74 +43,341 @@ class DocumentProcessor:
             chunk_overlap=200,
             length_function=len,
         )
+        
+        # Use a smaller chunk size with smaller overlap for more precise retrieval
+        self.chunk_size = 500  # Smaller chunks
+        self.chunk_overlap = 50
+        self.chunk_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", ". ", " ", ""]
+        )
+    
+    def chunking_settings(self):
+        """Splitter settings recorded in the manifest; changing them re-splits every document"""
+        return {'chunk_size': self.chunk_size, 'chunk_overlap': self.chunk_overlap}
+    
+    def configure_embedder(self, embedding_cache_mb=None, encode_processes=None):
+        """Set up the shared embedder for an indexing job
+        
+        Call once, before creating an IndexingPipeline. The API does not: it
+        only embeds questions, in-process and without the cache.
+        """
+        # Disk cache of chunk embeddings by text hash (EMBEDDING_CACHE_MB, 0 disables it): re-splitting
+        # with other settings or rebuilding an index only embeds text never seen before
+        if embedding_cache_mb is None:
+            embedding_cache_mb = float(os.getenv("EMBEDDING_CACHE_MB", "512"))
+        self.embedder.enable_cache(self.embedding_cache_dir(), max_bytes=int(embedding_cache_mb * 2 ** 20))
+        
+        # Large re-index jobs can embed on several worker processes (ENCODE_PROCESSES, with
+        # ENCODE_THREADS_PER_WORKER torch threads each)
+        if encode_processes is None:
+            encode_processes = int(os.getenv("ENCODE_PROCESSES", "0"))
+        self.embedder.enable_pool(encode_processes, int(os.getenv("ENCODE_THREADS_PER_WORKER", "0")) or None)
+    
+    def embedding_cache_dir(self):
+        """Where the shared embedding cache lives"""
+        return os.path.join(self.vectorstore_dir, 'embedding_cache')
+    
+    def manifest_path(self, cdp_name):
+        """Location of the incremental-indexing manifest for a CDP"""
+        return os.path.join(self.vectorstore_dir, 'manifests', f"{cdp_name}.json")
+    
+    def split_document(self, cdp_name, doc_key, doc_data):
+        """Split a document into chunks with content-addressed ids
+        
+        Ids depend only on the document key and the chunk text, so an unchanged
+        chunk keeps its id across runs regardless of listing order or position.
+        """
+        splits = self.chunk_splitter.split_text(doc_data['content'])
+        doc_id = content_hash(doc_key)[:16]
+        chunks = []
+        chunk_hashes = {}
+        occurrences = {}
+        for i, split in enumerate(splits):
+            chunk_hash = content_hash(split)
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            chunk_id = f"{cdp_name}_{doc_id}_{chunk_hash[:16]}"
+            if occurrence:
+                chunk_id = f"{chunk_id}_{occurrence}"
+            chunks.append((chunk_id, split, self.chunk_metadata(doc_data, split, i, len(splits))))
+            chunk_hashes[chunk_id] = chunk_hash
+        return chunks, chunk_hashes
+    
+    def plan_cdp_update(self, cdp_name, manifest, filenames=None):
+        """Compare the documents on disk with the manifest and work out what to write
+        
+        Returns (documents, to_embed, to_update, to_delete, counts) where documents is
+        the new manifest content, to_embed are chunks that need new embeddings,
+        to_update are existing chunks whose metadata may have moved, and to_delete
+        are chunk ids that no longer exist. If filenames is given only those files
+        are checked and every other document is carried over from the manifest.
+        """
+        cdp_dir = os.path.join(self.data_dir, cdp_name)
+        old_documents = manifest.documents if manifest else {}
+        same_chunking = manifest is not None and manifest.chunking == self.chunking_settings()
+        
+        if filenames is None:
+            filenames = sorted(f for f in os.listdir(cdp_dir) if f.endswith('.json'))
+            documents = {}
+        else:
+            selected = set(filenames)
+            documents = {key: value for key, value in old_documents.items() if key not in selected}
+        to_embed = []
+        to_update = []
+        counts = {'added': 0, 'changed': 0, 'unchanged': 0}
+        
+        for filename in filenames:
+            file_path = os.path.join(cdp_dir, filename)
+            if not os.path.exists(file_path):
+                continue
+            with open(file_path, 'rb') as f:
+                raw = f.read()
+            
+            file_hash = content_hash(raw)
+            previous = old_documents.get(filename)
+            if previous and same_chunking and previous['hash'] == file_hash:
+                documents[filename] = previous
+                counts['unchanged'] += 1
+                continue
+            
+            try:
+                doc_data = json.loads(raw.decode('utf-8'))
+            except (json.JSONDecodeError, UnicodeDecodeError):
+                print(f"Error decoding JSON from {file_path}")
+                continue
+            
+            chunks, chunk_hashes = self.split_document(cdp_name, filename, doc_data)
+            previous_chunks = previous['chunks'] if previous else {}
+            for chunk in chunks:
+                if chunk[0] in previous_chunks:
+                    to_update.append(chunk)
+                else:
+                    to_embed.append(chunk)
+            
+            documents[filename] = {'hash': file_hash, 'chunks': chunk_hashes}
+            counts['changed' if previous else 'added'] += 1
+        
+        kept_ids = {chunk_id for document in documents.values() for chunk_id in document['chunks']}
+        to_delete = sorted(manifest.chunk_ids() - kept_ids) if manifest else []
+        counts['removed'] = len(set(old_documents) - set(documents))
+        return documents, to_embed, to_update, to_delete, counts
+    
+    def chunk_metadata(self, doc_data, split, chunk_index, total_chunks):
+        """Build the metadata stored alongside a chunk"""
+        return {
+            'source': doc_data['source'],
+            'title': doc_data['title'],
+            'url': doc_data['url'],
+            'chunk_id': chunk_index,
+            'total_chunks': total_chunks,
+            'doc_type': 'how_to' if any(keyword in split.lower() for keyword in 
+                       ['how to', 'steps', 'guide', 'tutorial', 'instructions']) else 'general'
+        }
+    
+    def write_batch_size(self):
+        """Largest write batch allowed by both our settings and the Chroma server"""
+        try:
+            return max(1, min(self.batch_size, self.chroma_client.get_max_batch_size()))
+        except Exception:
+            return self.batch_size
+    
+    def embed_chunks(self, chunks):
+        """Embed chunk texts in large batches, returning a float32 matrix and the time taken"""
+        embed_start = time.perf_counter()
+        if not chunks:
+            return [], 0.0
+        embeddings = self.embedder.encode([text for _, text, _ in chunks], batch_size=self.embed_batch_size, use_cache=True)
+        return embeddings, time.perf_counter() - embed_start
     
-    def process_cdp_docs(self, cdp_name):
-        """Process documents for a specific CDP"""
+    def write_chunks(self, collection, chunks, embeddings):
+        """Bulk-upsert embedded chunks into a collection in bounded batches"""
+        batch_size = self.write_batch_size()
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            collection.upsert(
+                ids=[chunk_id for chunk_id, _, _ in batch],
+                documents=[text for _, text, _ in batch],
+                embeddings=embeddings[start:start + batch_size].tolist(),
+                metadatas=[metadata for _, _, metadata in batch]
+            )
+    
+    def update_chunk_metadata(self, collection, chunks):
+        """Refresh metadata for chunks whose text (and so embedding) is unchanged"""
+        batch_size = self.write_batch_size()
+        for start in range(0, len(chunks), batch_size):
+            batch = chunks[start:start + batch_size]
+            collection.update(
+                ids=[chunk_id for chunk_id, _, _ in batch],
+                metadatas=[metadata for _, _, metadata in batch]
+            )
+    
+    def delete_chunks(self, collection, chunk_ids):
+        """Remove chunks from a collection in bounded batches"""
+        batch_size = self.write_batch_size()
+        for start in range(0, len(chunk_ids), batch_size):
+            collection.delete(ids=chunk_ids[start:start + batch_size])
+    
+    def cdp_lock(self, cdp_name):
+        """Lock serialising manifest and collection writes for one CDP"""
+        with self._locks_guard:
+            if cdp_name not in self._cdp_locks:
+                self._cdp_locks[cdp_name] = threading.Lock()
+            return self._cdp_locks[cdp_name]
+    
+    def get_manifest(self, cdp_name):
+        """Cached manifest for a CDP, loaded from disk on first use"""
+        if cdp_name not in self._manifests:
+            self._manifests[cdp_name] = IndexManifest.load(self.manifest_path(cdp_name))
+        return self._manifests[cdp_name]
+    
+    def save_manifest(self, cdp_name, documents, filenames=None):
+        """Record a finished update; partial updates only replace their own documents"""
+        manifest = self._manifests.get(cdp_name)
+        if filenames is None or manifest is None:
+            manifest = IndexManifest(self.manifest_path(cdp_name), self.chunking_settings(), documents)
+        else:
+            for filename in filenames:
+                if filename in documents:
+                    manifest.documents[filename] = documents[filename]
+                else:
+                    manifest.documents.pop(filename, None)
+        self._manifests[cdp_name] = manifest
+        manifest.save()
+    
+    def process_cdp_docs(self, cdp_name, full_rebuild=False, filenames=None):
+        """Process documents for a specific CDP
+        
+        Only chunks that are new or whose text changed since the last run are
+        embedded; chunks of deleted pages are removed. Pass full_rebuild=True to
+        drop the collection and re-embed everything, or a list of filenames to
+        update just those documents (used when streaming freshly scraped pages).
+        """
         cdp_dir = os.path.join(self.data_dir, cdp_name)
         if not os.path.exists(cdp_dir):
             print(f"No data directory found for {cdp_name}")
             return None
             
-        print(f"Processing documents for {cdp_name}...")
-        
-        # Create or get collection
-        collection = self.chroma_client.get_or_create_collection(name=cdp_name)
-        
-        # Load all documents
-        document_count = 0
-        for filename in os.listdir(cdp_dir):
-            if filename.endswith('.json'):
-                file_path = os.path.join(cdp_dir, filename)
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    try:
-                        doc_data = json.load(f)
-                        
-                        # Use a smaller chunk size with smaller overlap for more precise retrieval
-                        splitter = RecursiveCharacterTextSplitter(
-                            chunk_size=500,  # Smaller chunks
-                            chunk_overlap=50,
-                            length_function=len,
-                            separators=["\n\n", "\n", ". ", " ", ""]
-                        )
-                        
-                        # Split document into chunks
-                        splits = splitter.split_text(doc_data['content'])
-                        
-                        # Generate embeddings
-                        embeddings = self.embedder.encode(splits).tolist()
-                        
-                        # Add each chunk to the collection with meaningful metadata
-                        for i, (split, embedding) in enumerate(zip(splits, embeddings)):
-                            collection.add(
-                                documents=[split],
-                                embeddings=[embedding],
-                                metadatas=[{
-                                    'source': doc_data['source'],
-                                    'title': doc_data['title'],
-                                    'url': doc_data['url'],
-                                    'chunk_id': i,
-                                    'total_chunks': len(splits),
-                                    'doc_type': 'how_to' if any(keyword in split.lower() for keyword in 
-                                               ['how to', 'steps', 'guide', 'tutorial', 'instructions']) else 'general'
-                                }],
-                                ids=[f"{cdp_name}_{document_count}_{i}"]
-                            )
-                        
-                        document_count += 1
-                    except json.JSONDecodeError:
-                        print(f"Error decoding JSON from {file_path}")
-        
-        print(f"Processed {document_count} documents for {cdp_name}")
+        run_start = time.perf_counter()
+        lock = self.cdp_lock(cdp_name)
+        lock.acquire()
+        locked = True
+        try:
+            manifest = None
+            if full_rebuild:
+                try:
+                    self.chroma_client.delete_collection(name=cdp_name)
+                except Exception:
+                    pass
+                self._manifests.pop(cdp_name, None)
+            else:
+                manifest = self.get_manifest(cdp_name)
+            
+            # Partial updates need an up-to-date manifest to merge into
+            if manifest is None or manifest.chunking != self.chunking_settings():
+                filenames = None
+            
+            if filenames is None:
+                print(f"Processing documents for {cdp_name}...")
+            
+            # Create or get collection
+            collection = self.chroma_client.get_or_create_collection(name=cdp_name)
+            
+            # Diff the documents on disk against the manifest
+            split_start = time.perf_counter()
+            documents, to_embed, to_update, to_delete, counts = self.plan_cdp_update(cdp_name, manifest, filenames)
+            split_time = time.perf_counter() - split_start
+            
+            if manifest is None and not full_rebuild:
+                # No manifest yet: anything already in the collection predates content-hash ids
+                # or was written by a run whose manifest was lost, so reconcile by id
+                kept_ids = {chunk_id for document in documents.values() for chunk_id in document['chunks']}
+                existing_ids = set(collection.get(include=[])['ids'])
+                to_delete = sorted(existing_ids - kept_ids)
+                to_update = [chunk for chunk in to_embed if chunk[0] in existing_ids]
+                to_embed = [chunk for chunk in to_embed if chunk[0] not in existing_ids]
+            
+            if filenames is not None:
+                # Partial updates touch disjoint files, so let them embed concurrently
+                lock.release()
+                locked = False
+            
+            embeddings, embed_time = self.embed_chunks(to_embed)
+            
+            if not locked:
+                lock.acquire()
+                locked = True
+            
+            write_start = time.perf_counter()
+            self.delete_chunks(collection, to_delete)
+            self.update_chunk_metadata(collection, to_update)
+            self.write_chunks(collection, to_embed, embeddings)
+            write_time = time.perf_counter() - write_start
+            
+            self.save_manifest(cdp_name, documents, filenames)
+        finally:
+            if locked:
+                lock.release()
+        
+        stats = {
+            'chunks': len(to_embed),
+            'embed_time': embed_time,
+            'write_time': write_time,
+            'documents': len(documents),
+            'deleted': len(to_delete),
+            'metadata_updated': len(to_update),
+            'split_time': split_time,
+            'total_time': time.perf_counter() - run_start,
+        }
+        stats.update(counts)
+        stats['chunks_per_sec'] = stats['chunks'] / stats['total_time'] if stats['total_time'] else 0.0
+        self.last_stats[cdp_name] = stats
+        self.record_totals(cdp_name, stats)
+        
+        if filenames is not None:
+            print(
+                f"Indexed {len(filenames)} updated documents for {cdp_name}: "
+                f"embedded {stats['chunks']} chunks in {stats['total_time']:.2f}s"
+            )
+            return collection
+        
+        print(
+            f"Processed {len(documents)} documents for {cdp_name} "
+            f"({counts['added']} added, {counts['changed']} changed, "
+            f"{counts['unchanged']} unchanged, {counts['removed']} removed)"
+        )
+        print(
+            f"  embedded {stats['chunks']} chunks, deleted {stats['deleted']} in {stats['total_time']:.2f}s "
+            f"({stats['chunks_per_sec']:.1f} chunks/sec; split {split_time:.2f}s, "
+            f"embed {stats['embed_time']:.2f}s, write {stats['write_time']:.2f}s)"
+        )
         return collection
     
-    def process_all_cdps(self):
-        """Process documents for all CDPs"""
+    def record_totals(self, cdp_name, stats):
+        """Accumulate per-CDP stats across calls (streamed updates run many small ones)"""
+        with self._locks_guard:
+            totals = self.total_stats.setdefault(cdp_name, {
+                'runs': 0, 'chunks': 0, 'embed_time': 0.0, 'write_time': 0.0, 'total_time': 0.0
+            })
+            totals['runs'] += 1
+            for key in ('chunks', 'embed_time', 'write_time', 'total_time'):
+                totals[key] += stats[key]
+    
+    def process_all_cdps(self, max_workers=None):
+        """Process documents for all CDPs, one worker thread per CDP by default"""
         results = {}
         
-        for cdp_dir in os.listdir(self.data_dir):
-            cdp_path = os.path.join(self.data_dir, cdp_dir)
-            if os.path.isdir(cdp_path):
-                collection = self.process_cdp_docs(cdp_dir)
+        cdp_dirs = [
+            cdp_dir for cdp_dir in sorted(os.listdir(self.data_dir))
+            if os.path.isdir(os.path.join(self.data_dir, cdp_dir))
+        ]
+        if not cdp_dirs:
+            return results
+        
+        with ThreadPoolExecutor(max_workers=max_workers or len(cdp_dirs)) as pool:
+            for cdp_dir, collection in zip(cdp_dirs, pool.map(self.process_cdp_docs, cdp_dirs)):
                 if collection:
                     results[cdp_dir] = collection
         
@@ -105,4 +389,94 @@ class DocumentProcessor:
             return self.chroma_client.get_collection(name=cdp_name)
         except Exception as e:
             print(f"Error loading collection for {cdp_name}: {e}")
-            return None
\ No newline at end of file
+            return None
+    
+    def snapshot_dir(self, cdp_name):
+        """Root directory of a CDP's versioned index snapshots"""
+        return os.path.join(self.vectorstore_dir, 'snapshots', cdp_name)
+    
+    def index_version(self, cdp_name):
+        """Version of the CDP's active snapshot, or None when it is served from Chroma"""
+        return IndexSnapshot.current_version(self.snapshot_dir(cdp_name))
+    
+    def export_snapshot(self, cdp_name, keep=2, quantization=None):
+        """Export a CDP's collection as a new memory-mappable snapshot version
+        
+        quantization ("int8" or "float16") also stores a compact copy of the
+        embeddings for queries to scan.
+        """
+        collection = self.load_vectorstore(cdp_name)
+        if collection is None:
+            return None
+        with self.cdp_lock(cdp_name):
+            index = NumpyBackend.from_collection(collection)
+        # BM25 postings are built over the same rows as the embedding matrix
+        index.enable_hybrid()
+        root = self.snapshot_dir(cdp_name)
+        if not os.path.exists(root):
+            os.makedirs(root)
+        path = index.export_snapshot(
+            root, keep=keep, quantization=quantization,
+            extra={'cdp': cdp_name, 'embedding_model': getattr(self.embedder, 'model_name', None)}
+        )
+        print(f"Exported {index.count()} vectors for {cdp_name} to {path}")
+        return path
+    
+    def comparison_dir(self):
+        """Directory of the precomputed cross-CDP comparison index"""
+        return os.path.join(self.vectorstore_dir, 'comparisons')
+    
+    def build_comparison_index(self, cdp_names, n_topics=None):
+        """Cluster the CDPs' chunks into topics and save per-topic, per-CDP summaries
+        
+        Reads each CDP's current snapshot, or its Chroma collection when none
+        was exported.
+        """
+        chunks_by_cdp = {}
+        for cdp_name in cdp_names:
+            snapshot = IndexSnapshot.open(self.snapshot_dir(cdp_name))
+            if snapshot is not None:
+                chunks_by_cdp[cdp_name] = (np.asarray(snapshot.embeddings), list(snapshot.documents), list(snapshot.metadatas))
+                continue
+            collection = self.load_vectorstore(cdp_name)
+            if collection is not None:
+                with self.cdp_lock(cdp_name):
+                    index = NumpyBackend.from_collection(collection)
+                chunks_by_cdp[cdp_name] = (index.embeddings, index.documents, index.metadatas)
+        
+        comparison_index = ComparisonIndex.build(chunks_by_cdp, n_topics=n_topics)
+        if comparison_index is None:
+            print("No indexed chunks to build comparisons from")
+            return None
+        path = comparison_index.save(self.comparison_dir())
+        print(f"Built comparison index with {len(comparison_index.topics)} topics over {', '.join(comparison_index.cdps)}")
+        return path
+    
+    def load_retrieval_backend(self, cdp_name, backend="auto", **kwargs):
+        """Open a CDP's index with the requested backend
+        
+        "numpy" / "numpy-ivf" memory-map the current snapshot for dense-only
+        search, "hybrid" adds BM25 fusion (building the lexical index in memory
+        if the snapshot has none), "chroma" opens the collection, and "auto"
+        uses the snapshot, hybrid when it has a lexical index. Falls back to
+        Chroma when no snapshot has been exported.
+        """
+        if backend in ("auto", "hybrid", "numpy", "numpy-ivf"):
+            snapshot = IndexSnapshot.open(self.snapshot_dir(cdp_name))
+            if snapshot is not None:
+                mode = "ivf" if backend == "numpy-ivf" else "exact"
+                index = NumpyBackend.from_snapshot(snapshot, mode=mode, hybrid=backend in ("auto", "hybrid"), **kwargs)
+                if backend == "hybrid" and index.lexical is None:
+                    index.enable_hybrid()
+                return index
+            if backend in ("numpy", "numpy-ivf"):
+                print(f"No index snapshot for {cdp_name}, using Chroma")
+        
+        collection = self.load_vectorstore(cdp_name)
+        if collection is None:
+            return None
+        if backend == "hybrid":
+            with self.cdp_lock(cdp_name):
+                index = NumpyBackend.from_collection(collection, **kwargs)
+            return index.enable_hybrid()
+        return ChromaBackend(collection)
@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 1
+
+def content_hash(text):
+    """Stable hash of a piece of text (or bytes)"""
+    if isinstance(text, str):
+        text = text.encode('utf-8')
+    return hashlib.sha256(text).hexdigest()
+
+class IndexManifest:
+    """Per-CDP record of what is currently embedded in the vector store
+
+    Layout on disk:
+        {
+            "version": 1,
+            "chunking": {...splitter settings...},
+            "documents": {
+                "<doc key>": {"hash": "<file hash>", "chunks": {"<chunk id>": "<chunk hash>"}}
+            }
+        }
+    """
+    def __init__(self, path, chunking=None, documents=None):
+        self.path = path
+        self.chunking = chunking or {}
+        self.documents = documents or {}
+
+    @classmethod
+    def load(cls, path):
+        """Load a manifest, returning None if there is no usable one on disk"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable index manifest {path}: {e}")
+            return None
+        if data.get('version') != MANIFEST_VERSION:
+            return None
+        return cls(path, data.get('chunking'), data.get('documents'))
+
+    def save(self):
+        """Atomically write the manifest next to the vector store"""
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'chunking': self.chunking,
+                'documents': self.documents
+            }, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def chunk_ids(self):
+        """All chunk ids recorded for this CDP"""
+        return {
+            chunk_id
+            for document in self.documents.values()
+            for chunk_id in document.get('chunks', {})
+        }
@@ -0,0 +1,85 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+_STOP = object()
+
+class IndexingPipeline:
+    """Streams freshly scraped pages into DocumentProcessor while crawls are still running
+
+    Scrapers call submit() from their on_page_saved hook. Saved files are grouped
+    per CDP into small batches (flushed when full or after flush_interval seconds)
+    and indexed on a worker pool.
+
+    With the embedder's EncodePool enabled (processor.configure_embedder with
+    ENCODE_PROCESSES, called before the pipeline is created) the pool keeps
+    one batch in flight per encode process, and the batches are embedded
+    there on every core. Without it there is a single worker: more threads
+    would only share the one in-process model, whose torch threads already
+    use the cores, so the pipeline then overlaps indexing with the crawls but
+    does not add encode parallelism.
+    """
+    def __init__(self, processor, workers=None, batch_size=16, flush_interval=1.0):
+        self.processor = processor
+        encode_pool = getattr(processor.embedder, 'pool', None)
+        self.workers = workers or (encode_pool.processes if encode_pool is not None else 1)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.futures = []
+        self.submitted = 0
+        self._queue = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="indexing-dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, cdp_name, file_path):
+        """Queue a saved document for indexing (signature matches BaseScraper.on_page_saved)"""
+        self._queue.put((cdp_name, os.path.basename(file_path)))
+
+    def _flush(self, pending, cdp_name):
+        filenames = pending.pop(cdp_name, None)
+        if filenames:
+            self.submitted += len(filenames)
+            self.futures.append(self.pool.submit(self._index, cdp_name, filenames))
+
+    def _index(self, cdp_name, filenames):
+        try:
+            self.processor.process_cdp_docs(cdp_name, filenames=filenames)
+        except Exception as e:
+            print(f"Error indexing {len(filenames)} documents for {cdp_name}: {e}")
+
+    def _dispatch(self):
+        pending = {}
+        last_flush = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                for cdp_name in list(pending):
+                    self._flush(pending, cdp_name)
+                return
+
+            if item is not None:
+                cdp_name, filename = item
+                batch = pending.setdefault(cdp_name, [])
+                if filename not in batch:
+                    batch.append(filename)
+                if len(batch) >= self.batch_size:
+                    self._flush(pending, cdp_name)
+
+            if time.monotonic() - last_flush >= self.flush_interval:
+                for cdp_name in list(pending):
+                    self._flush(pending, cdp_name)
+                last_flush = time.monotonic()
+
+    def close(self):
+        """Flush what is queued and wait for every indexing task to finish"""
+        self._queue.put(_STOP)
+        self._dispatcher.join()
+        wait(self.futures)
+        self.pool.shutdown()
@@ -1,28 +1,102 @@
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from scrapers import get_all_scrapers
 from processors.document_processor import DocumentProcessor
+from processors.indexing_pipeline import IndexingPipeline
+
+def scrape_cdp(scraper, max_pages):
+    """Run one scraper and time it"""
+    start = time.perf_counter()
+    page_count = scraper.scrape(max_pages=max_pages)
+    return page_count, time.perf_counter() - start
+
+def print_summary(scrape_results, stage_times, total_stats, embedding_cache=None):
+    """Print per-stage and per-CDP wall times"""
+    print("\nSummary:")
+    for stage, elapsed in stage_times.items():
+        print(f"  {stage:<24}{elapsed:8.2f}s")
+    for cdp_name in sorted(set(scrape_results) | set(total_stats)):
+        page_count, scrape_time = scrape_results.get(cdp_name, (0, 0.0))
+        totals = total_stats.get(cdp_name, {})
+        print(
+            f"  {cdp_name:<12}scraped {page_count} pages in {scrape_time:.2f}s, "
+            f"embedded {totals.get('chunks', 0)} chunks "
+            f"(embed {totals.get('embed_time', 0.0):.2f}s, write {totals.get('write_time', 0.0):.2f}s)"
+        )
+    if embedding_cache is not None:
+        stats = embedding_cache.stats()
+        print(
+            f"  embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%}), "
+            f"{stats['entries']} entries, {stats['bytes'] / 2 ** 20:.1f}MB, {stats['evictions']} evicted"
+        )
 
 def main():
     # Set paths
     base_dir = os.path.dirname(os.path.abspath(__file__))
     data_dir = os.path.join(base_dir, "data")
     vectorstore_dir = os.path.join(base_dir, "vectorstores")
-    
-    # Run scrapers
+
+    run_start = time.perf_counter()
+    stage_times = {}
+
+    # Saved pages stream straight into chunking/embedding while the crawls continue
+    processor = DocumentProcessor(data_dir, vectorstore_dir)
+    # Embedding cache and encode worker processes, from EMBEDDING_CACHE_MB and ENCODE_PROCESSES
+    processor.configure_embedder()
+    pipeline = IndexingPipeline(processor)
+
+    # Run scrapers concurrently, one thread per CDP
     print("Starting web scraping...")
     scrapers = get_all_scrapers(data_dir)
-    for scraper in scrapers:
-        print(f"Scraping {scraper.cdp_name}...")
-        page_count = scraper.scrape(max_pages=50)  # Limit for testing
-        print(f"Scraped {page_count} pages from {scraper.cdp_name}")
-    
-    # Process documents
+    scrape_results = {}
+    with ThreadPoolExecutor(max_workers=len(scrapers)) as pool:
+        futures = {}
+        for scraper in scrapers:
+            scraper.on_page_saved = pipeline.submit
+            print(f"Scraping {scraper.cdp_name}...")
+            futures[pool.submit(scrape_cdp, scraper, 50)] = scraper  # Limit for testing
+
+        for future in as_completed(futures):
+            scraper = futures[future]
+            try:
+                page_count, elapsed = future.result()
+            except Exception as e:
+                print(f"Error scraping {scraper.cdp_name}: {e}")
+                continue
+            scrape_results[scraper.cdp_name] = (page_count, elapsed)
+            print(f"Scraped {page_count} pages from {scraper.cdp_name} in {elapsed:.2f}s")
+    stage_times['scrape (all CDPs)'] = time.perf_counter() - run_start
+
+    # Let the streaming indexer drain
+    drain_start = time.perf_counter()
+    pipeline.close()
+    stage_times['index drain'] = time.perf_counter() - drain_start
+
+    # Final incremental pass picks up removed pages and anything the stream missed
     print("\nProcessing documents...")
-    processor = DocumentProcessor(data_dir, vectorstore_dir)
+    reconcile_start = time.perf_counter()
     processor.process_all_cdps()
-    
+    stage_times['reconcile'] = time.perf_counter() - reconcile_start
+
+    # Publish memory-mappable snapshots for fast API startup (SNAPSHOT_QUANTIZATION=int8 or float16 to shrink them)
+    export_start = time.perf_counter()
+    quantization = os.getenv("SNAPSHOT_QUANTIZATION") or None
+    for cdp_name in processor.total_stats:
+        processor.export_snapshot(cdp_name, quantization=quantization)
+    stage_times['export snapshots'] = time.perf_counter() - export_start
+
+    # Precompute per-topic comparison summaries across CDPs
+    comparison_start = time.perf_counter()
+    processor.build_comparison_index(list(processor.total_stats))
+    stage_times['comparison index'] = time.perf_counter() - comparison_start
+    stage_times['total'] = time.perf_counter() - run_start
+
+    print_summary(scrape_results, stage_times, processor.total_stats, processor.embedder.cache)
+    if processor.embedder.pool is not None:
+        processor.embedder.pool.close()
     print("\nScraping and processing complete!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,24 +1,72 @@
 import os
 import json
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urljoin, urldefrag, urlparse
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+from .crawl_cache import CrawlCache, body_hash
 
 class BaseScraper:
-    def __init__(self, base_url, output_dir, cdp_name):
+    # Subclasses can lower this for sites that are slow or only sampled
+    default_max_pages = 100
+
+    def __init__(self, base_url, output_dir, cdp_name, max_workers=8, per_host_limit=4,
+                 max_retries=3, backoff_factor=0.5, timeout=15, session=None, use_cache=True):
         self.base_url = base_url
         self.output_dir = os.path.join(output_dir, cdp_name)
         self.cdp_name = cdp_name
         self.visited_urls = set()
-        
+
+        # Optional callback(cdp_name, file_path) fired after each page is saved
+        self.on_page_saved = None
+
+        # Crawl engine settings
+        self.max_workers = max_workers
+        self.per_host_limit = per_host_limit
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session = session if session is not None else self.create_session()
+        self._host_slots = {}
+        self._host_slots_lock = threading.Lock()
+
         # Create output directory if it doesn't exist
         if not os.path.exists(self.output_dir):
             os.makedirs(self.output_dir)
-    
+
+        # Validators and body hashes from previous crawls (not a .json file, so the
+        # document processor ignores it)
+        self.crawl_cache = CrawlCache(os.path.join(self.output_dir, '.crawl_cache')) if use_cache else None
+        self.unchanged_count = 0
+
+    def create_session(self):
+        """Build a pooled keep-alive session that retries transient failures with backoff"""
+        session = requests.Session()
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=self.backoff_factor,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=["GET", "HEAD"],
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.per_host_limit,
+            pool_maxsize=self.max_workers,
+            max_retries=retry,
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers['User-Agent'] = 'cdp-support-chatbot-scraper/1.0'
+        return session
+
     def clean_filename(self, url):
         """Convert URL to a valid filename"""
         return url.replace('https://', '').replace('http://', '').replace('/', '_').replace(':', '_') + '.json'
-    
+
     def save_content(self, url, title, content):
         """Save the extracted content to a file"""
         article = {
@@ -27,13 +75,165 @@ class BaseScraper:
             'content': content,
             'source': self.cdp_name
         }
-        
+
         filename = os.path.join(self.output_dir, self.clean_filename(url))
         with open(filename, 'w', encoding='utf-8') as f:
             json.dump(article, f, ensure_ascii=False, indent=2)
-        
+
         print(f"Saved: {url}")
-    
-    def scrape(self, max_pages=100):
-        """Base scrape method to be implemented by subclasses"""
-        raise NotImplementedError("Subclasses must implement the scrape method")
\ No newline at end of file
+        return filename
+
+    def extract_content(self, soup):
+        """Extract the main text of a page, implemented by subclasses"""
+        raise NotImplementedError("Subclasses must implement the extract_content method")
+
+    def should_follow(self, href):
+        """Whether a raw link found on a page belongs to the documentation being crawled"""
+        return href.startswith('/') or urlparse(href).netloc == urlparse(self.base_url).netloc
+
+    def _host_slot(self, url):
+        """Semaphore limiting concurrent requests to a single host"""
+        host = urlparse(url).netloc
+        with self._host_slots_lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = threading.BoundedSemaphore(self.per_host_limit)
+                self._host_slots[host] = slot
+        return slot
+
+    def fetch(self, url, headers=None):
+        """GET a URL through the shared session, respecting the per-host limit"""
+        with self._host_slot(url):
+            return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def cached_page(self, url):
+        """Cache entry for a URL if its saved copy (when it had one) is still on disk"""
+        entry = self.crawl_cache.get(url) if self.crawl_cache else None
+        if not entry:
+            return None
+        if entry.get('saved') and not os.path.exists(os.path.join(self.output_dir, self.clean_filename(url))):
+            return None
+        return entry
+
+    def fetch_page(self, url):
+        """Fetch and parse one page; runs on a worker thread
+
+        Returns a dict with the page title, extracted content and outgoing links,
+        or None if the page could not be fetched. Pages that have not changed since
+        the last crawl come back with unchanged=True and the links seen last time.
+        """
+        print(f"Scraping: {url}")
+        cached = self.cached_page(url)
+        headers = self.crawl_cache.conditional_headers(url) if cached else None
+        response = self.fetch(url, headers=headers)
+
+        if response.status_code == 304 and cached:
+            return {'url': url, 'unchanged': True, 'saved': cached.get('saved', False), 'links': cached.get('links', [])}
+
+        if response.status_code != 200:
+            print(f"Failed to fetch {url}, status code: {response.status_code}")
+            return None
+
+        validators = {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body_hash': body_hash(response.content),
+        }
+        if cached and cached.get('body_hash') == validators['body_hash']:
+            # Server ignored the validators but the body is identical
+            cached.update(validators)
+            self.crawl_cache.put(url, cached)
+            return {'url': url, 'unchanged': True, 'saved': cached.get('saved', False), 'links': cached.get('links', [])}
+
+        soup = BeautifulSoup(response.text, 'html.parser')
+        title = soup.title.string if soup.title else "Untitled"
+        content = self.extract_content(soup)
+
+        # Find links to other documentation pages
+        links = []
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            if self.should_follow(href):
+                next_url, _ = urldefrag(urljoin(response.url or url, href))
+                links.append(next_url)
+
+        return {'url': url, 'title': title, 'content': content, 'links': links, 'validators': validators}
+
+    def handle_page(self, page):
+        """Persist a fetched page; returns True if it counted towards max_pages
+
+        Unchanged pages are neither re-saved nor reported to on_page_saved, so
+        nothing downstream re-embeds them.
+        """
+        if page.get('unchanged'):
+            self.unchanged_count += 1
+            return page['saved']
+
+        saved = bool(page['content'])
+        if saved:
+            file_path = self.save_content(page['url'], page['title'], page['content'])
+            if self.on_page_saved:
+                self.on_page_saved(self.cdp_name, file_path)
+
+        if self.crawl_cache:
+            entry = dict(page['validators'])
+            entry['links'] = page['links']
+            entry['saved'] = saved
+            self.crawl_cache.put(page['url'], entry)
+        return saved
+
+    def scrape(self, max_pages=None):
+        """Crawl the docs breadth-first from base_url with a pool of fetch workers"""
+        if max_pages is None:
+            max_pages = self.default_max_pages
+
+        self.unchanged_count = 0
+        frontier = deque([self.base_url])
+        queued = {self.base_url}
+        in_flight = {}
+        page_count = 0
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                while (frontier or in_flight) and page_count < max_pages:
+                    # Keep the pool busy while there is work queued
+                    while frontier and len(in_flight) < self.max_workers:
+                        url = frontier.popleft()
+                        if url in self.visited_urls:
+                            continue
+                        self.visited_urls.add(url)
+                        in_flight[pool.submit(self.fetch_page, url)] = url
+
+                    if not in_flight:
+                        break
+
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        url = in_flight.pop(future)
+                        try:
+                            page = future.result()
+                        except Exception as e:
+                            print(f"Error processing {url}: {e}")
+                            continue
+
+                        if page is None:
+                            continue
+
+                        if page_count < max_pages and self.handle_page(page):
+                            page_count += 1
+
+                        for next_url in page['links']:
+                            if next_url not in queued:
+                                queued.add(next_url)
+                                frontier.append(next_url)
+
+                # Don't wait on pages we no longer need
+                for future in in_flight:
+                    future.cancel()
+        finally:
+            # Keep the validators collected so far even if the crawl was interrupted
+            if self.crawl_cache:
+                self.crawl_cache.save()
+
+        print(f"Scraped {page_count} pages from {self.cdp_name} ({self.unchanged_count} unchanged since last crawl)")
+        return page_count
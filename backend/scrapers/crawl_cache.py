@@ -0,0 +1,59 @@
+import os
+import json
+import hashlib
+import threading
+
+def body_hash(body):
+    """Hash of a raw response body"""
+    return hashlib.sha256(body).hexdigest()
+
+class CrawlCache:
+    """Persistent per-CDP record of what each URL looked like on the last crawl
+
+    For every URL it keeps the validators needed for conditional requests
+    (ETag / Last-Modified), a hash of the body, the links found on the page and
+    whether the page was saved, so an unchanged page can be skipped without
+    re-parsing it while the crawl still follows its links.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Ignoring unreadable crawl cache {self.path}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Atomically write the cache to disk"""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+
+    def get(self, url):
+        with self._lock:
+            return self.entries.get(url)
+
+    def put(self, url, entry):
+        with self._lock:
+            self.entries[url] = entry
+
+    def conditional_headers(self, url):
+        """Request headers that let the server answer 304 Not Modified"""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
@@ -1,14 +1,14 @@
-from bs4 import BeautifulSoup
-import requests
-from urllib.parse import urljoin
 from .base_scraper import BaseScraper
 
 class LyticsScraper(BaseScraper):
-    def __init__(self, output_dir):
+    default_max_pages = 20  # Smaller limit for testing
+    
+    def __init__(self, output_dir, **kwargs):
         super().__init__(
             base_url="https://docs.lytics.com/",
             output_dir=output_dir,
-            cdp_name="lytics"
+            cdp_name="lytics",
+            **kwargs
         )
     
     def extract_content(self, soup):
@@ -27,44 +27,6 @@ class LyticsScraper(BaseScraper):
         
         return ""
     
-    def scrape(self, max_pages=20):  # Smaller limit for testing
-        to_visit = [self.base_url]
-        page_count = 0
-        
-        while to_visit and page_count < max_pages:
-            url = to_visit.pop(0)
-            
-            if url in self.visited_urls:
-                continue
-            
-            try:
-                print(f"Scraping: {url}")
-                response = requests.get(url)
-                self.visited_urls.add(url)
-                
-                if response.status_code != 200:
-                    print(f"Failed to fetch {url}, status code: {response.status_code}")
-                    continue
-                
-                soup = BeautifulSoup(response.text, 'html.parser')
-                title = soup.title.string if soup.title else "Untitled"
-                content = self.extract_content(soup)
-                
-                if content:
-                    self.save_content(url, title, content)
-                    page_count += 1
-                
-                # Find links to other documentation pages
-                for link in soup.find_all('a', href=True):
-                    href = link['href']
-                    # Only follow links to documentation
-                    if href.startswith('/') or 'docs.lytics.com' in href:
-                        next_url = urljoin(self.base_url, href)
-                        if next_url not in self.visited_urls and next_url not in to_visit:
-                            to_visit.append(next_url)
-            
-            except Exception as e:
-                print(f"Error processing {url}: {e}")
-        
-        print(f"Scraped {page_count} pages from {self.cdp_name}")
-        return page_count
\ No newline at end of file
+    def should_follow(self, href):
+        """Only follow links to documentation"""
+        return href.startswith('/') or 'docs.lytics.com' in href
@@ -0,0 +1,133 @@
+import os
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from scrapers.base_scraper import BaseScraper
+
+# A small docs site: every page links back to the index and to its neighbours,
+# with fragment and off-site links the crawler must not fetch twice or follow
+PAGE_COUNT = 6
+
+def page_html(number):
+    links = ['<a href="/index.html">Home</a>', '<a href="/index.html#top">Top</a>',
+             '<a href="http://example.invalid/elsewhere">Elsewhere</a>']
+    for neighbour in (number - 1, number + 1):
+        if 1 <= neighbour <= PAGE_COUNT:
+            links.append(f'<a href="/page{neighbour}.html">Page {neighbour}</a>')
+            links.append(f'<a href="/page{neighbour}.html#section">Section</a>')
+    return f"<html><head><title>Page {number}</title></head><body><p>Content {number}</p>{''.join(links)}</body></html>"
+
+def index_html():
+    links = ''.join(f'<a href="/page{number}.html">Page {number}</a>' for number in range(1, PAGE_COUNT + 1))
+    return f"<html><head><title>Index</title></head><body><p>Index</p>{links}</body></html>"
+
+class StubSite:
+    """Local HTTP server that records how often each path was fetched and peak concurrency"""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.requests = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="stub-site", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/index.html"
+
+    def handle(self, request):
+        with self.lock:
+            self.requests[request.path] = self.requests.get(request.path, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+            if request.path == "/index.html":
+                body = index_html()
+            elif request.path.startswith("/page"):
+                body = page_html(int(request.path[len("/page"):-len(".html")]))
+            else:
+                request.send_error(404)
+                return
+            data = body.encode("utf-8")
+            request.send_response(200)
+            request.send_header("Content-Type", "text/html; charset=utf-8")
+            request.send_header("Content-Length", str(len(data)))
+            request.end_headers()
+            request.wfile.write(data)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+class StubScraper(BaseScraper):
+    def __init__(self, base_url, output_dir, use_cache=False, **kwargs):
+        super().__init__(base_url=base_url, output_dir=output_dir, cdp_name="stub", use_cache=use_cache, **kwargs)
+
+    def extract_content(self, soup):
+        return soup.get_text(separator='\n', strip=True)
+
+@pytest.fixture
+def site():
+    site = StubSite()
+    site.thread.start()
+    yield site
+    site.server.shutdown()
+    site.server.server_close()
+
+def pool_threads():
+    return [thread for thread in threading.enumerate() if thread.name.startswith("ThreadPoolExecutor")]
+
+def test_crawl_visits_every_page_once(site, tmp_path):
+    scraper = StubScraper(site.base_url, str(tmp_path))
+    assert scraper.scrape(max_pages=100) == PAGE_COUNT + 1
+    expected = {"/index.html"} | {f"/page{number}.html" for number in range(1, PAGE_COUNT + 1)}
+    assert set(site.requests) == expected
+    assert all(count == 1 for count in site.requests.values())
+    assert {url.rsplit("/", 1)[1] for url in scraper.visited_urls} == {path[1:] for path in expected}
+    assert len(os.listdir(os.path.join(str(tmp_path), "stub"))) == PAGE_COUNT + 1
+
+def test_max_pages_cuts_off_the_crawl(site, tmp_path):
+    scraper = StubScraper(site.base_url, str(tmp_path), max_workers=2)
+    assert scraper.scrape(max_pages=3) == 3
+    assert len(os.listdir(os.path.join(str(tmp_path), "stub"))) == 3
+    # At most the pages still in flight when the cap was reached are fetched beyond it
+    assert sum(site.requests.values()) <= 3 + scraper.max_workers
+
+def test_per_host_limit_bounds_concurrent_requests(site, tmp_path):
+    scraper = StubScraper(site.base_url, str(tmp_path), max_workers=8, per_host_limit=2)
+    scraper.scrape(max_pages=100)
+    assert site.max_in_flight == 2
+
+def test_workers_are_shut_down_after_the_crawl(site, tmp_path):
+    before = set(pool_threads())
+    scraper = StubScraper(site.base_url, str(tmp_path), max_workers=4)
+    scraper.scrape(max_pages=2)
+    assert not [thread for thread in pool_threads() if thread not in before and thread.is_alive()]
+
+def test_crawl_cache_is_saved_when_the_crawl_fails(site, tmp_path):
+    scraper = StubScraper(site.base_url, str(tmp_path), use_cache=True, max_workers=2)
+    saved = []
+
+    def interrupt_after_two_pages(cdp_name, file_path):
+        saved.append(file_path)
+        if len(saved) == 2:
+            raise KeyboardInterrupt()
+
+    scraper.on_page_saved = interrupt_after_two_pages
+    with pytest.raises(KeyboardInterrupt):
+        scraper.scrape(max_pages=100)
+    reloaded = StubScraper(site.base_url, str(tmp_path), use_cache=True)
+    assert len(reloaded.crawl_cache.entries) >= 1
+    assert all('body_hash' in entry for entry in reloaded.crawl_cache.entries.values())
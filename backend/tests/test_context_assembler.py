@@ -0,0 +1,31 @@
+from models.context_assembler import ContextAssembler
+
+def results(fused=None, rerank_scores=None):
+    # Rank order: a BM25-only hit first, with a poor cosine distance
+    results = {
+        "documents": [["exact error string match", "loosely related page", "another loose page"]],
+        "metadatas": [[{"url": "u1"}, {"url": "u2"}, {"url": "u3"}]],
+        "distances": [[1.4, 0.6, 0.8]],
+    }
+    if fused is not None:
+        results["fused"] = [fused]
+    if rerank_scores is not None:
+        results["rerank_scores"] = [rerank_scores]
+    return results
+
+def packed_texts(results):
+    return [piece.text for piece in ContextAssembler().assemble(results).pieces]
+
+def test_vector_results_are_ordered_by_distance():
+    assert packed_texts(results(fused=False)) == ["loosely related page", "another loose page", "exact error string match"]
+    assert packed_texts(results()) == ["loosely related page", "another loose page", "exact error string match"]
+
+def test_fused_results_keep_their_rank():
+    assert packed_texts(results(fused=True)) == ["exact error string match", "loosely related page", "another loose page"]
+
+def test_reranked_results_keep_their_rank():
+    assert packed_texts(results(rerank_scores=[3.0, 2.0, 1.0]))[0] == "exact error string match"
+
+def test_fused_hit_survives_a_tight_budget():
+    assembler = ContextAssembler(token_budget=8, min_piece_tokens=100)
+    assert [piece.text for piece in assembler.assemble(results(fused=True)).pieces] == ["exact error string match"]
@@ -0,0 +1,42 @@
+import asyncio
+import gc
+import numpy as np
+from models.embedding_batcher import EmbeddingBatcher
+
+class RecordingEmbedder:
+    """Embeds a text as [len(text)] and remembers every batch it was given"""
+    def __init__(self):
+        self.batches = []
+    
+    def encode_batch(self, texts):
+        self.batches.append(list(texts))
+        return np.array([[float(len(text))] for text in texts], dtype=np.float32)
+
+def test_concurrent_encodes_share_a_batch():
+    embedder = RecordingEmbedder()
+    batcher = EmbeddingBatcher(embedder, max_batch_size=4, max_wait_ms=50)
+    
+    async def run():
+        return await asyncio.gather(*[batcher.encode("x" * length) for length in range(1, 9)])
+    
+    embeddings = asyncio.run(run())
+    assert [float(embedding[0]) for embedding in embeddings] == [float(length) for length in range(1, 9)]
+    assert [len(batch) for batch in embedder.batches] == [4, 4]
+    assert batcher.stats()['avg_batch_size'] == 4.0
+
+def test_in_flight_batches_are_referenced_until_done():
+    batcher = EmbeddingBatcher(RecordingEmbedder(), max_batch_size=2, max_wait_ms=50)
+    
+    async def run():
+        requests = [asyncio.ensure_future(batcher.encode(text)) for text in ("a", "bb")]
+        await asyncio.sleep(0)
+        # Nothing else holds the batch task: only the batcher keeps it alive
+        assert len(batcher._tasks) == 1
+        gc.collect()
+        results = await asyncio.gather(*requests)
+        await asyncio.sleep(0)
+        return results
+    
+    results = asyncio.run(run())
+    assert [float(result[0]) for result in results] == [1.0, 2.0]
+    assert not batcher._tasks
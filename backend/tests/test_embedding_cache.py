@@ -0,0 +1,27 @@
+import threading
+import numpy as np
+from models.embedding_cache import EmbeddingCache
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model")
+    cache.put_many(["Create a source", "Add a destination"], np.eye(2, 4, dtype=np.float32))
+    first, missing = cache.get_many(["Create  a source", "Unknown text"])
+    assert np.allclose(first, [1.0, 0.0, 0.0, 0.0])
+    assert missing is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_counters_are_exact_under_concurrent_lookups(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model")
+    cache.put_many(["Create a source"], np.ones((1, 4), dtype=np.float32))
+    
+    def run():
+        for _ in range(500):
+            cache.get_many(["Create a source", "Unknown text"])
+    
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = cache.stats()
+    assert stats["hits"] == stats["misses"] == 8 * 500
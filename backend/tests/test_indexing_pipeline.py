@@ -0,0 +1,34 @@
+import threading
+from types import SimpleNamespace
+from processors.indexing_pipeline import IndexingPipeline
+
+class RecordingProcessor:
+    """Stands in for DocumentProcessor: records the batches it is asked to index"""
+    def __init__(self, encode_pool=None):
+        self.embedder = SimpleNamespace(pool=encode_pool)
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def process_cdp_docs(self, cdp_name, filenames=None):
+        with self.lock:
+            self.batches.append((cdp_name, list(filenames)))
+
+def test_single_worker_without_an_encode_pool():
+    pipeline = IndexingPipeline(RecordingProcessor())
+    assert pipeline.workers == 1
+    pipeline.close()
+
+def test_one_worker_per_encode_process():
+    pipeline = IndexingPipeline(RecordingProcessor(SimpleNamespace(processes=4)))
+    assert pipeline.workers == 4
+    pipeline.close()
+
+def test_pages_are_batched_per_cdp_and_flushed_on_close():
+    processor = RecordingProcessor()
+    pipeline = IndexingPipeline(processor, batch_size=2, flush_interval=60)
+    for name in ("a.json", "b.json", "c.json"):
+        pipeline.submit("segment", f"/data/segment/{name}")
+    pipeline.submit("lytics", "/data/lytics/d.json")
+    pipeline.close()
+    assert sorted(processor.batches) == [("lytics", ["d.json"]), ("segment", ["a.json", "b.json"]), ("segment", ["c.json"])]
+    assert pipeline.submitted == 4
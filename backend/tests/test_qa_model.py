@@ -0,0 +1,63 @@
+import asyncio
+import numpy as np
+import pytest
+
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("groq")
+
+from models.context_assembler import ContextAssembler
+from models.llm_providers import FakeProvider
+from models.qa_model import QAModel
+from models.query_router import QueryRouter, load_rules
+from models.retrieval_backends import NumpyBackend
+
+def make_model(llm):
+    backend = NumpyBackend(["a", "b"], np.eye(2, dtype=np.float32),
+                           ["Create a source in the workspace.", "Add a destination to the source."],
+                           [{"url": "https://docs/a"}, {"url": "https://docs/b"}])
+    model = QAModel(backend, "segment", embedder=object(), llm=llm or FakeProvider(), assembler=ContextAssembler(),
+                    router=QueryRouter(load_rules()))
+    if llm is None:
+        model.llm = None
+    return model, backend.query([[1.0, 0.0]], n_results=2)
+
+def answer(llm):
+    model, results = make_model(llm)
+    return asyncio.run(model.answer_from_results_async("How do I create a source?", results))
+
+def stream(llm):
+    model, results = make_model(llm)
+    answer_stream = model.stream_answer_from_results("How do I create a source?", results)
+    
+    async def collect():
+        return [token async for token in answer_stream]
+    
+    return asyncio.run(collect()), answer_stream.fallback
+
+def test_llm_answer_is_not_a_fallback():
+    result = answer(FakeProvider(latency_ms=0, tokens_per_sec=0))
+    assert result["fallback"] is None
+    assert result["sources"]
+
+def test_llm_error_is_flagged():
+    assert answer(FakeProvider(latency_ms=0, tokens_per_sec=0, error_rate=1.0))["fallback"] == "llm_error"
+
+def test_missing_llm_is_flagged():
+    assert answer(None)["fallback"] == "no_llm"
+
+def test_streamed_llm_answer_is_not_a_fallback():
+    tokens, fallback = stream(FakeProvider(latency_ms=0, tokens_per_sec=0))
+    assert tokens and fallback is None
+
+def test_stream_error_before_the_first_token_falls_back():
+    tokens, fallback = stream(FakeProvider(latency_ms=0, tokens_per_sec=0, error_rate=1.0))
+    assert tokens and fallback == "llm_stream_error"
+
+class BreaksMidStream(FakeProvider):
+    async def stream(self, messages, **options):
+        yield "First"
+        raise RuntimeError("connection reset")
+
+def test_stream_error_after_the_first_token_is_raised():
+    with pytest.raises(RuntimeError):
+        stream(BreaksMidStream(latency_ms=0, tokens_per_sec=0))
@@ -0,0 +1,60 @@
+import pytest
+from models.query_router import QueryRouter, IntentClassifier, load_rules
+
+@pytest.fixture(scope="module")
+def router():
+    return QueryRouter(load_rules())
+
+@pytest.mark.parametrize("question, cdps", [
+    ("How do I set up a source in segment?", ["segment"]),
+    ("How do I set up a source in Segment?", ["segment"]),
+    ("How do I set up a source in SEGMENT?", ["segment"]),
+    ("How do I add a Segment destination?", ["segment"]),
+    ("Does Twilio Segment support server-side events?", ["segment"]),
+    ("How do I create an audience segment based on page views?", []),
+    ("Can I segment users by lifetime value?", []),
+    ("How do I build a segment in Lytics?", ["lytics"]),
+    ("How do I create a new segment of high-value customers in zeotap?", ["zeotap"]),
+])
+def test_segment_mentions(router, question, cdps):
+    assert router.route(question).cdps == cdps
+
+@pytest.mark.parametrize("question, intent, cdps", [
+    ("SEGMENT vs mParticle: which is better?", "comparison", ["segment", "mparticle"]),
+    ("What is the difference between segment and lytics?", "comparison", ["segment", "lytics"]),
+    ("Compare audience segment creation in Lytics and Zeotap", "comparison", ["lytics", "zeotap"]),
+    ("How do I track events in Segment?", "how_to", ["segment"]),
+    ("However I configure the source, no events arrive", "how_to", []),
+    ("What movie should I watch tonight?", "off_topic", []),
+    ("How do I track restaurant orders as events in Segment?", "how_to", ["segment"]),
+])
+def test_intents(router, question, intent, cdps):
+    route = router.route(question)
+    assert (route.intent, route.cdps) == (intent, cdps)
+
+def test_longest_alias_wins(router):
+    route = router.route("Twilio Segment or segment.io?")
+    assert route.cdps == ["segment"]
+
+class KeywordEmbedder:
+    """Embeds a text as [mentions food, mentions events] and counts the texts it is given"""
+    def __init__(self):
+        self.encoded = 0
+
+    def encode_batch(self, texts):
+        self.encoded += len(texts)
+        return [[float("pizza" in text), float("event" in text)] for text in texts]
+
+def test_warm_up_embeds_the_classifier_examples_once():
+    embedder = KeywordEmbedder()
+    examples = {"off_topic": ["best pizza in town"], "general": ["how are events tracked"]}
+    router = QueryRouter(load_rules(), IntentClassifier(embedder, examples))
+    router.warm_up()
+    assert embedder.encoded == 2
+    assert router.classify([1.0, 0.0]) == "off_topic"
+    assert router.classify([0.0, 1.0]) == "general"
+    assert embedder.encoded == 2
+
+def test_warm_up_without_a_classifier(router):
+    router.warm_up()
+    assert router.classify([1.0, 0.0]) is None
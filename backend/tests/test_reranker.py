@@ -0,0 +1,34 @@
+import threading
+from models.reranker import CrossEncoderReranker
+
+class LengthModel:
+    """Scores a pair by the document's length, so longer documents rank first"""
+    def predict(self, pairs, batch_size=None, show_progress_bar=False):
+        return [float(len(document)) for _, document in pairs]
+
+def results(documents):
+    ids = [f"id{number}" for number in range(len(documents))]
+    return {"ids": [ids], "documents": [documents], "metadatas": [[{}] * len(documents)],
+            "distances": [[0.1] * len(documents)]}
+
+def test_rerank_orders_by_score():
+    reranker = CrossEncoderReranker(model=LengthModel(), budget_ms=None)
+    reranked = reranker.rerank("question", results(["a", "abc", "ab"]), n_results=2)
+    assert reranked["documents"] == [["abc", "ab"]]
+    assert reranked["rerank_scores"] == [[3.0, 2.0]]
+
+def test_counters_are_exact_under_concurrent_reranks():
+    reranker = CrossEncoderReranker(model=LengthModel(), budget_ms=None)
+    
+    def run(thread):
+        for number in range(100):
+            reranker.rerank(f"question {thread} {number}", results(["a", "abc", "ab"]), n_results=2)
+    
+    threads = [threading.Thread(target=run, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = reranker.stats()
+    assert stats["reranked"] == 8 * 100
+    assert stats["pairs_scored"] == stats["cache_misses"] == 8 * 100 * 3
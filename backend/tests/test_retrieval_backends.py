@@ -0,0 +1,69 @@
+import threading
+import numpy as np
+from models.index_snapshot import IndexSnapshot
+from models.retrieval_backends import NumpyBackend
+
+class EmptyCollection:
+    """What Chroma's get returns for a collection with no documents"""
+    def get(self, include=None):
+        return {"ids": [], "embeddings": None, "documents": [], "metadatas": []}
+
+def assert_empty_results(results):
+    assert results["ids"] == [[]]
+    assert results["documents"] == [[]]
+    assert results["distances"] == [[]]
+
+def test_empty_collection():
+    backend = NumpyBackend.from_collection(EmptyCollection())
+    assert backend.count() == 0
+    assert backend.embeddings.shape[0] == 0
+    assert_empty_results(backend.query([[0.1] * 8], n_results=5))
+
+def test_empty_collection_hybrid_and_ivf():
+    backend = NumpyBackend([], np.empty((0, 8), dtype=np.float32), [], [], mode="ivf")
+    backend.enable_hybrid()
+    assert backend.embeddings.shape == (0, 8)
+    assert_empty_results(backend.query([[0.1] * 8], n_results=5, query_texts=["api key"]))
+
+def test_empty_snapshot_round_trip(tmp_path):
+    backend = NumpyBackend([], np.empty((0, 8), dtype=np.float32), [], [])
+    backend.export_snapshot(str(tmp_path))
+    snapshot = IndexSnapshot.open(str(tmp_path))
+    assert snapshot.embeddings.shape == (0, 8)
+    reopened = NumpyBackend.from_snapshot(snapshot, hybrid=True)
+    assert reopened.count() == 0
+    assert_empty_results(reopened.query([[0.1] * 8], n_results=5, query_texts=["api key"]))
+
+def test_query_returns_nearest_first():
+    embeddings = np.eye(4, dtype=np.float32)
+    backend = NumpyBackend(["a", "b", "c", "d"], embeddings, ["A", "B", "C", "D"], [{}] * 4)
+    results = backend.query([[0.0, 1.0, 0.1, 0.0]], n_results=2)
+    assert results["ids"] == [["b", "c"]]
+    assert results["distances"][0][0] < results["distances"][0][1]
+
+def test_hybrid_query_is_marked_fused():
+    embeddings = np.eye(4, dtype=np.float32)
+    documents = ["send events", "track users", "identify call", "webhook retries"]
+    backend = NumpyBackend(["a", "b", "c", "d"], embeddings, documents, [{}] * 4)
+    assert backend.query([[1.0, 0.0, 0.0, 0.0]], n_results=2)["fused"] == [False]
+    backend.enable_hybrid()
+    results = backend.query([[1.0, 0.0, 0.0, 0.0]], n_results=2, query_texts=["webhook retries"])
+    assert results["fused"] == [True]
+    # The lexical match is kept in fused order even though its distance is poor
+    assert "d" in results["ids"][0]
+
+def test_hybrid_counters_are_exact_under_concurrent_queries():
+    embeddings = np.eye(4, dtype=np.float32)
+    backend = NumpyBackend(["a", "b", "c", "d"], embeddings, ["send events", "track users", "identify call", "webhook retries"],
+                           [{}] * 4).enable_hybrid()
+    
+    def run():
+        for _ in range(200):
+            backend.query([[1.0, 0.0, 0.0, 0.0]], n_results=2, query_texts=["track events"])
+    
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert backend.stats()["hybrid_queries"] == 8 * 200